@@ -0,0 +1,610 @@
+from array import array
+from collections import Counter
+
+import shuffles
+from deck_builder import (CARD_TABLE, IDENTITIES, card_filter, card_id, check_ids, code_id, hash_after_draw,
+                          hash_after_push, hash_ids, hypergeometric_at_least, make_rng, pack_cards, requested_ids,
+                          unmatched_codes, unpack_cards, write_ids)
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, only to_numpy needs it
+    np = None
+
+# standard deck order as card ids, shared by every new CompactDeck
+STANDARD_ORDER = array('H', range(52))
+JOKERS = array('H', [52, 53])
+
+
+class CompactDeck:
+    """
+    Deck with the same public methods as deck_builder.Deck, storing the order as an
+    array of integer card ids instead of linked Card objects. Card data lives once in
+    the shared card table, so a 52 card deck holds about a hundred bytes of order.
+
+    The deck is the part of the array from self._start up to self._end, so drawing from the
+    top or pulling from either end only moves a bound. Forks share the array copy-on-write:
+    drawing and pulling from the ends never copy, pushing appends in place until another
+    deck has appended to the shared array, and any other change copies the deck's part of
+    the array the first time it touches a shared one.
+    """
+
+    __slots__ = ('_order', '_start', '_end', '_shared', '_hash', 'jokers', 'rng')
+
+    def __init__(self, jokers=False, rng=None):
+        # using jokers?
+        self.jokers = jokers
+        # random number generator, an int seeds a private one for reproducible runs
+        self.rng = make_rng(rng)
+        order = array('H', STANDARD_ORDER)
+        if jokers is True:
+            order.extend(JOKERS)
+        self._set_order(order)
+
+    def _set_order(self, order):
+        """
+        Replaces the whole deck with a new, private array
+        :param order: array('H') of card ids, top first
+        :return: None
+        """
+
+        # self._order[self._start] is the top of the deck, self._order[self._end - 1] the bottom
+        self._order = order
+        self._start = 0
+        self._end = len(order)
+        # True while the array may be shared with a fork
+        self._shared = False
+        # the same position-dependent hash as Deck, so a deck and its forks and snapshots hash
+        # alike, kept up to date by draws and pushes and recomputed lazily after other
+        # changes (None until then)
+        self._hash = None
+
+    def _ids(self):
+        """Card ids of the deck from top to bottom, a copy of its part of the array"""
+        return self._order[self._start:self._end]
+
+    def __str__(self):
+        """Returns list with string representation of each card in deck"""
+        return " -> ".join([str(x) for x in self])
+
+    def __len__(self):
+        """Return length of deck"""
+        return self._end - self._start
+
+    def __iter__(self):
+        """Returns n-tuples containing name and suit of each card in deck of length n"""
+        order = self._order
+        for i in range(self._start, self._end):
+            yield CARD_TABLE[order[i]]
+
+    def __contains__(self, target):
+        """Checks if a card code (ex. 'h2') is in the deck"""
+        return type(self.find(target)) is int
+
+    def __eq__(self, other):
+        """Two decks are equal if they contain the same exact cards in the same order"""
+        if type(other) is type(self) and len(self) == len(other):
+            return self._ids() == other._ids()
+        return False
+
+    def __hash__(self):
+        """
+        Order-sensitive hash of the current cards, equal to the hash of a Deck holding them
+        in the same order (see deck_builder.hash_ids), updated as cards are drawn or pushed
+        """
+
+        if self._hash is None:
+            self._hash = hash_ids(self._ids())
+        return self._hash
+
+    def _own(self):
+        """Makes sure this deck has a private array before it is changed in place"""
+        if self._shared:
+            self._order = self._ids()
+            self._start = 0
+            self._end = len(self._order)
+            self._shared = False
+
+    def _own_end(self):
+        """
+        Makes sure cards can be appended in place after the bottom of the deck. A shared
+        array ending where this deck does takes them as it is, the other decks sharing it
+        stop at their own ends, so only a deck pushing after another one copies
+        """
+
+        if self._end != len(self._order):
+            if self._shared:
+                self._own()
+            else:
+                del self._order[self._end:]
+
+    def fork(self, rng=None):
+        """
+        Copies the deck without copying its cards, the two decks share one array until
+        either changes it by something other than drawing, pulling from the ends or pushing
+        :param rng: random number generator for the fork, shares this deck's if None
+        :return: new deck of the same class
+        """
+
+        fork = type(self).__new__(type(self))
+        fork.jokers = self.jokers
+        fork.rng = make_rng(rng) if rng is not None else self.rng
+        fork._order = self._order
+        fork._start = self._start
+        fork._end = self._end
+        fork._shared = self._shared = True
+        fork._hash = self._hash
+        return fork
+
+    def snapshot(self):
+        """Copy of the current state, same as fork(), as long as it is not changed"""
+        return self.fork()
+
+    def to_bytes(self):
+        """
+        Packs the order of the deck as card ids, same format as Deck.to_bytes
+        :return: bytes, read back with CompactDeck.from_bytes or Deck.from_bytes
+        """
+        return pack_cards(self._ids())
+
+    @staticmethod
+    def from_bytes(data, jokers=False, rng=None):
+        """
+        Rebuilds a deck from to_bytes output
+        :param data: bytes-like object
+        :param jokers: jokers flag of the new deck
+        :param rng: random number generator or seed of the new deck
+        :return: CompactDeck holding the packed cards in order
+        """
+
+        deck = CompactDeck(jokers, rng)
+        deck._set_order(array('H', unpack_cards(data)))
+        return deck
+
+    def to_ids(self, out=None):
+        """
+        Card ids of the deck from top to bottom, see Deck.to_ids
+        :param out: writable buffer to fill instead of allocating, at least as long as the deck
+        :return: array('H') of card ids, or out
+        """
+
+        ids = self._ids()
+        if out is None:
+            return ids
+        return write_ids(ids, out)
+
+    def to_numpy(self, out=None):
+        """
+        Card ids of the deck from top to bottom as a NumPy array, one copy of the packed array
+        :param out: NumPy array to fill instead of allocating, at least as long as the deck
+        :return: uint16 array of card ids, or out
+        """
+
+        if np is None:
+            raise ImportError("Error: to_numpy requires numpy")
+        ids = np.frombuffer(self._ids(), dtype=np.uint16)
+        if out is None:
+            return ids
+        return write_ids(ids, out)
+
+    def to_tuples(self):
+        """
+        Card data of the deck from top to bottom
+        :return: list of (name, suit) tuples, shared with the card table
+        """
+        return list(map(CARD_TABLE.__getitem__, self._ids()))
+
+    def extend(self, ids):
+        """
+        Adds cards to the bottom of the deck
+        :param ids: card ids from to_ids, to_numpy or the shared card table, top first
+        :return: None
+        """
+
+        ids = check_ids(ids)
+        self._own_end()
+        if self._hash is not None:
+            size = len(self)
+            for each in ids:
+                self._hash = hash_after_push(self._hash, size, IDENTITIES[each].zobrist)
+                size += 1
+        self._order.extend(ids)
+        self._end = len(self._order)
+
+    @staticmethod
+    def from_ids(ids, jokers=False, rng=None):
+        """
+        Builds a deck holding the given cards in order
+        :param ids: card ids from to_ids, to_numpy or the shared card table, top first
+        :param jokers: jokers flag of the new deck
+        :param rng: random number generator or seed of the new deck
+        :return: CompactDeck
+        """
+
+        deck = CompactDeck(jokers, rng)
+        deck._set_order(array('H', check_ids(ids)))
+        return deck
+
+    def shuffle(self, method="uniform", times=1):
+        """
+        Shuffles cards to create a random distribution for game use
+        :param method: name of a strategy in shuffles.STRATEGIES or a callable taking (cards, rng)
+        :param times: number of times to apply the strategy
+        :return: None, the order array is replaced
+        """
+
+        strategy = shuffles.get_strategy(method)
+        order = self._ids().tolist()
+        for _ in range(times):
+            order = strategy(order, self.rng)
+        self._set_order(array('H', order))
+
+    def count(self, code=None, suit=None, name=None):
+        """
+        Counts the cards left in the deck that match, see Deck.count. There are no live
+        counts to share between forks, so each call is one pass over the array
+        :param code: card code (ex. 'hace'), matched exactly
+        :param suit: suit to match, case-independent (ex. 'hearts')
+        :param name: name to match, case-independent (ex. 'ace')
+        :return: number of matching cards in the deck
+        """
+
+        if code is None and suit is None and name is None:
+            return len(self)
+        counts = Counter(self._ids())
+        if code is not None:
+            return counts.get(code_id(code), 0)
+        suit = None if suit is None else str(suit).lower()
+        name = None if name is None else str(name).lower()
+        return sum(n for each, n in counts.items()
+                   if (suit is None or IDENTITIES[each].key[1] == suit)
+                   and (name is None or IDENTITIES[each].key[0] == name))
+
+    def probability(self, code=None, suit=None, name=None):
+        """
+        Exact probability that the next card drawn matches, after a uniform shuffle
+        Takes the same arguments as count
+        :return: probability as a float, 0 for an empty deck
+        """
+
+        if len(self) == 0:
+            return 0.0
+        return self.count(code, suit, name) / len(self)
+
+    def probability_at_least(self, k: int, draws: int, code=None, suit=None, name=None):
+        """
+        Exact probability that at least k of the next draws cards match (hypergeometric)
+        :param k: minimum number of matching cards
+        :param draws: number of cards drawn
+        Other arguments are the same as count
+        :return: probability as a float
+        """
+
+        # check if draw number input is valid
+        if draws > len(self):
+            raise Exception("Error: number of cards entered larger than deck")
+        elif draws < 0:
+            raise Exception("Error: number of cards entered less than 0")
+        return hypergeometric_at_least(len(self), self.count(code, suit, name), draws, k)
+
+    def find(self, target):
+        """
+        Finds a specific card in the deck, returns location of first instance (index)
+        :param target: card code you are finding (ex. 'h2')
+        :return: location as an index of first instance of card in deck
+        """
+
+        target_id = code_id(target)
+        if target_id is not None:
+            try:
+                return self._order.index(target_id, self._start, self._end) - self._start
+            except ValueError:
+                pass
+        return "Target card is not in this deck"
+
+    def pull(self, target):
+        """
+        Removes the first instance of a card from the deck. The top and bottom cards are
+        pulled by moving a bound, any other card is deleted from a private array
+        :param target: card code (ex. 'h2') that is to be pulled out of the deck
+        :return: card data tuple (name, suit), or a message if the card is not in the deck
+        """
+
+        index = self.find(target)
+        if type(index) is not int:
+            return index
+        pulled = self._order[self._start + index]
+        if index == 0:
+            if self._hash is not None:
+                self._hash = hash_after_draw(self._hash, IDENTITIES[pulled].zobrist, 1)
+            self._start += 1
+        elif index == len(self) - 1:
+            self._end -= 1
+            self._hash = None
+        else:
+            self._own()
+            del self._order[self._start + index]
+            self._end -= 1
+            self._hash = None
+        return CARD_TABLE[pulled]
+
+    def pull_list(self, cards: list):
+        """
+        Pulls / removes a list of cards from the deck in one pass, see Deck.pull_list
+        :parameter cards: a list of strings
+        :return: (list of pulled card data tuples in deck order, list of codes not found)
+        """
+
+        left = requested_ids(cards)
+        kept = array('H')
+        pulled = []
+        for card_id in self._ids():
+            count = left.get(card_id)
+            if count:
+                left[card_id] = count - 1
+                pulled.append(CARD_TABLE[card_id])
+            else:
+                kept.append(card_id)
+        self._set_order(kept)
+        return pulled, unmatched_codes(cards, left)
+
+    def pull_where(self, fn=None, suit=None, name=None):
+        """
+        Pulls / removes every card matching a filter in one pass, see Deck.pull_where
+        :return: list of pulled card data tuples in deck order
+        """
+
+        match = card_filter(fn, suit, name)
+        kept = array('H')
+        pulled = []
+        for card_id in self._ids():
+            if match(IDENTITIES[card_id]):
+                pulled.append(CARD_TABLE[card_id])
+            else:
+                kept.append(card_id)
+        self._set_order(kept)
+        return pulled
+
+    def cut(self):
+        """
+        Cuts deck in half, moving the top half under the bottom half
+        :return: updates the deck
+        """
+        cut_index = self._start + len(self) // 2
+        self._set_order(self._order[cut_index:self._end] + self._order[self._start:cut_index])
+
+    def deal(self, players: int, cards: int):
+        """
+        Deals cards round-robin from the top of the deck, same order as Deck.deal
+        :param players: number of players to deal to
+        :param cards: number of cards to deal to each player
+        :return: nested list containing all hands dealt
+        """
+
+        count = players * cards
+        # check if card number input is valid
+        if cards > len(self) or count > len(self):
+            raise Exception("Error: number of cards entered larger than deck")
+        # return empty hand if n_cards is 0, error if less than 0
+        elif cards == 0:
+            return []
+        elif cards < 0:
+            raise Exception("Error: number of cards entered less than 0")
+
+        dealt = self._order[self._start:self._start + count]
+        if self._hash is not None:
+            self._hash = hash_after_draw(self._hash, hash_ids(dealt), count)
+        self._start += count
+        # player j gets every players-th card starting at j
+        return [[CARD_TABLE[each] for each in dealt[j::players]] for j in range(players)]
+
+    def iter_deal(self, players: int, cards=None):
+        """
+        Deals round-robin one card at a time, in the same order as deal
+        :param players: number of players to deal to
+        :param cards: number of cards to deal to each player, or None to deal out the deck
+        :return: generator of (player index, card data) pairs
+        """
+
+        if cards is not None:
+            # check if card number input is valid, before anything is dealt
+            if cards > len(self) or players * cards > len(self):
+                raise Exception("Error: number of cards entered larger than deck")
+            elif cards < 0:
+                raise Exception("Error: number of cards entered less than 0")
+            total = players * cards
+        else:
+            total = len(self)
+        return self._iter_deal(players, total)
+
+    def _iter_deal(self, players, total):
+        """Generator behind iter_deal, so input errors are raised when iter_deal is called"""
+        for i in range(total):
+            if len(self) == 0:
+                return
+            yield i % players, self.draw()
+
+    def draw(self):
+        """
+        Draws the top card from the deck
+        :return: card data from the top card
+        """
+
+        # check if deck is empty
+        if len(self) == 0:
+            raise Exception("Deck is empty")
+        top = self._order[self._start]
+        if self._hash is not None:
+            self._hash = hash_after_draw(self._hash, IDENTITIES[top].zobrist, 1)
+        self._start += 1
+        return CARD_TABLE[top]
+
+    def draw_many(self, k: int):
+        """
+        Draws the top k cards from the deck
+        :param k: number of cards to draw
+        :return: list of card data tuples, top card first
+        """
+
+        # check if card number input is valid
+        if k > len(self):
+            raise Exception("Error: number of cards entered larger than deck")
+        elif k < 0:
+            raise Exception("Error: number of cards entered less than 0")
+        drawn = self._order[self._start:self._start + k]
+        if self._hash is not None:
+            self._hash = hash_after_draw(self._hash, hash_ids(drawn), k)
+        self._start += k
+        return [CARD_TABLE[each] for each in drawn]
+
+    def draw_random(self, k=1):
+        """
+        Draws k cards picked uniformly at random, O(1) each: every pick is swapped into the
+        top slot and drawn from there, so the card it replaces moves to where the pick was
+        and the rest of the deck keeps its order
+        :param k: number of cards to draw
+        :return: list of card data tuples, in the order drawn
+        """
+
+        # check if card number input is valid
+        if k > len(self):
+            raise Exception("Error: number of cards entered larger than deck")
+        elif k < 0:
+            raise Exception("Error: number of cards entered less than 0")
+        if k == 0:
+            return []
+        self._own()
+        order = self._order
+        randrange = self.rng.randrange
+        drawn = []
+        start = self._start
+        for _ in range(k):
+            i = start + randrange(self._end - start)
+            order[start], order[i] = order[i], order[start]
+            drawn.append(CARD_TABLE[order[start]])
+            start += 1
+        self._start = start
+        self._hash = None
+        return drawn
+
+    def peek_random(self, k=1):
+        """
+        Looks at k cards picked uniformly at random, leaving the deck as it is
+        :param k: number of cards to look at
+        :return: list of card data tuples
+        """
+
+        # check if card number input is valid
+        if k > len(self):
+            raise Exception("Error: number of cards entered larger than deck")
+        elif k < 0:
+            raise Exception("Error: number of cards entered less than 0")
+        order = self._order
+        return [CARD_TABLE[order[self._start + i]] for i in self.rng.sample(range(len(self)), k)]
+
+    def push(self, suit: str, name: str):
+        """
+        Appends a card to the bottom of the deck, registering it in the card table if new
+        :param suit: string of the suit
+        :param name: string of the name
+        :return: no return, modifies the deck
+        """
+        new_id = card_id(suit, name)
+        self._own_end()
+        if self._hash is not None:
+            self._hash = hash_after_push(self._hash, len(self), IDENTITIES[new_id].zobrist)
+        self._order.append(new_id)
+        self._end += 1
+
+
+class CompactShoe(CompactDeck):
+    """
+    CompactDeck with the discard pile, cut card and dealt count of a deck_builder.Shoe, and
+    what Shoe.snapshot returns. The discard pile is a persistent list of the runs of cards
+    drawn, so forks share it and drawing from a fork never copies it.
+    """
+
+    __slots__ = ('_discard', 'dealt', 'cut_position', 'penetration')
+
+    def __init__(self, n_decks=6, jokers=False, penetration=0.75, rng=None):
+        super().__init__(jokers, rng)
+        self._set_order(self._ids() * n_decks)
+        # how far into the shoe the cut card sits
+        self.penetration = penetration
+        self.cut_position = int(len(self) * penetration)
+        self.dealt = 0
+        # cards taken since the last reshuffle, as (run of card ids, earlier runs) or None
+        self._discard = None
+
+    @property
+    def needs_reshuffle(self):
+        """True once the cut card has been reached"""
+        return self.dealt >= self.cut_position
+
+    def fork(self, rng=None):
+        """Fork of the shoe, sharing the array and the discard pile, see CompactDeck.fork"""
+        fork = super().fork(rng)
+        fork._discard = self._discard
+        fork.dealt = self.dealt
+        fork.cut_position = self.cut_position
+        fork.penetration = self.penetration
+        return fork
+
+    def _discard_drawn(self, k):
+        """Puts the k cards just drawn, still in the array above the deck, on the discard pile"""
+        if k:
+            self._discard = (self._order[self._start - k:self._start], self._discard)
+            self.dealt += k
+
+    def discard_ids(self):
+        """
+        Card ids of the discard pile, the first card taken first
+        :return: array('H') of card ids
+        """
+
+        runs = []
+        run = self._discard
+        while run is not None:
+            runs.append(run[0])
+            run = run[1]
+        ids = array('H')
+        for each in reversed(runs):
+            ids.extend(each)
+        return ids
+
+    def draw(self):
+        """Draws the top card onto the discard pile, see CompactDeck.draw"""
+        card = super().draw()
+        self._discard_drawn(1)
+        return card
+
+    def draw_many(self, k: int):
+        """Draws the top k cards onto the discard pile, see CompactDeck.draw_many"""
+        cards = super().draw_many(k)
+        self._discard_drawn(k)
+        return cards
+
+    def deal(self, players: int, cards: int):
+        """Deals from the top, the dealt cards go on the discard pile, see CompactDeck.deal"""
+        hands = super().deal(players, cards)
+        self._discard_drawn(players * cards)
+        return hands
+
+    def draw_random(self, k=1):
+        """Draws k random cards onto the discard pile, see CompactDeck.draw_random"""
+        cards = super().draw_random(k)
+        self._discard_drawn(len(cards))
+        return cards
+
+    def reshuffle(self, method="uniform", times=1):
+        """
+        Collects the discard pile back under the shoe and shuffles everything
+        :param method: shuffle strategy, as for shuffle
+        :param times: number of times to apply the strategy
+        :return: None
+        """
+
+        self._set_order(self._ids() + self.discard_ids())
+        self._discard = None
+        self.dealt = 0
+        self.shuffle(method, times)
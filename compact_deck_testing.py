@@ -0,0 +1,260 @@
+from collections import Counter
+import compact_deck as cd
+import deck_builder as db
+from transposition_table import TranspositionTable
+import unittest
+
+
+class test_CompactDeck(unittest.TestCase):
+
+    def test_build_deck(self):
+        """CompactDeck builds the same cards in the same order as Deck"""
+        self.assertEqual(list(cd.CompactDeck()), list(db.Deck()))
+        self.assertEqual(list(cd.CompactDeck(jokers=True)), list(db.Deck(jokers=True)))
+        self.assertEqual(len(cd.CompactDeck()), 52)
+        self.assertEqual(str(cd.CompactDeck()), str(db.Deck()))
+
+    def test_dunder(self):
+        """Equality compares order, membership takes card codes"""
+        deck1 = cd.CompactDeck()
+        deck2 = cd.CompactDeck()
+        self.assertEqual(deck1, deck2)
+        deck2.push('hearts', 2)
+        self.assertNotEqual(deck1, deck2)
+        self.assertNotEqual(deck1, db.Deck())
+        self.assertIn('sace', deck1)
+        self.assertNotIn('h22', deck1)
+
+    def test_same_outputs_as_deck(self):
+        """Running the same operations on both implementations gives the same results"""
+        for method in ['uniform', 'riffle', 'overhand']:
+            deck = db.Deck(jokers=True, rng=11)
+            compact = cd.CompactDeck(jokers=True, rng=11)
+            for each in (deck, compact):
+                each.shuffle(method)
+                each.cut()
+            self.assertEqual(list(deck), list(compact))
+            self.assertEqual(deck.deal(3, 2), compact.deal(3, 2))
+            self.assertEqual(deck.draw(), compact.draw())
+            self.assertEqual(deck.draw_many(3), compact.draw_many(3))
+            self.assertEqual(list(deck.iter_deal(2, 2)), list(compact.iter_deal(2, 2)))
+            self.assertEqual(deck.find('hace'), compact.find('hace'))
+            self.assertEqual(deck.pull('hace'), compact.pull('hace'))
+            self.assertEqual(deck.pull('hace'), compact.pull('hace'))
+            self.assertEqual(deck.pull_list(['S2', 'd3', 'x11']), compact.pull_list(['S2', 'd3', 'x11']))
+            self.assertEqual(deck.pull_where(suit='clubs'), compact.pull_where(suit='clubs'))
+            self.assertEqual(deck.to_ids(), compact.to_ids())
+            self.assertEqual(deck.to_tuples(), compact.to_tuples())
+            deck.extend(deck.to_ids()[:5])
+            compact.extend(compact.to_ids()[:5])
+            self.assertEqual(deck.to_tuples(), compact.to_tuples())
+            self.assertEqual(cd.CompactDeck.from_ids(deck.to_ids()), compact)
+            if cd.np is not None:
+                self.assertEqual(deck.to_numpy().tolist(), compact.to_numpy().tolist())
+            deck.push('hearts', 55)
+            compact.push('hearts', 55)
+            self.assertEqual(deck.find('h55'), compact.find('h55'))
+            self.assertEqual(list(deck), list(compact))
+            # random draws pick different cards, but the same multiset stays behind
+            drawn = compact.draw_random(4)
+            self.assertEqual(len(compact), len(deck) - 4)
+            self.assertEqual(sorted(list(compact) + drawn), sorted(deck))
+            self.assertEqual(sorted(compact.peek_random(len(compact))), sorted(compact))
+
+    def test_errors(self):
+        """Invalid input fails the same way as Deck"""
+        deck = cd.CompactDeck()
+        self.assertEqual(deck.find(['h2', 'h3']), "Target card is not in this deck")
+        self.assertEqual(deck.pull('x11'), "Target card is not in this deck")
+        self.assertEqual(deck.deal(0, 0), [])
+        with self.assertRaises(Exception):
+            deck.deal(1, 100)
+        with self.assertRaises(Exception):
+            deck.deal(1, -1)
+        with self.assertRaises(TypeError):
+            deck.push(['hearts'], 2)
+        deck.deal(1, 52)
+        with self.assertRaises(Exception):
+            deck.draw()
+
+    def test_fork(self):
+        """Forks share the array until changed, and never change each other"""
+        deck = cd.CompactDeck(rng=3)
+        deck.shuffle()
+        expected = list(deck)
+        fork = deck.fork()
+        self.assertIs(fork._order, deck._order)
+        self.assertEqual(fork, deck)
+
+        # drawing from the top doesn't copy
+        self.assertEqual(fork.draw_many(2), expected[:2])
+        fork.deal(2, 2)
+        self.assertIs(fork._order, deck._order)
+        self.assertEqual(list(deck), expected)
+        self.assertEqual(list(fork), expected[6:])
+
+        # a fork of a fork, then changes that copy
+        branch = fork.fork()
+        branch.pull('hace')
+        branch.push('stars', 1)
+        self.assertIsNot(branch._order, fork._order)
+        self.assertEqual(list(fork), expected[6:])
+        self.assertEqual(len(branch), 46)
+        fork.cut()
+        fork.shuffle()
+        deck.push('hearts', 2)
+        self.assertEqual(list(deck), expected + [('2', 'hearts')])
+        self.assertIn('stars1', branch)
+        self.assertNotIn('stars1', deck)
+
+    def test_ends_without_copy(self):
+        """Pushing and pulling at the ends of a shared array don't copy it"""
+        deck = cd.CompactDeck(rng=5)
+        deck.shuffle()
+        expected = list(deck)
+        fork = deck.fork()
+        order = deck._order
+        fork.push('hearts', 'ace')
+        fork.extend([3, 4])
+        self.assertIs(fork._order, order)
+        self.assertEqual(list(deck), expected)
+        self.assertEqual(len(fork), 55)
+
+        # the other deck appends after its own end, so it copies
+        deck.push('spades', 'king')
+        self.assertIsNot(deck._order, order)
+        self.assertEqual(list(deck), expected + [('king', 'spades')])
+        self.assertEqual(list(fork)[-3:], [db.CARD_TABLE[each] for each in (12, 3, 4)])
+
+        # pulling the top or bottom card moves a bound, a card in the middle copies
+        branch = fork.fork()
+        branch.push('stars', 'north')
+        top, bottom = branch.to_ids()[0], branch.to_ids()[-1]
+        self.assertEqual(branch.pull(db.IDENTITIES[top].code), db.CARD_TABLE[top])
+        self.assertEqual(branch.pull(db.IDENTITIES[bottom].code), db.CARD_TABLE[bottom])
+        self.assertIs(branch._order, order)
+        self.assertEqual(list(branch), list(fork)[1:])
+        self.assertEqual(hash(branch), hash(db.Deck.from_ids(branch.to_ids())))
+        branch.pull('hace')
+        self.assertIsNot(branch._order, order)
+        self.assertEqual(len(fork), 55)
+
+    def test_draw_random(self):
+        """Random draws swap into the top slot, uniform and without touching forks"""
+        deck = cd.CompactDeck(rng=12)
+        fork = deck.fork()
+        drawn = deck.draw_random(5)
+        self.assertEqual(len(set(drawn)), 5)
+        self.assertEqual(sorted(list(deck) + drawn), sorted(fork))
+        self.assertEqual(list(fork), list(cd.CompactDeck()))
+        # a private array is drawn from in place
+        order = deck._order
+        deck.draw_random(40)
+        self.assertIs(deck._order, order)
+        self.assertEqual(deck.draw_random(0), [])
+        self.assertEqual(len(deck.draw_random(7)), 7)
+        self.assertEqual(len(deck), 0)
+
+        counts = Counter()
+        for seed in range(2600):
+            counts[cd.CompactDeck(rng=seed).draw_random()[0]] += 1
+        self.assertEqual(len(counts), 52)
+        self.assertTrue(20 < min(counts.values()) and max(counts.values()) < 80)
+
+    def test_deck_snapshot(self):
+        """A Deck snapshots into a CompactDeck with the same cards"""
+        deck = db.Deck(jokers=True, rng=4)
+        deck.shuffle()
+        deck.draw()
+        snapshot = deck.snapshot()
+        self.assertIsInstance(snapshot, cd.CompactDeck)
+        self.assertEqual(list(snapshot), list(deck))
+        branch = deck.fork()
+        branch.draw_many(10)
+        self.assertEqual(len(deck), 53)
+        self.assertEqual(list(branch), list(deck)[10:])
+
+        # a branch answers the same composition questions as a deck in its state
+        deck.draw_many(10)
+        deck.push('hearts', 'ace')
+        branch.push('hearts', 'ace')
+        for query in [{}, {'code': 'hace'}, {'code': 'x11'}, {'suit': 'HEARTS'}, {'name': 'joker'},
+                      {'suit': 'spades', 'name': 'Ace'}]:
+            self.assertEqual(branch.count(**query), deck.count(**query), query)
+            self.assertEqual(branch.probability(**query), deck.probability(**query), query)
+            self.assertEqual(branch.probability_at_least(2, 10, **query),
+                             deck.probability_at_least(2, 10, **query), query)
+        with self.assertRaises(Exception):
+            branch.probability_at_least(1, 100, suit='hearts')
+        self.assertEqual(cd.CompactDeck.from_ids([]).probability(suit='hearts'), 0.0)
+
+    def test_hash(self):
+        """A CompactDeck hashes like a Deck in the same order, and keeps the hash up to date"""
+        def recomputed(deck):
+            deck._hash = None
+            return hash(deck)
+
+        deck = db.Deck(jokers=True, rng=9)
+        deck.shuffle()
+        fork = deck.fork()
+        self.assertEqual(hash(fork), hash(deck))
+        self.assertEqual(hash(cd.CompactDeck()), hash(db.Deck()))
+        # each change keeps the hash equal to the hash of the same change on a Deck
+        for change in [lambda each: each.draw(), lambda each: each.deal(3, 2), lambda each: each.draw_many(4),
+                       lambda each: each.push('hearts', 'ace'), lambda each: each.extend([3, 4, 6]),
+                       lambda each: each.pull('cking'), lambda each: each.cut(),
+                       lambda each: each.pull_list(['h2', 'c3']), lambda each: each.pull_where(name='queen'),
+                       lambda each: list(each.iter_deal(2, 2))]:
+            before = hash(fork)
+            change(deck)
+            change(fork)
+            self.assertEqual(list(fork), list(deck))
+            self.assertNotEqual(hash(fork), before)
+            self.assertEqual(hash(fork), hash(deck))
+            self.assertEqual(hash(fork), recomputed(fork))
+        fork.draw_random(2)
+        self.assertEqual(hash(fork), hash(db.Deck.from_ids(fork.to_ids())))
+
+        # a transposition table finds a deck's state through its forks, and the other way
+        deck = db.Deck(rng=10)
+        deck.shuffle()
+        table = TranspositionTable()
+        table.store(deck, 'root')
+        self.assertEqual(table.get(deck.fork()), 'root')
+        branch = deck.fork()
+        branch.draw_many(2)
+        table.store(branch, 'two drawn')
+        deck.draw_many(2)
+        self.assertEqual(table.get(deck), 'two drawn')
+
+    def test_shoe_snapshot(self):
+        """A Shoe snapshots into a CompactShoe with its discard pile, dealt count and cut card"""
+        shoe = db.Shoe(n_decks=2, penetration=0.5, rng=6)
+        shoe.shuffle()
+        drawn = shoe.draw_many(30)
+        snapshot = shoe.snapshot()
+        self.assertIsInstance(snapshot, cd.CompactShoe)
+        self.assertEqual(list(snapshot), list(shoe))
+        self.assertEqual(hash(snapshot), hash(shoe))
+        self.assertEqual(snapshot.dealt, 30)
+        self.assertEqual(snapshot.cut_position, 52)
+        self.assertEqual([db.CARD_TABLE[each] for each in snapshot.discard_ids()], drawn)
+
+        # forks share the discard pile and keep drawing onto it, as the shoe does
+        fork = shoe.fork()
+        self.assertFalse(fork.needs_reshuffle)
+        self.assertEqual(fork.deal(2, 11), shoe.deal(2, 11))
+        self.assertEqual(fork.draw(), shoe.draw())
+        self.assertTrue(fork.needs_reshuffle)
+        self.assertEqual(fork.dealt, shoe.dealt)
+        self.assertEqual(list(fork.discard_ids()), [identity.id for identity in shoe._identities(shoe.discard_top)])
+        self.assertEqual(snapshot.dealt, 30)
+        self.assertEqual(len(snapshot.discard_ids()), 30)
+
+        # reshuffling brings every card back
+        fork.reshuffle()
+        self.assertEqual(len(fork), 104)
+        self.assertEqual(fork.dealt, 0)
+        self.assertEqual(len(fork.discard_ids()), 0)
+        self.assertEqual(Counter(fork.to_ids()), Counter(cd.CompactShoe(n_decks=2).to_ids()))
+        self.assertEqual(fork.cut_position, 52)
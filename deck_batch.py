@@ -0,0 +1,128 @@
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, only DeckBatch needs it
+    np = None
+
+from deck_builder import CARD_TABLE
+
+
+class DeckBatch:
+    """
+    Many decks held as one (N, deck size) matrix of card ids, shuffled and dealt together
+    with NumPy instead of one linked list at a time. Every deck in a batch is dealt the
+    same number of cards, so the top of every deck is the same column.
+    """
+
+    def __init__(self, n_decks: int, jokers=False, rng=None):
+        """
+        :param n_decks: number of decks in the batch
+        :param jokers: add the red and black jokers to each deck
+        :param rng: numpy Generator, or an int seed for a new one
+        """
+
+        if np is None:
+            raise ImportError("Error: DeckBatch requires numpy")
+        if rng is None or isinstance(rng, int):
+            rng = np.random.default_rng(rng)
+        self.rng = rng
+        self.jokers = jokers
+        size = 54 if jokers is True else 52
+        # every row starts in the standard build order, ids match the shared card table
+        self.cards = np.tile(np.arange(size, dtype=np.uint16), (n_decks, 1))
+        # column of the top card of every deck
+        self.top = 0
+
+    def __len__(self):
+        """Return number of decks in the batch"""
+        return self.cards.shape[0]
+
+    @property
+    def size(self):
+        """Number of cards left in each deck"""
+        return self.cards.shape[1] - self.top
+
+    def shuffle(self):
+        """
+        Shuffles the remaining cards of every deck independently, by sorting random keys
+        :return: None, the card matrix is reordered in place
+        """
+
+        remaining = self.cards[:, self.top:]
+        keys = self.rng.random(remaining.shape)
+        remaining[:] = np.take_along_axis(remaining, np.argsort(keys, axis=1), axis=1)
+
+    def deal(self, players: int, cards: int):
+        """
+        Deals from the top of every deck in the same round-robin order as Deck.deal
+        :param players: number of players to deal to
+        :param cards: number of cards to deal to each player
+        :return: card id array of shape (n_decks, players, cards)
+        """
+
+        count = players * cards
+        # check if card number input is valid
+        if cards > self.size or count > self.size:
+            raise Exception("Error: number of cards entered larger than deck")
+        elif cards < 0:
+            raise Exception("Error: number of cards entered less than 0")
+
+        block = self.cards[:, self.top:self.top + count]
+        self.top += count
+        # dealt card k goes to player k % players as their card k // players
+        return block.reshape(len(self), cards, players).transpose(0, 2, 1).copy()
+
+    def draw(self):
+        """
+        Draws the top card from every deck
+        :return: card id array of shape (n_decks,)
+        """
+
+        # check if decks are empty
+        if self.size == 0:
+            raise Exception("Deck is empty")
+        self.top += 1
+        return self.cards[:, self.top - 1].copy()
+
+    def remaining(self):
+        """Returns a view of the card ids left in every deck, top card first"""
+        return self.cards[:, self.top:]
+
+
+def to_tuples(ids):
+    """
+    Converts card ids from a DeckBatch back to card data tuples
+    :param ids: integer or (nested) array of card ids
+    :return: (name, suit) tuple, or nested lists of tuples matching the shape of ids
+    """
+
+    ids = ids.tolist() if hasattr(ids, 'tolist') else ids
+    if isinstance(ids, int):
+        return CARD_TABLE[ids]
+    return [to_tuples(each) for each in ids]
+
+
+# card id marking the unused end of a row in to_matrix, no card has this id
+EMPTY = 0xFFFF
+
+
+def to_matrix(decks, out=None, fill=EMPTY):
+    """
+    Writes the card ids of many decks into one matrix, a row per deck, top card first
+    :param decks: sequence of Deck, Shoe or CompactDeck objects
+    :param out: uint16 matrix to fill, at least len(decks) rows and as wide as the largest
+        deck, allocated if None
+    :param fill: id written after the last card of decks shorter than the row
+    :return: card id matrix, out if it was given
+    """
+
+    if np is None:
+        raise ImportError("Error: to_matrix requires numpy")
+    if out is None:
+        width = max((len(deck) for deck in decks), default=0)
+        out = np.empty((len(decks), width), dtype=np.uint16)
+    elif len(out) < len(decks):
+        raise ValueError("Error: output has fewer rows than there are decks")
+    for row, deck in zip(out, decks):
+        deck.to_ids(out=row)
+        row[len(deck):] = fill
+    return out
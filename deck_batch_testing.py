@@ -0,0 +1,64 @@
+import compact_deck as cd
+import deck_batch as dbatch
+import deck_builder as db
+import unittest
+
+
+@unittest.skipIf(dbatch.np is None, "numpy is not installed")
+class test_DeckBatch(unittest.TestCase):
+
+    def test_build(self):
+        """Each row of a new batch is a standard deck"""
+        batch = dbatch.DeckBatch(4, jokers=True)
+        self.assertEqual(len(batch), 4)
+        self.assertEqual(batch.size, 54)
+        for row in batch.remaining():
+            self.assertEqual(dbatch.to_tuples(row), list(db.Deck(jokers=True)))
+
+    def test_shuffle(self):
+        """Shuffles are seedable, independent per deck, and keep every card"""
+        batch = dbatch.DeckBatch(50, rng=1)
+        batch.shuffle()
+        again = dbatch.DeckBatch(50, rng=1)
+        again.shuffle()
+        self.assertTrue((batch.cards == again.cards).all())
+        # rows differ from each other and still hold every card once
+        self.assertGreater(len({tuple(row) for row in batch.cards.tolist()}), 1)
+        self.assertTrue((dbatch.np.sort(batch.cards, axis=1) == dbatch.np.arange(52)).all())
+
+    def test_deal(self):
+        """Hands come out in the same round-robin order as Deck.deal"""
+        batch = dbatch.DeckBatch(3, rng=5)
+        batch.shuffle()
+        hands = batch.deal(4, 2)
+        self.assertEqual(hands.shape, (3, 4, 2))
+        for i in range(3):
+            deck = db.Deck()
+            deck.shuffle(lambda cards, rng: [cards[j] for j in batch.cards[i].tolist()])
+            self.assertEqual(dbatch.to_tuples(hands[i]), deck.deal(4, 2))
+            self.assertEqual(dbatch.to_tuples(batch.cards[i, 8]), deck.draw())
+        self.assertEqual(dbatch.to_tuples(batch.draw()), [dbatch.to_tuples(x) for x in batch.cards[:, 8]])
+        self.assertEqual(batch.size, 43)
+
+        # try to deal too many cards
+        with self.assertRaises(Exception):
+            batch.deal(4, 11)
+
+    def test_to_matrix(self):
+        """Decks of any kind and length are written into one matrix, short rows filled"""
+        decks = [db.Deck(rng=i) for i in range(3)] + [cd.CompactDeck(jokers=True)]
+        for deck in decks[:3]:
+            deck.shuffle()
+        decks[1].draw_many(5)
+        matrix = dbatch.to_matrix(decks)
+        self.assertEqual(matrix.shape, (4, 54))
+        self.assertEqual(matrix.dtype, dbatch.np.uint16)
+        for row, deck in zip(matrix, decks):
+            self.assertEqual(dbatch.to_tuples(row[:len(deck)]), list(deck))
+            self.assertTrue((row[len(deck):] == dbatch.EMPTY).all())
+        out = dbatch.np.zeros((5, 60), dtype=dbatch.np.uint16)
+        self.assertIs(dbatch.to_matrix(decks, out), out)
+        self.assertTrue((out[:4, :54] == matrix).all())
+        self.assertTrue((out[4] == 0).all())
+        with self.assertRaises(ValueError):
+            dbatch.to_matrix(decks, out[:3])
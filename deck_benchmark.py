@@ -0,0 +1,265 @@
+"""
+Benchmarks for every Deck operation at realistic deck sizes
+
+Run as a script to time each operation on a single deck (52 cards), an 8 deck shoe
+(416 cards) and a 200 deck shoe (10,400 cards), measuring throughput and peak memory:
+
+    python deck_benchmark.py --output bench.json
+    python deck_benchmark.py --baseline bench.json --threshold 0.25
+
+With a baseline, any operation whose mean time grew by more than the threshold is
+reported and the script exits with status 1, so it can gate performance changes.
+
+--threads runs a contention stress test instead, where that many threads empty one
+SharedDeck shoe, drawing one card at a time and in reserved batches:
+
+    python deck_benchmark.py --threads 1 2 4 8 --batch 32
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import threading
+import time
+import tracemalloc
+
+from deck_builder import Deck, Shoe
+from shared_deck import SharedDeck
+
+# deck sizes to run, name -> function building a fresh deck of that size
+SIZES = {
+    52: lambda: Deck(),
+    416: lambda: Shoe(8),
+    10400: lambda: Shoe(200),
+}
+
+HEARTS = ['h' + str(i) for i in range(2, 11)] + ['hjack', 'hqueen', 'hking', 'hace']
+
+
+def _iterate(deck):
+    for _ in deck:
+        pass
+
+
+def _push_back(deck, cards):
+    for name, suit in cards:
+        deck.push(suit, name)
+
+
+# operation name -> (function taking a prepared deck and an equal copy,
+#                    function undoing the operation outside the timed region, or None)
+OPERATIONS = {
+    'build_deck': (None, None),
+    'shuffle': (lambda deck, other: deck.shuffle(), None),
+    'find': (lambda deck, other: deck.find('sace'), None),
+    'pull': (lambda deck, other: deck.pull('sace'),
+             lambda deck, result: deck.push('spades', 'ace')),
+    'pull_list': (lambda deck, other: deck.pull_list(HEARTS),
+                  lambda deck, result: [deck.push('hearts', code[1:]) for code in HEARTS]),
+    'cut': (lambda deck, other: deck.cut(), None),
+    'deal': (lambda deck, other: deck.deal(6, 5),
+             lambda deck, result: [_push_back(deck, hand) for hand in result]),
+    'draw': (lambda deck, other: deck.draw(),
+             lambda deck, result: _push_back(deck, [result])),
+    'push': (lambda deck, other: deck.push('hearts', '2'),
+             lambda deck, result: deck.pull('h2')),
+    '__iter__': (lambda deck, other: _iterate(deck), None),
+    'to_ids': (lambda deck, other: deck.to_ids(), None),
+    'to_tuples': (lambda deck, other: deck.to_tuples(), None),
+    '__eq__': (lambda deck, other: deck == other, None),
+}
+
+
+def _prepare(factory):
+    """Builds a shuffled deck and an equal copy of it"""
+    deck = factory()
+    deck.rng = random.Random(0)
+    deck.shuffle()
+    other = factory()
+    other.rng = random.Random(0)
+    other.shuffle()
+    return deck, other
+
+
+def time_operation(size, name, min_time=0.2):
+    """
+    Times one operation on a prepared deck. Operations that change the deck are timed one
+    call at a time and undone between calls, outside the timed region, so the deck keeps
+    its size
+    :param size: key of SIZES
+    :param name: key of OPERATIONS
+    :param min_time: least total seconds of timed calls to collect
+    :return: dict with calls, mean_us, ops_per_sec and peak_bytes
+    """
+
+    factory = SIZES[size]
+    operation, restore = OPERATIONS[name]
+    if operation is None:
+        def operation(deck, other):
+            factory()
+
+    clock = time.perf_counter_ns
+    elapsed = 0
+    calls = 0
+    batch = 1
+    deck, other = _prepare(factory)
+    while elapsed < min_time * 1e9:
+        if restore is None:
+            start = clock()
+            for _ in range(batch):
+                operation(deck, other)
+            elapsed += clock() - start
+            calls += batch
+            batch = min(batch * 2, 1024)
+        else:
+            start = clock()
+            result = operation(deck, other)
+            elapsed += clock() - start
+            calls += 1
+            restore(deck, result)
+
+    # peak memory allocated by one call on its own
+    deck, other = _prepare(factory)
+    tracemalloc.start()
+    operation(deck, other)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    mean = elapsed / calls
+    return {
+        'calls': calls,
+        'mean_us': mean / 1000,
+        'ops_per_sec': 1e9 / mean if mean else float('inf'),
+        'peak_bytes': peak,
+    }
+
+
+def run(sizes=None, operations=None, min_time=0.2, report=None):
+    """
+    Runs the benchmark suite
+    :param sizes: deck sizes to run, all of SIZES by default
+    :param operations: operation names to run, all of OPERATIONS by default
+    :param min_time: least seconds of timed calls per operation
+    :param report: function called with a line of text after each result
+    :return: dict of results keyed 'size:operation', plus run details
+    """
+
+    results = {}
+    for size in sizes or SIZES:
+        for name in operations or OPERATIONS:
+            result = time_operation(size, name, min_time)
+            results[f"{size}:{name}"] = result
+            if report is not None:
+                report(f"{size:>6} {name:<10} {result['mean_us']:>12.2f} us "
+                       f"{result['ops_per_sec']:>12.0f} ops/s {result['peak_bytes']:>10} B peak")
+    return {
+        'python': sys.version.split()[0],
+        'implementation': platform.python_implementation(),
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold=0.25):
+    """
+    Finds operations that got slower than the baseline by more than the threshold
+    :param current: output of run
+    :param baseline: output of an earlier run
+    :param threshold: allowed relative growth of mean time, 0.25 allows 25% slower
+    :return: list of (key, baseline mean_us, current mean_us, ratio), slowest first
+    """
+
+    regressions = []
+    for key, result in current['results'].items():
+        old = baseline['results'].get(key)
+        if old is None or old['mean_us'] <= 0:
+            continue
+        ratio = result['mean_us'] / old['mean_us']
+        if ratio > 1 + threshold:
+            regressions.append((key, old['mean_us'], result['mean_us'], ratio))
+    return sorted(regressions, key=lambda each: each[3], reverse=True)
+
+
+def contention(threads, batch=1, n_decks=200):
+    """
+    Times several threads emptying one shared shoe
+    :param threads: number of worker threads
+    :param batch: cards each worker reserves at a time, 1 draws card by card
+    :param n_decks: decks in the shoe
+    :return: dict with cards, seconds and cards_per_sec
+    """
+
+    shared = SharedDeck(Shoe(n_decks, rng=0))
+    cards = len(shared)
+    start = threading.Barrier(threads + 1)
+
+    def work():
+        start.wait()
+        while shared.reserve(batch):
+            pass
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    start.wait()
+    begin = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    seconds = time.perf_counter() - begin
+    return {'cards': cards, 'seconds': seconds, 'cards_per_sec': cards / seconds}
+
+
+def run_contention(threads, batch, report=None):
+    """
+    Runs the contention test for each thread count, card by card and with batches
+    :return: dict of results keyed 'threads:batch', plus run details
+    """
+
+    results = {}
+    for count in threads:
+        for size in sorted({1, batch}):
+            result = contention(count, size)
+            results[f"{count}:{size}"] = result
+            if report is not None:
+                report(f"{count:>3} threads batch {size:<4} {result['cards_per_sec']:>12.0f} cards/s")
+    # sys._is_gil_enabled only exists on 3.13+, where the GIL can be turned off
+    gil = getattr(sys, '_is_gil_enabled', lambda: True)()
+    return {'python': sys.version.split()[0], 'gil': gil, 'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Deck operations")
+    parser.add_argument('--sizes', type=int, nargs='+', choices=sorted(SIZES), help="deck sizes to run")
+    parser.add_argument('--operations', nargs='+', choices=list(OPERATIONS), help="operations to run")
+    parser.add_argument('--min-time', type=float, default=0.2, help="seconds of timing per operation")
+    parser.add_argument('--output', help="write results as JSON to this file")
+    parser.add_argument('--baseline', help="compare against results stored in this JSON file")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed slowdown against the baseline")
+    parser.add_argument('--threads', type=int, nargs='+', help="run the shared shoe contention test instead")
+    parser.add_argument('--batch', type=int, default=32, help="cards reserved at a time in the contention test")
+    args = parser.parse_args(argv)
+
+    if args.threads:
+        current = run_contention(args.threads, args.batch, report=print)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(current, f, indent=2)
+        return 0
+
+    current = run(args.sizes, args.operations, args.min_time, report=print)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold)
+        for key, old, new, ratio in regressions:
+            print(f"REGRESSION {key}: {old:.2f} us -> {new:.2f} us ({ratio:.2f}x)")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
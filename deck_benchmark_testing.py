@@ -0,0 +1,32 @@
+import deck_benchmark as bench
+import unittest
+
+
+class test_Benchmark(unittest.TestCase):
+
+    def test_run(self):
+        """A short run times every operation and leaves results in the stored format"""
+        current = bench.run(sizes=[52], min_time=0.001)
+        self.assertEqual(set(current['results']), {f"52:{name}" for name in bench.OPERATIONS})
+        for result in current['results'].values():
+            self.assertGreater(result['calls'], 0)
+            self.assertGreater(result['ops_per_sec'], 0)
+            self.assertGreaterEqual(result['peak_bytes'], 0)
+
+    def test_compare(self):
+        """Only operations slower than the threshold are reported, slowest first"""
+        baseline = {'results': {'52:draw': {'mean_us': 1.0}, '52:find': {'mean_us': 2.0},
+                                '52:cut': {'mean_us': 4.0}}}
+        current = {'results': {'52:draw': {'mean_us': 1.2}, '52:find': {'mean_us': 3.0},
+                               '52:cut': {'mean_us': 8.0}, '52:push': {'mean_us': 9.0}}}
+        regressions = bench.compare(current, baseline, threshold=0.25)
+        self.assertEqual([each[0] for each in regressions], ['52:cut', '52:find'])
+        self.assertEqual(bench.compare(current, baseline, threshold=1.5), [])
+
+    def test_contention(self):
+        """Every card of the shared shoe is counted, card by card and in batches"""
+        current = bench.run_contention([1, 3], 16)
+        self.assertEqual(set(current['results']), {'1:1', '1:16', '3:1', '3:16'})
+        for result in current['results'].values():
+            self.assertEqual(result['cards'], 200 * 52)
+            self.assertGreater(result['cards_per_sec'], 0)
@@ -1,20 +1,638 @@
+from array import array
+from collections import Counter
+from functools import lru_cache
+import math
+import os
 import random
+import struct
+import sys
+
+import shuffles
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, only to_numpy needs it
+    np = None
+
+class CardIdentity:
+    """
+    Immutable suit/name pair shared by every Card object holding that card, in every deck.
+    Identities are interned with get_identity, so two cards with the same suit and name
+    point at the same object and their data, code and keys are computed once.
+    """
+
+    __slots__ = ('id', 'suit', 'name', 'code', 'key', 'data', 'zobrist')
+
+    def __init__(self, card_id, suit, name, code):
+        set_attr = object.__setattr__
+        set_attr(self, 'id', card_id)
+        # random 64-bit key used by the position-dependent deck hash
+        set_attr(self, 'zobrist', _zobrist_rng.getrandbits(64))
+        set_attr(self, 'suit', suit)
+        set_attr(self, 'name', name)
+        # unique short form, suit prefix and value (ex. 'h2'), see _make_code
+        set_attr(self, 'code', code)
+        # lowercase (name, suit) used for case-independent comparison
+        set_attr(self, 'key', (name.lower(), suit.lower()))
+        # card data tuple (name, suit) handed out by Deck methods
+        set_attr(self, 'data', (name, suit))
+
+    def __setattr__(self, attr, value):
+        raise AttributeError("Error: card identities are immutable")
+
+    def __reduce__(self):
+        """Copies and unpickles through get_identity, so they get the interned identity back"""
+        return get_identity, (self.suit, self.name)
+
+    def __str__(self):
+        """Returns first letter of suit and value"""
+        return self.code
+
+
+# fixed seed, so a card registered in the same order gets the same hash key in every process
+_zobrist_rng = random.Random(0x5EED)
+# a deck's hash is the sum of key * _BASE ** position over its cards, modulo 2 ** 64. The
+# base is odd, so it has an inverse that moves every position up by one after a top removal
+_MODULUS = 1 << 64
+_MASK = _MODULUS - 1
+_BASE = 0x9E3779B97F4A7C15
+_INVERSE = pow(_BASE, -1, _MODULUS)
+# names of the numbered cards of the standard deck, the face cards follow them
+_NUMBER_RANKS = [str(i) for i in range(2, 11)]
+# Deck attributes rebuilt from the cards by __setstate__ rather than copied or pickled
+_LINKED_STATE = frozenset(['top', 'bottom', 'size', '_index', '_positions', '_offset', '_gaps',
+                           '_suit_counts', '_name_counts', '_card_counts', '_hash', '_pool', '_journal',
+                           'discard_top', 'discard_bottom'])
+
+
+def _order_hash(cards):
+    """
+    Position-dependent hash of a run of cards, as if the first one were on top
+    :param cards: iterable of card objects, top first
+    :return: 64-bit int
+    """
+
+    total = 0
+    power = 1
+    for card in cards:
+        total = (total + card.identity.zobrist * power) & _MASK
+        power = (power * _BASE) & _MASK
+    return total
+
+
+def hash_ids(ids):
+    """
+    Position-dependent hash of a run of card ids, the hash a deck holding them in this
+    order has, whatever its class
+    :param ids: card ids, top first
+    :return: 64-bit int
+    """
+
+    total = 0
+    power = 1
+    for each in ids:
+        total = (total + IDENTITIES[each].zobrist * power) & _MASK
+        power = (power * _BASE) & _MASK
+    return total
+
+
+def hash_after_draw(deck_hash, drawn_hash, k):
+    """
+    Hash of a deck once its top k cards are gone, the cards left move up k positions
+    :param deck_hash: hash of the deck before the draw
+    :param drawn_hash: hash of the k cards drawn, top first
+    :param k: number of cards drawn
+    :return: 64-bit int
+    """
+    return ((deck_hash - drawn_hash) * pow(_INVERSE, k, _MODULUS)) & _MASK
+
+
+def hash_after_push(deck_hash, size, key):
+    """
+    Hash of a deck once a card joins its bottom
+    :param deck_hash: hash of the deck before the push
+    :param size: number of cards in the deck before the push
+    :param key: zobrist key of the card's identity
+    :return: 64-bit int
+    """
+    return (deck_hash + key * pow(_BASE, size, _MODULUS)) & _MASK
+
+
+# set by deck_profiler while profiling, None otherwise, so each walk over the linked list
+# costs one check to report how many cards it visited
+_profiler = None
+
+
+# shared card table, every distinct (suit, name) pair gets a small integer id
+# ids 0-51 are the standard deck in build order, 52 and 53 are the red and black jokers
+IDENTITIES = []  # id -> CardIdentity
+CARD_TABLE = []  # id -> card data tuple (name, suit)
+CARD_IDS = {}  # (suit, name) -> id
+CODE_IDS = {}  # card code (ex. 'h2') -> id, every code belongs to exactly one card
+# suit -> prefix of its codes, for the four standard suits, any other suit is spelled out in full
+SUIT_PREFIXES = {'hearts': 'h', 'clubs': 'c', 'diamonds': 'd', 'spades': 's'}
+# the jokers keep their own one-letter spelling, other red and black cards (ex. UNO) don't
+_JOKER_CODES = {('red', 'joker'): 'rjoker', ('black', 'joker'): 'bjoker'}
+
+
+def _make_code(suit, name):
+    """
+    Code of a card being registered: the prefix of its suit followed by its name ('h2'),
+    or the whole suit for suits without a prefix ('stars2', 'red7'), so a card has the same
+    code whatever a process registered before it. The jokers are 'rjoker' and 'bjoker'.
+    Raises ValueError if the code would spell another card's code (ex. 'star' + 's2' and
+    'stars' + '2')
+    """
+
+    code = _JOKER_CODES.get((suit, name)) or SUIT_PREFIXES.get(suit, suit) + name
+    if code in CODE_IDS:
+        other = IDENTITIES[CODE_IDS[code]]
+        raise ValueError(f"Error: code {code!r} of {name} of {suit} is already the code of {other.name} of {other.suit}")
+    return code
+
+
+def code_id(code):
+    """
+    Parses a card code into its id in the shared card table
+    :param code: card code (ex. 'hace')
+    :return: integer id, or None if no card has this code
+    """
+    return CODE_IDS.get(code) if isinstance(code, str) else None
+
+
+def get_identity(suit, name):
+    """
+    Looks up the interned identity of a card, registering it in the card table if it is new
+    :param suit: string of the suit, or None
+    :param name: name of the card, converted to string
+    :return: CardIdentity shared by every card with this suit and name
+    """
+
+    # reject suit input if not string or None
+    if (suit is not None) and (type(suit) is not str):
+        raise TypeError("Suit input must be string or None")
+    key = (str(suit), str(name))
+    if key in CARD_IDS:
+        return IDENTITIES[CARD_IDS[key]]
+    identity = CardIdentity(len(IDENTITIES), *key, _make_code(*key))
+    IDENTITIES.append(identity)
+    CARD_TABLE.append(identity.data)
+    CARD_IDS[key] = identity.id
+    CODE_IDS[identity.code] = identity.id
+    return identity
+
+
+def card_id(suit, name):
+    """
+    Looks up the id of a card in the shared card table, registering it if it is new
+    :param suit: string of the suit, or None
+    :param name: name of the card, converted to string
+    :return: integer id of the card
+    """
+    return get_identity(suit, name).id
+
+
+# generator for decks created without one, reseeded in forked child processes so that
+# workers don't repeat each other's shuffles (as the random module does)
+_shared_rng = random.Random()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_shared_rng.seed)
+
+
+def make_rng(rng=None):
+    """
+    Resolves the rng argument of the deck classes
+    :param rng: None for the shared generator, an int seed for a new random.Random, or any
+        object with the random.Random interface
+    :return: random number generator
+    """
+
+    if rng is None:
+        return _shared_rng
+    if isinstance(rng, int):
+        return random.Random(rng)
+    return rng
+
+
+def ids_to_bytes(ids):
+    """
+    Packs card ids into bytes: a width byte (1 or 2) followed by one or two bytes per card,
+    two byte ids are little-endian
+    :param ids: sequence of card ids
+    :return: bytes
+    """
+
+    if not ids or max(ids) < 256:
+        return b'\x01' + array('B', ids).tobytes()
+    packed = array('H', ids)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return b'\x02' + packed.tobytes()
+
+
+def bytes_to_ids(data):
+    """
+    Unpacks card ids written by ids_to_bytes
+    :param data: bytes-like object
+    :return: array of card ids
+    """
+
+    width = data[0]
+    if width == 1:
+        return array('B', data[1:])
+    if width == 2:
+        ids = array('H', data[1:])
+        if sys.byteorder == 'big':
+            ids.byteswap()
+        return ids
+    raise ValueError("Error: data is not a packed deck")
+
+
+# ids below FIXED_IDS are the standard cards and jokers, registered at import in the same
+# order in every process. Larger ids depend on what a process registered first, so packed
+# decks carry the suit and name of each such card instead
+FIXED_IDS = 54
+# width byte flag of a packed deck whose card table follows the width byte
+_HAS_TABLE = 0x80
+_LENGTH = struct.Struct('<H')
+
+
+def pack_identity(identity):
+    """
+    Packs the suit and name of a card, each as a two byte length and utf-8 text
+    :param identity: CardIdentity
+    :return: bytes, read back with unpack_identity
+    """
+
+    suit, name = identity.suit.encode(), identity.name.encode()
+    return _LENGTH.pack(len(suit)) + suit + _LENGTH.pack(len(name)) + name
+
+
+def unpack_identity_text(data, offset=0):
+    """
+    Reads the suit and name of a card written by pack_identity, without registering it
+    :param data: bytes-like object
+    :param offset: position of the packed card in data
+    :return: (suit, name, offset just after the packed card), or None if data ends first
+    """
+
+    text = []
+    for _ in range(2):
+        if offset + _LENGTH.size > len(data):
+            return None
+        (length,) = _LENGTH.unpack_from(data, offset)
+        offset += _LENGTH.size
+        if offset + length > len(data):
+            return None
+        text.append(bytes(data[offset:offset + length]).decode())
+        offset += length
+    return text[0], text[1], offset
+
+
+def unpack_identity(data, offset=0):
+    """
+    Reads a card written by pack_identity, registering it in the card table if it is new
+    :param data: bytes-like object
+    :param offset: position of the packed card in data
+    :return: (card id in this process, offset just after the packed card)
+    """
+
+    unpacked = unpack_identity_text(data, offset)
+    if unpacked is None:
+        raise ValueError("Error: packed card is cut off")
+    suit, name, offset = unpacked
+    return card_id(suit, name), offset
+
+
+def pack_cards(ids):
+    """
+    Packs card ids as by ids_to_bytes, so that any process can read them back. Ids from
+    FIXED_IDS up are renumbered from FIXED_IDS in order of first appearance, and the suit
+    and name of each follow the width byte (flagged with 0x80) as a two byte count and
+    pack_identity entries
+    :param ids: sequence of card ids
+    :return: bytes, read back with unpack_cards
+    """
+
+    if not len(ids) or max(ids) < FIXED_IDS:
+        return ids_to_bytes(ids)
+    renumbered = {}
+    packed = []
+    for each in ids:
+        if each >= FIXED_IDS:
+            each = renumbered.setdefault(each, FIXED_IDS + len(renumbered))
+        packed.append(each)
+    data = ids_to_bytes(packed)
+    table = [pack_identity(IDENTITIES[each]) for each in renumbered]
+    return bytes([data[0] | _HAS_TABLE]) + _LENGTH.pack(len(table)) + b''.join(table) + data[1:]
+
+
+def unpack_cards(data):
+    """
+    Unpacks card ids written by pack_cards, registering the cards of its table
+    :param data: bytes-like object
+    :return: array of card ids in this process
+    """
+
+    if not len(data) or not data[0] & _HAS_TABLE:
+        return bytes_to_ids(data)
+    if len(data) < 1 + _LENGTH.size:
+        raise ValueError("Error: data is not a packed deck")
+    (count,) = _LENGTH.unpack_from(data, 1)
+    offset = 1 + _LENGTH.size
+    table = []
+    for _ in range(count):
+        each, offset = unpack_identity(data, offset)
+        table.append(each)
+    ids = bytes_to_ids(bytes([data[0] & ~_HAS_TABLE]) + bytes(data[offset:]))
+    if ids and max(ids) >= FIXED_IDS + count:
+        raise ValueError("Error: packed card id is not in the packed card table")
+    return array('H', [table[each - FIXED_IDS] if each >= FIXED_IDS else each for each in ids])
+
+
+for _suit in ["hearts", "clubs", "diamonds", "spades"]:
+    for _name in [str(i) for i in range(2, 11)] + ["jack", "queen", "king", "ace"]:
+        card_id(_suit, _name)
+card_id('red', 'joker')
+card_id('black', 'joker')
+del _suit, _name
+
+
+def check_ids(ids):
+    """
+    Card ids as a list of ints, checked against the shared card table
+    :param ids: sequence of card ids, NumPy arrays included
+    :return: list of ints
+    """
+
+    ids = ids.tolist() if hasattr(ids, 'tolist') else list(ids)
+    if ids and (min(ids) < 0 or max(ids) >= len(IDENTITIES)):
+        raise ValueError("Error: card id is not in the card table")
+    return ids
+
+
+def write_ids(ids, out):
+    """
+    Copies card ids into the start of a buffer
+    :param ids: card ids, array or NumPy array
+    :param out: writable buffer, see Deck.to_ids
+    :return: out
+    """
+
+    if len(out) < len(ids):
+        raise ValueError("Error: output is shorter than the deck")
+    if isinstance(out, (array, memoryview)):
+        # typed buffers only take ids of their own item type
+        code = out.typecode if isinstance(out, array) else out.format
+        if getattr(ids, 'typecode', None) != code:
+            ids = array(code, ids.tolist())
+    out[:len(ids)] = ids
+    return out
+
+
+def requested_ids(cards):
+    """
+    Multiset of the cards a pull_list asks for
+    :param cards: list of card codes, any case
+    :return: dict of card id -> times requested, codes of no card left out
+    """
+
+    wanted = {}
+    for code in cards:
+        key = code_id(code.lower())
+        if key is not None:
+            wanted[key] = wanted.get(key, 0) + 1
+    return wanted
+
+
+def unmatched_codes(cards, wanted):
+    """
+    Codes of a pull_list that found no card, in request order
+    :param cards: list of card codes, as requested
+    :param wanted: requested_ids(cards) less every card pulled, the later repeats of a
+        code are the ones reported
+    :return: list of codes
+    """
+
+    wanted = dict(wanted)
+    missing = []
+    for code in reversed(cards):
+        key = code_id(code.lower())
+        if key is None or wanted.get(key):
+            missing.append(code)
+            if key is not None:
+                wanted[key] -= 1
+    missing.reverse()
+    return missing
+
+
+def card_filter(fn=None, suit=None, name=None):
+    """
+    Predicate on card identities for pull_where
+    :param fn: callable taking a card data tuple (name, suit), or None
+    :param suit: suit the card must have, or None
+    :param name: name the card must have, or None
+    :return: callable taking a CardIdentity, True for a matching card
+    """
+
+    name = None if name is None else str(name)
+
+    def match(identity):
+        return ((suit is None or identity.suit == suit) and (name is None or identity.name == name)
+                and (fn is None or fn(identity.data)))
+    return match
+
+
+class Prototype:
+    """Cached card order for building decks"""
+
+    __slots__ = ('identities',)
+
+    def __init__(self, identities):
+        self.identities = identities
+
+
+@lru_cache(maxsize=32)
+def prototype(n_decks: int, jokers: bool, suits: tuple, ranks: tuple):
+    """
+    Card order of a freshly built deck, cached for each kind of deck
+    :param n_decks: number of decks, one after another
+    :param jokers: follow each deck with a red and a black joker
+    :param suits: suit names, in build order
+    :param ranks: card names, in build order within each suit
+    :return: Prototype
+    """
+
+    one_deck = [get_identity(suit, name) for suit in suits for name in ranks]
+    if jokers:
+        one_deck += [get_identity('red', 'joker'), get_identity('black', 'joker')]
+    return Prototype(tuple(one_deck) * n_decks)
+
+
+class DeckSpec:
+    """
+    Definition of a kind of deck: its cards in build order, repeated cards included.
+    Each distinct card gets a dense id (0 to number of distinct cards - 1, in build
+    order), with lookup tables between dense ids, codes, data tuples and the ids of the
+    shared card table, all built once.
+    """
+
+    def __init__(self, cards, name=None):
+        """
+        :param cards: iterable of (suit, name) pairs in build order, a card listed twice is
+            in the deck twice
+        :param name: label of the kind of deck (ex. 'pinochle')
+        """
+
+        self.name = name
+        # every card of one deck in build order, as shared identities
+        self.identities = tuple(get_identity(str(suit), str(card)) for suit, card in cards)
+        distinct = list(dict.fromkeys(self.identities))
+        # dense id -> shared table id, code and data tuple (name, suit)
+        self.card_ids = tuple(each.id for each in distinct)
+        self.codes = tuple(each.code for each in distinct)
+        self.tuples = tuple(each.data for each in distinct)
+        # and back to dense ids
+        self.code_ids = {code: i for i, code in enumerate(self.codes)}
+        self.tuple_ids = {data: i for i, data in enumerate(self.tuples)}
+        self.table_ids = {each: i for i, each in enumerate(self.card_ids)}
+        # suits and names in order of first appearance
+        self.suits = list(dict.fromkeys(each.suit for each in distinct))
+        self.ranks = list(dict.fromkeys(each.name for each in distinct))
+        self._prototypes = {}
+
+    @classmethod
+    def grid(cls, suits, ranks, copies=1, extras=(), name=None):
+        """
+        Spec of every rank in every suit, like the standard deck
+        :param suits: suit names, in build order
+        :param ranks: card names, in build order within each suit
+        :param copies: times each card of the grid is in the deck (2 for pinochle)
+        :param extras: (suit, name) pairs added after the grid (ex. jokers or trumps)
+        :param name: label of the kind of deck
+        :return: DeckSpec
+        """
+
+        cards = [(suit, rank) for suit in suits for rank in ranks for _ in range(copies)]
+        return cls(cards + list(extras), name)
+
+    def __len__(self):
+        """Return number of cards in one deck of this kind"""
+        return len(self.identities)
+
+    def __repr__(self):
+        return f"DeckSpec({self.name!r}, {len(self)} cards, {len(self.codes)} distinct)"
+
+    def id(self, target):
+        """
+        Dense id of a card of this spec
+        :param target: card code (ex. 'hace'), data tuple (name, suit) or Card
+        :return: integer id, raises ValueError if the card is not part of this spec
+        """
+
+        if isinstance(target, Card):
+            target = target.identity.code
+        table = self.code_ids if isinstance(target, str) else self.tuple_ids
+        try:
+            return table[target]
+        except (KeyError, TypeError):
+            raise ValueError(f"Error: {target!r} is not a card of this deck") from None
+
+    def code(self, dense_id: int):
+        """Code of the card with a dense id"""
+        return self.codes[dense_id]
+
+    def data(self, dense_id: int):
+        """Data tuple (name, suit) of the card with a dense id"""
+        return self.tuples[dense_id]
+
+    def prototype(self, n_decks=1, jokers=False):
+        """
+        Card order of a deck of this kind, cached
+        :param n_decks: number of decks, one after another
+        :param jokers: follow each deck with a red and a black joker
+        :return: Prototype
+        """
+
+        key = (n_decks, jokers)
+        if key not in self._prototypes:
+            one_deck = self.identities
+            if jokers:
+                one_deck += (get_identity('red', 'joker'), get_identity('black', 'joker'))
+            self._prototypes[key] = Prototype(one_deck * n_decks)
+        return self._prototypes[key]
 
 
 class Deck:
-    def __init__(self, jokers=False):
+    def __init__(self, jokers=False, rng=None, n_decks=1, suits=None, ranks=None, spec=None):
+        """
+        :param jokers: add a red and a black joker to each deck
+        :param rng: random number generator, or an int seed for a new one
+        :param n_decks: number of decks built into this one
+        :param suits: custom suit names, defaults to hearts, clubs, diamonds and spades
+        :param ranks: custom card names, defaults to 2-10, jack, queen, king and ace
+        :param spec: DeckSpec of the cards to build instead of suits and ranks (ex. UNO)
+        """
+        self._setup(jokers, rng)
+        self.n_decks = n_decks
+        self.spec = spec
+        if spec is not None:
+            self.suits = list(spec.suits)
+            self.ranks = list(spec.ranks)
+        if suits is not None:
+            self.suits = [str(each) for each in suits]
+        if ranks is not None:
+            self.ranks = [str(each) for each in ranks]
+        # create deck
+        self.build_deck()
+
+    def _setup(self, jokers, rng):
+        """Initializes an empty deck, shared by __init__ and the bulk constructors"""
         # make each suit names and face card names lowercase for later processing
         self.suits = ["hearts", "clubs", "diamonds", "spades"]
         self.face_cards = ["jack", "queen", "king", "ace"]
+        self.ranks = _NUMBER_RANKS + self.face_cards
+        self.n_decks = 1
+        # DeckSpec the deck was built from, None for suits and ranks
+        self.spec = None
         # using jokers?
         self.jokers = jokers
+        # random number generator, an int seeds a private one for reproducible runs
+        self.rng = make_rng(rng)
         # top and bottom of deck, occupied by a card
         self.bottom = None
         self.top = None
         # initialize deck size counter
         self.size = 0
-        # create deck
-        self.build_deck()
+        # index from card id to the card object holding it, or to a dict of the card objects
+        # keyed by id() once the deck holds duplicates of that card, built in one walk by the
+        # first lookup (None until then) so that building a deck only links its cards
+        # card codes (ex. 'hace') are parsed into ids once, on the way in
+        self._index = None
+        # optional positional index, id() of each card to its position plus self._offset
+        # rebuilt lazily by find/pull and dropped whenever the deck is reordered. Pulling
+        # from mid-deck leaves a gap instead, the labels still increase from top to bottom,
+        # so duplicates are told apart without a rebuild and only find needs exact positions
+        self._positions = None
+        self._offset = 0
+        self._gaps = False
+        # live composition of the deck, counted case-independently by suit, by name and by
+        # card, counted in one walk by the first count (None until then)
+        self._suit_counts = None
+        self._name_counts = None
+        self._card_counts = None
+        # position-dependent hash, see _order_hash, kept up to date by draws, pushes and
+        # pulls from either end, and recomputed lazily after changes that move every card
+        # or the cards below a pull from mid-deck (None until then)
+        self._hash = 0
+        # every card object of the deck in no particular order, for random draws, dropped
+        # whenever a card joins or leaves the deck other than by a random draw
+        self._pool = None
+        # lazily shuffled: the order is left alone and every draw from the top takes
+        # uniformly random cards instead, see shuffle(lazy=True)
+        self._lazy = False
+        # DeckJournal recording every change to the deck, set by DeckJournal.attach
+        self._journal = None
 
     def __str__(self):
         """Returns list with string representation of each card in deck"""
@@ -27,90 +645,537 @@ class Deck:
 
     def __iter__(self):
         """Returns n-tuples containing name and suit of each card in deck of length n"""
+        if _profiler is not None:
+            _profiler.hops(self.size)
         card = self.top
         while card is not None:
             yield card.get_data()
             card = card.get_next()
 
+    def __contains__(self, target):
+        """Checks if a card code (ex. 'h2') is in the deck without walking it"""
+        return code_id(target) in self._get_index()
+
     def __eq__(self, other):
-        """Two decks are equal if they contain the same exact cards in the same order"""
-        if type(other) is Deck and len(self) == len(other):
-            for each, other_each in zip(self, other):
+        """
+        Two decks are equal if they contain the same exact cards in the same order
+        Decks with different hashes are unequal without walking them
+        """
+
+        if type(other) is type(self) and len(self) == len(other) and hash(self) == hash(other):
+            if _profiler is not None:
+                _profiler.hops(2 * self.size)
+            card, other_card = self.top, other.top
+            while card is not None:
                 # catch any instance of cards not equaling in order
-                if each != other_each:
+                if card.identity is not other_card.identity:
                     return False
+                card, other_card = card.next, other_card.next
             # if all cards match, then decks equal
             return True
         # if other is not Deck class or length if different from self
         return False
 
+    def __hash__(self):
+        """
+        Order-sensitive hash of the current cards, each card's key weighted by its
+        position (see _order_hash), updated as the deck changes
+        Changing a deck changes its hash, so store hash(deck) or use TranspositionTable
+        rather than keeping a deck that will change as a dict key
+        """
+
+        if self._hash is None:
+            total = 0
+            power = 1
+            card = self.top
+            while card is not None:
+                total = (total + card.identity.zobrist * power) & _MASK
+                power = (power * _BASE) & _MASK
+                card = card.next
+            self._hash = total
+            if _profiler is not None:
+                _profiler.hops(self.size)
+        return self._hash
+
+    def __getstate__(self):
+        """
+        State for copy and pickle: the settings of the deck and the identities of its cards
+        top first, which unpickle into the interned identities of any process. The card
+        objects, indexes and counts are rebuilt by __setstate__, the journal is not kept
+        """
+
+        state = {key: value for key, value in self.__dict__.items() if key not in _LINKED_STATE}
+        state['cards'] = self._identities(self.top)
+        return state
+
+    def __setstate__(self, state):
+        """Rebuilds a copied or unpickled deck from __getstate__ output"""
+        state = dict(state)
+        cards = state.pop('cards')
+        self._setup(state['jokers'], state['rng'])
+        self.__dict__.update(state)
+        if cards:
+            self._extend(Prototype(tuple(cards)))
+
+    def _identities(self, card):
+        """Identities of the cards linked from card onwards, in one walk"""
+        identities = []
+        append = identities.append
+        while card is not None:
+            append(card.identity)
+            card = card.next
+        return identities
+
+    def snapshot(self):
+        """
+        Copies the current order into a CompactDeck, one O(n) walk copying every card id but
+        allocating no Card objects. Forks of the CompactDeck share that array copy-on-write,
+        so a search pays the copy once and branches cheaply from there.
+        Kept: the order (a lazy shuffle is carried out for real first), jokers, the shared
+        rng and the hash, so the snapshot hashes like the deck. A Shoe also keeps its discard
+        pile, dealt count, cut card and penetration, see Shoe.snapshot.
+        Dropped: the journal, the spec, suits, ranks and n_decks, the Card objects and the
+        live counts, so count and the probability methods are one pass over the array.
+        :return: CompactDeck holding the same cards in the same order
+        """
+
+        # imported here, compact_deck itself imports this module
+        from compact_deck import CompactDeck
+        self._settle()
+        snapshot = CompactDeck(self.jokers, self.rng)
+        snapshot._set_order(self._ids())
+        snapshot._hash = self._hash
+        return snapshot
+
+    def fork(self, rng=None):
+        """
+        Branch of the deck for game-tree search, a copy-on-write CompactDeck (a CompactShoe
+        for a Shoe) keeping the same state as snapshot. Costs one snapshot, O(n), fork the
+        snapshot rather than the deck to branch again
+        :param rng: random number generator for the branch, shares this deck's if None
+        :return: CompactDeck holding the same cards in the same order
+        """
+        return self.snapshot().fork(rng)
+
+    def to_bytes(self):
+        """
+        Packs the order of the deck as card ids, one byte per card (two if any card id is
+        above 255), for logging and replay. Cards other than the standard ones and jokers
+        are packed with their suit and name, see pack_cards
+        :return: bytes, read back with Deck.from_bytes
+        """
+
+        self._settle()
+        return pack_cards(self._ids())
+
+    @staticmethod
+    def from_bytes(data, jokers=False, rng=None):
+        """
+        Rebuilds a deck from Deck.to_bytes output
+        :param data: bytes-like object
+        :param jokers: jokers flag of the new deck
+        :param rng: random number generator or seed of the new deck
+        :return: Deck holding the packed cards in order
+        """
+        return Deck.from_ids(unpack_cards(data), jokers, rng)
+
+    def _settle(self):
+        """
+        Shuffles a lazily shuffled deck for real before its order is exported, so copies
+        and exports never hand out the order the lazy shuffle left alone
+        """
+
+        if self._lazy:
+            self.shuffle()
+
+    def _ids(self):
+        """Card ids of the deck from top to bottom, in one walk"""
+        ids = array('H')
+        append = ids.append
+        card = self.top
+        while card is not None:
+            append(card.identity.id)
+            card = card.next
+        if _profiler is not None:
+            _profiler.hops(self.size)
+        return ids
+
+    def to_ids(self, out=None):
+        """
+        Card ids of the deck from top to bottom, ids index the shared card table
+        :param out: writable buffer to fill instead of allocating (array, list, NumPy row or
+            memoryview), at least as long as the deck, entries after the deck are untouched
+        :return: array('H') of card ids, or out
+        """
+
+        self._settle()
+        ids = self._ids()
+        if out is None:
+            return ids
+        return write_ids(ids, out)
+
+    def to_numpy(self, out=None):
+        """
+        Card ids of the deck from top to bottom as a NumPy array
+        :param out: NumPy array to fill instead of allocating, at least as long as the deck
+        :return: uint16 array of card ids, or out
+        """
+
+        if np is None:
+            raise ImportError("Error: to_numpy requires numpy")
+        self._settle()
+        ids = np.frombuffer(self._ids(), dtype=np.uint16)
+        if out is None:
+            return ids
+        return write_ids(ids, out)
+
+    def to_tuples(self):
+        """
+        Card data of the deck from top to bottom in one walk, without the generator and
+        method calls of iterating
+        :return: list of (name, suit) tuples, shared with the card table
+        """
+
+        self._settle()
+        data = []
+        append = data.append
+        card = self.top
+        while card is not None:
+            append(card.identity.data)
+            card = card.next
+        if _profiler is not None:
+            _profiler.hops(self.size)
+        return data
+
+    def extend(self, ids):
+        """
+        Adds cards to the bottom of the deck in one bulk pass
+        :param ids: card ids from to_ids, to_numpy or the shared card table, top first
+        :return: None
+        """
+
+        ids = check_ids(ids)
+        if ids:
+            table = IDENTITIES
+            self._extend(Prototype(tuple([table[each] for each in ids])))
+
+    @staticmethod
+    def from_ids(ids, jokers=False, rng=None):
+        """
+        Builds a deck holding the given cards in order
+        :param ids: card ids from to_ids, to_numpy or the shared card table, top first
+        :param jokers: jokers flag of the new deck
+        :param rng: random number generator or seed of the new deck
+        :return: Deck
+        """
+
+        deck = Deck.__new__(Deck)
+        deck._setup(jokers, rng)
+        deck.extend(ids)
+        return deck
+
     def build_deck(self):
         """
-        Constructs standard deck of cards with 52 cards and four suits
+        Constructs n_decks decks of every suit and rank, by default the standard deck of 52
+        cards and four suits. The card order comes from a cached prototype and is linked in
+        one bulk pass
+        :return: None
+        """
+
+        if self.spec is not None:
+            self._extend(self.spec.prototype(self.n_decks, self.jokers is True))
+        else:
+            self._extend(prototype(self.n_decks, self.jokers is True, tuple(self.suits), tuple(self.ranks)))
+
+    def _extend(self, proto):
+        """
+        Creates and links one card per identity of a prototype onto the bottom of the deck
+        :param proto: Prototype
         :return: None
         """
 
-        for each in self.suits:
-            # top card is the 2 of hearts
-            for i in range(2, 11):
-                self.push(each, f"{i}")
-            for face in self.face_cards:
-                self.push(each, face)
-        # constructs two jokers if requested
-        if self.jokers is True:
-            self.push('red', 'joker')
-            self.push('black', 'joker')
+        new = Card.__new__
+        prev = self.bottom
+        first = None
+        for identity in proto.identities:
+            card = new(Card)
+            card.identity = identity
+            card.deck = self
+            card.prev = prev
+            if prev is None:
+                self.top = card
+            else:
+                prev.next = card
+            if first is None:
+                first = card
+            prev = card
+        if prev is not None:
+            prev.next = None
+        self.bottom = prev
+        self.size += len(proto.identities)
+        # indexes that were already built take the new cards, others wait for a lookup
+        if self._index is not None:
+            card = first
+            while card is not None:
+                self._index_card(card)
+                card = card.next
+        if self._positions is not None:
+            # the new cards are labelled on after the old bottom
+            label = self._label_after(first.prev) if first is not None else 0
+            positions = self._positions
+            card = first
+            while card is not None:
+                positions[id(card)] = label
+                label += 1
+                card = card.next
+        if self._card_counts is not None:
+            self._count_cards(proto.identities)
+        self._hash = None
+        self._pool = None
+        if self._journal is not None:
+            self._journal.record('append', [identity.id for identity in proto.identities])
 
-    def shuffle(self):
+    def shuffle(self, method="uniform", times=1, lazy=False):
         """
         Shuffles cards to create a random distribution for game use
+        :param method: name of a strategy in shuffles.STRATEGIES ('uniform', 'riffle',
+            'overhand') or a callable taking (cards, rng) and returning the new order
+        :param times: number of times to apply the strategy, e.g. 7 riffles
+        :param lazy: leave the order alone and randomize only the cards drawn from now on,
+            each draw from the top (draw, draw_many, deal, iter_deal) takes uniformly random
+            cards in O(1) per card. The cards left in the deck stay in their old order until
+            the next shuffle, so only use it when cards are drawn, not looked at. Exporting
+            the order (to_ids, to_numpy, to_tuples, to_bytes, snapshot and fork) shuffles the
+            deck for real first
         :return: None, reorganization is handled within the card objects
         """
 
-        i = 0
-        # randomize the order of indices in initial constructor array
-        assignments = []
-        while i < self.size:
-            rand = random.randint(0, self.size - 1)
-            if rand not in assignments:
-                assignments.append(rand)
-                i += 1
-        shuffled_order = [0 for _ in range(len(assignments))]
+        if lazy:
+            if method != "uniform":
+                raise ValueError("Error: only the uniform shuffle can be lazy")
+            self._lazy = True
+            return
+        self._lazy = False
+        strategy = shuffles.get_strategy(method)
+        # collect the existing card objects, shuffle the list, then relink once
+        order = []
         card = self.top
-        i = 0
         while card is not None:
-            shuffled_order[assignments[i]] = card
-            card = card.get_next()
-            i += 1
-        for j in range(len(shuffled_order)):
-            if j == 0:
-                self.top = shuffled_order[0]
-                shuffled_order[0].set_prev(None)
-                shuffled_order[0].set_next(shuffled_order[1])
-            elif j == len(shuffled_order) - 1:
-                self.bottom = shuffled_order[j]
-                shuffled_order[j].set_next(None)
-                shuffled_order[j].set_prev(shuffled_order[j-1])
+            order.append(card)
+            card = card.next
+        if _profiler is not None:
+            _profiler.hops(self.size)
+        if self._journal is not None:
+            before = {id(card): i for i, card in enumerate(order)}
+        for _ in range(times):
+            order = strategy(order, self.rng)
+        self._link(order)
+        if self._journal is not None:
+            # the permutation as the old position of each card, top first
+            self._journal.record('shuffle', [before[id(card)] for card in order])
+
+    def _link(self, order):
+        """
+        Relinks the deck so that cards run top to bottom in the given order
+        :param order: list of every card object in the deck
+        :return: None
+        """
+
+        prev = None
+        for card in order:
+            card.prev = prev
+            if prev is not None:
+                prev.next = card
+            prev = card
+        if prev is not None:
+            prev.next = None
+        if _profiler is not None:
+            _profiler.hops(len(order))
+        self.top = order[0] if order else None
+        self.bottom = prev
+        # the order changed, positions and the hash are rebuilt on the next lookup
+        self._positions = None
+        self._hash = None
+
+    def _add(self, card):
+        """Adds a card object that was just linked onto the bottom to the code index"""
+        self._pool = None
+        card.deck = self
+        if self._index is not None:
+            self._index_card(card)
+        if self._positions is not None:
+            self._positions[id(card)] = self._label_after(card.prev)
+        if self._card_counts is not None:
+            key = card.identity.key
+            self._name_counts[key[0]] += 1
+            self._suit_counts[key[1]] += 1
+            self._card_counts[key] += 1
+
+    def _remove(self, card):
+        """Removes a card object that is leaving the deck from the code index"""
+        self._pool = None
+        card.deck = None
+        if self._index is not None:
+            key = card.identity.id
+            nodes = self._index[key]
+            if type(nodes) is dict:
+                del nodes[id(card)]
+                if len(nodes) == 1:
+                    self._index[key] = next(iter(nodes.values()))
             else:
-                shuffled_order[j].set_prev(shuffled_order[j-1])
-                shuffled_order[j].set_next(shuffled_order[j+1])
+                del self._index[key]
+        if self._positions is not None:
+            self._positions.pop(id(card), None)
+        if self._card_counts is not None:
+            key = card.identity.key
+            self._name_counts[key[0]] -= 1
+            self._suit_counts[key[1]] -= 1
+            self._card_counts[key] -= 1
+
+    def _index_card(self, card):
+        """Adds a card object of the deck to the code index"""
+        key = card.identity.id
+        nodes = self._index.get(key)
+        if nodes is None:
+            self._index[key] = card
+        elif type(nodes) is dict:
+            nodes[id(card)] = card
+        else:
+            self._index[key] = {id(nodes): nodes, id(card): card}
+
+    def _get_index(self):
+        """
+        Returns the code index, building it in one walk on the first lookup
+        :return: dict of card id to the card object holding it, or to a dict of them
+        """
+
+        if self._index is None:
+            self._index = {}
+            card = self.top
+            while card is not None:
+                self._index_card(card)
+                card = card.next
+            if _profiler is not None:
+                _profiler.hops(self.size)
+        return self._index
+
+    def _count_cards(self, identities):
+        """Adds cards to the composition counts, counting the whole deck on the first count"""
+        if self._card_counts is None:
+            self._name_counts = Counter()
+            self._suit_counts = Counter()
+            self._card_counts = Counter()
+            identities = self._identities(self.top)
+            if _profiler is not None:
+                _profiler.hops(self.size)
+        keys = [identity.key for identity in identities]
+        self._card_counts.update(keys)
+        self._name_counts.update([key[0] for key in keys])
+        self._suit_counts.update([key[1] for key in keys])
+
+    def _label_after(self, card):
+        """Label for a card joining the positional index directly under card (None for the top)"""
+        return self._positions[id(card)] + 1 if card is not None else self._offset
+
+    def _get_positions(self, exact=True):
+        """
+        Returns the positional index, building it in one pass if the order has changed
+        :param exact: rebuild it if pulls left gaps, False when only the order matters
+        :return: dict of id() of each card to its position plus self._offset
+        """
+
+        if self._positions is None or (exact and self._gaps):
+            self._positions = {}
+            self._offset = 0
+            self._gaps = False
+            index = 0
+            card = self.top
+            while card is not None:
+                self._positions[id(card)] = index
+                card = card.next
+                index += 1
+            if _profiler is not None:
+                _profiler.hops(index)
+        return self._positions
+
+    def _first(self, target):
+        """
+        Looks up the first instance of a card in the deck from the code index
+        :param target: card code (ex. 'h2')
+        :return: card object nearest the top, or None if the card is not in the deck
+        """
+
+        nodes = self._get_index().get(code_id(target))
+        if type(nodes) is not dict:
+            return nodes
+        # duplicates, the lowest label is nearest the top, gaps or not
+        positions = self._get_positions(exact=False)
+        return nodes[min(nodes, key=positions.__getitem__)]
+
+    def count(self, code=None, suit=None, name=None):
+        """
+        Counts the cards left in the deck that match, without walking the deck
+        :param code: card code (ex. 'hace'), matched exactly
+        :param suit: suit to match, case-independent (ex. 'hearts')
+        :param name: name to match, case-independent (ex. 'ace'), with suit matches one card
+        :return: number of matching cards in the deck
+        """
+
+        if code is not None:
+            nodes = self._get_index().get(code_id(code))
+            if nodes is None:
+                return 0
+            return len(nodes) if type(nodes) is dict else 1
+        if self._card_counts is None and (suit is not None or name is not None):
+            self._count_cards(())
+        if suit is not None and name is not None:
+            return self._card_counts[(str(name).lower(), str(suit).lower())]
+        if suit is not None:
+            return self._suit_counts[str(suit).lower()]
+        if name is not None:
+            return self._name_counts[str(name).lower()]
+        return self.size
+
+    def probability(self, code=None, suit=None, name=None):
+        """
+        Exact probability that the next card drawn matches, after a uniform shuffle
+        Takes the same arguments as count
+        :return: probability as a float, 0 for an empty deck
+        """
+
+        if self.size == 0:
+            return 0.0
+        return self.count(code, suit, name) / self.size
+
+    def probability_at_least(self, k: int, draws: int, code=None, suit=None, name=None):
+        """
+        Exact probability that at least k of the next draws cards match (hypergeometric)
+        :param k: minimum number of matching cards
+        :param draws: number of cards drawn
+        Other arguments are the same as count
+        :return: probability as a float
+        """
+
+        # check if draw number input is valid
+        if draws > self.size:
+            raise Exception("Error: number of cards entered larger than deck")
+        elif draws < 0:
+            raise Exception("Error: number of cards entered less than 0")
+        return hypergeometric_at_least(self.size, self.count(code, suit, name), draws, k)
 
     def find(self, target):
         """
         Finds a specific card in the deck, returns location of first instance (index)
+        Membership comes from the code index, and positions from a positional index that
+        is built once and reused until the order of the deck changes
         :parameter target: card you are finding
         :return: location as an index of first instance of card in deck
         """
 
-        index = 0
-        # index acts as our counter for where we are
-        card = self.top
-        while card is not None:
-            if card.__str__() == target:
-                return index
-            card = card.next
-            index += 1
-        return "Target card is not in this deck"
+        card = self._first(target)
+        if card is None:
+            return "Target card is not in this deck"
+        return self._get_positions()[id(card)] - self._offset
 
     def pull(self, target):
         """
@@ -119,49 +1184,113 @@ class Deck:
         :return: No returns, mutates deck in place
         """
 
-        card = self.top  # initialize with top card for iteration
-        # iterate through the deck to reach the desired card
-        while target != card.__str__():
-            try:
-                card = card.get_next()
-            except AttributeError:
-                # card not found, return error message
-                return "Target card is not in this deck"
-
-        if card == self.top:  # case 1: target is the top card
-            data = card.get_data()  # preserve data during object deletion
-            new_top = card.get_next()  # reset top card to next object
-            new_top.set_prev(None)
-            card = None  # delete pulled object
-            self.size -= 1  # deck size reflects removed card
-            self.top = new_top
-            return data
-        elif card == self.bottom:  # case 2: target is the bottom card
-            data = card.get_data()
-            new_bottom = card.get_prev()  # reset bottom card to previous object
-            new_bottom.set_next(None)
-            card = None
-            self.size -= 1
-            self.bottom = new_bottom
+        card = self._first(target)
+        if card is None:
+            # card not found, return error message
+            return "Target card is not in this deck"
+        if self._journal is not None:
+            position = self._get_positions()[id(card)] - self._offset
+            data = self._unlink(card)
+            self._journal.record('remove', [position])
             return data
-        else:                   # case 3: target is anywhere else in the deck
-            data = card.get_data()
-            new_prev = card.get_prev()  # link surrounding cards to each other
-            new_next = card.get_next()
+        return self._unlink(card)
+
+    def _unlink(self, card):
+        """
+        Removes one card object from the deck, relinking its neighbours
+        :param card: Card in this deck
+        :return: card data tuple (name, suit)
+        """
+
+        data = card.get_data()  # preserve data during object deletion
+        new_prev = card.get_prev()  # link surrounding cards to each other
+        new_next = card.get_next()
+        if self._hash is not None:
+            if new_prev is None:
+                # the top card, every other card moves up one position
+                self._hash = ((self._hash - card.identity.zobrist) * _INVERSE) & _MASK
+            elif new_next is None:
+                self._hash = (self._hash - card.identity.zobrist * pow(_BASE, self.size - 1, _MODULUS)) & _MASK
+            else:
+                # every card below moves up, recomputed on the next lookup
+                self._hash = None
+        if card is self.top:  # case 1: target is the top card, positions shift up by one
+            self.top = new_next
+            self._offset += 1
+        else:
             new_prev.set_next(new_next)
+        if card is self.bottom:  # case 2: target is the bottom card
+            self.bottom = new_prev
+        else:
             new_next.set_prev(new_prev)
-            card = None
-            self.size -=1
-            return data
+        if new_prev is not None and new_next is not None:
+            # case 3: target is anywhere else in the deck, later positions are one too high
+            self._gaps = True
+        self._remove(card)
+        card.set_prev(None)
+        card.set_next(None)
+        self.size -= 1
+        return data
 
     def pull_list(self, cards: list):
         """
-        Pulls / removes a list of cards from the deck
+        Pulls / removes a list of cards from the deck in one pass from the top, a code listed
+        twice pulls two copies
         :parameter cards: a list of strings
-        :return: mutates list
+        :return: (list of pulled card data tuples in deck order, list of codes not found)
         """
-        for card in cards:
-            self.pull(card.lower())
+
+        wanted = requested_ids(cards)
+        left = dict(wanted)
+
+        def match(identity):
+            count = left.get(identity.id)
+            if count:
+                left[identity.id] = count - 1
+                return True
+            return False
+        pulled = self._pull_matching(match, sum(wanted.values()))
+        return pulled, unmatched_codes(cards, left)
+
+    def pull_where(self, fn=None, suit=None, name=None):
+        """
+        Pulls / removes every card matching a filter, in one pass from the top
+        :param fn: callable taking a card data tuple (name, suit), True to pull the card
+        :param suit: pull only cards of this suit (ex. 'hearts')
+        :param name: pull only cards with this name (ex. 'ace')
+        :return: list of pulled card data tuples in deck order
+        """
+
+        return self._pull_matching(card_filter(fn, suit, name))
+
+    def _pull_matching(self, match, limit=None):
+        """
+        Walks the deck once, unlinking each card whose identity matches
+        :param match: callable taking a CardIdentity
+        :param limit: stop after pulling this many cards, None to walk the whole deck
+        :return: list of pulled card data tuples in deck order
+        """
+
+        pulled = []
+        if limit == 0:
+            return pulled
+        positions = []
+        hops = 0
+        card = self.top
+        while card is not None:
+            following = card.next
+            hops += 1
+            if match(card.identity):
+                positions.append(hops - 1)
+                pulled.append(self._unlink(card))
+                if len(pulled) == limit:
+                    break
+            card = following
+        if _profiler is not None:
+            _profiler.hops(hops)
+        if self._journal is not None and positions:
+            self._journal.record('remove', positions)
+        return pulled
 
     def cut(self):
         """
@@ -174,8 +1303,12 @@ class Deck:
         while i < cut_index:
             new_top = new_top.get_next()
             i += 1
+        if _profiler is not None:
+            _profiler.hops(cut_index)
         # bottom of the deck is the previous card
         new_bottom = new_top.get_prev()
+        # every card moved, the hash is recomputed on the next lookup
+        self._hash = None
         # top and bottom cards are now in the middle and linked
         self.bottom.set_next(self.top)
         self.top.set_prev(self.bottom)
@@ -184,6 +1317,54 @@ class Deck:
         new_top.set_prev(None)
         self.bottom = new_bottom
         new_bottom.set_next(None)
+        # every position moved, rebuild on the next lookup
+        self._positions = None
+        if self._journal is not None:
+            self._journal.record('cut', cut_index)
+
+    def _take(self, k, random=False):
+        """
+        Detaches the top k cards from the deck in one splice
+        :param k: number of cards to take, at most the deck size
+        :param random: take k uniformly random cards instead, as every take of a lazily
+            shuffled deck does
+        :return: list of the detached card objects, top first, still linked to each other
+        """
+
+        pool = positions = None
+        if random or self._lazy:
+            pool, positions = self._random_to_top(k)
+        taken = []
+        card = self.top
+        for _ in range(k):
+            taken.append(card)
+            self._remove(card)
+            card = card.next
+        if pool is not None:
+            # the pool already left out the cards it moved to the top
+            self._pool = pool
+        if not taken:
+            return taken
+        if _profiler is not None:
+            _profiler.hops(k)
+        if self._hash is not None:
+            # the cards left move up k positions
+            self._hash = hash_after_draw(self._hash, _order_hash(taken), k)
+        # card is now the first one left in the deck, cut the links between the two
+        taken[-1].next = None
+        if card is None:
+            self.bottom = None
+        else:
+            card.prev = None
+        self.top = card
+        self._offset += k
+        self.size -= k
+        if self._journal is not None:
+            if positions is None:
+                self._journal.record('take', k)
+            else:
+                self._journal.record('remove', positions)
+        return taken
 
     def deal(self, players: int, cards: int):
         """
@@ -194,7 +1375,7 @@ class Deck:
         """
 
         # check if card number input is valid
-        if cards > self.size:
+        if cards > self.size or players * cards > self.size:
             raise Exception("Error: number of cards entered larger than deck")
         # return empty hand if n_cards is 0, error if less than 0
         elif cards == 0:
@@ -202,20 +1383,36 @@ class Deck:
         elif cards < 0:
             raise Exception("Error: number of cards entered less than 0")
 
-        # initialize hands based on number of declared players
-        hands = [[] for _ in range(players)]
-        # nested loop to deal cards in the correct order
-        for i in range(cards):
-            for j in range(players):
-                # appends card data as a tuple to each player in order
-                hands[j].append(self.top.get_data())
-                # declare and set next top card
-                next_card = self.top.get_next()
-                self.top = None
-                self.top = next_card
-                # maintain accurate deck size
-                self.size -= 1
-        return hands
+        # detach every card being dealt at once, then hand them out round-robin
+        taken = self._take(players * cards)
+        return [[card.identity.data for card in taken[j::players]] for j in range(players)]
+
+    def iter_deal(self, players: int, cards=None):
+        """
+        Deals round-robin one card at a time, in the same order as deal, taking each card
+        from the deck only when the generator is advanced
+        :param players: number of players to deal to
+        :param cards: number of cards to deal to each player, or None to deal out the deck
+        :return: generator of (player index, card data) pairs
+        """
+
+        if cards is not None:
+            # check if card number input is valid, before anything is dealt
+            if cards > self.size or players * cards > self.size:
+                raise Exception("Error: number of cards entered larger than deck")
+            elif cards < 0:
+                raise Exception("Error: number of cards entered less than 0")
+            total = players * cards
+        else:
+            total = self.size
+        return self._iter_deal(players, total)
+
+    def _iter_deal(self, players, total):
+        """Generator behind iter_deal, so input errors are raised when iter_deal is called"""
+        for i in range(total):
+            if self.size == 0:
+                return
+            yield i % players, self.draw()
 
     def draw(self):
         """
@@ -226,20 +1423,121 @@ class Deck:
         # check if deck is empty
         if self.size == 0:
             raise Exception("Deck is empty")
-        # maintain data during llist reshuffling
-        card = self.top.get_data()
-        # declare and set new top card
-        new_top = self.top.get_next()
-        new_top.set_prev(None)
-        # delete object
-        self.top = None
-        self.top = new_top
-        # maintain accurate deck size
-        self.size -= 1
         # return card data as a tuple (value, name)
-        return card
+        return self._take(1)[0].identity.data
 
+    def draw_many(self, k: int):
+        """
+        Draws the top k cards from the deck in one splice
+        :param k: number of cards to draw
+        :return: list of card data tuples, top card first
+        """
+
+        # check if card number input is valid
+        if k > self.size:
+            raise Exception("Error: number of cards entered larger than deck")
+        elif k < 0:
+            raise Exception("Error: number of cards entered less than 0")
+        return [card.identity.data for card in self._take(k)]
+
+    def _sample(self, k):
+        """
+        Picks k distinct cards uniformly at random by a partial Fisher-Yates shuffle of the
+        pool, which is built in one walk the first time and kept while no card joins or
+        leaves the deck, so each pick costs O(1)
+        :param k: number of cards, at most the deck size
+        :return: list of k card objects, in the order picked, now the last k of the pool
+        """
+
+        pool = self._pool
+        if pool is None:
+            pool = []
+            card = self.top
+            while card is not None:
+                pool.append(card)
+                card = card.next
+            if _profiler is not None:
+                _profiler.hops(self.size)
+            self._pool = pool
+        randrange = self.rng.randrange
+        n = len(pool)
+        for i in range(n - 1, n - 1 - k, -1):
+            j = randrange(i + 1)
+            pool[i], pool[j] = pool[j], pool[i]
+        return pool[n - k:][::-1]
+
+    def _random_to_top(self, k):
+        """
+        Moves k random cards to the top of the deck, in the order picked, so that taking the
+        top k cards draws them
+        :param k: number of cards, at most the deck size
+        :return: (the pool without the moved cards, for the caller to restore once they
+            left, and their positions before the move when journaling, else None)
+        """
+
+        picked = self._sample(k)
+        pool = self._pool
+        del pool[len(pool) - k:]
+        positions = None
+        if self._journal is not None:
+            before = self._get_positions()
+            positions = [before[id(card)] - self._offset for card in picked]
+        if not picked:
+            return pool, positions
+        for card in picked:
+            prev, following = card.prev, card.next
+            if prev is None:
+                self.top = following
+            else:
+                prev.next = following
+            if following is None:
+                self.bottom = prev
+            else:
+                following.prev = prev
+        prev = None
+        for card in picked:
+            card.prev = prev
+            if prev is not None:
+                prev.next = card
+            prev = card
+        prev.next = self.top
+        if self.top is None:
+            self.bottom = prev
+        else:
+            self.top.prev = prev
+        self.top = picked[0]
+        # positions and the hash are rebuilt on the next lookup
+        self._positions = None
+        self._hash = None
+        return pool, positions
+
+    def draw_random(self, k=1):
+        """
+        Draws k cards picked uniformly at random, without shuffling the rest of the deck
+        :param k: number of cards to draw
+        :return: list of card data tuples, in the order drawn
+        """
+
+        # check if card number input is valid
+        if k > self.size:
+            raise Exception("Error: number of cards entered larger than deck")
+        elif k < 0:
+            raise Exception("Error: number of cards entered less than 0")
+        return [card.identity.data for card in self._take(k, True)]
+
+    def peek_random(self, k=1):
+        """
+        Looks at k cards picked uniformly at random, leaving the deck as it is
+        :param k: number of cards to look at
+        :return: list of card data tuples
+        """
 
+        # check if card number input is valid
+        if k > self.size:
+            raise Exception("Error: number of cards entered larger than deck")
+        elif k < 0:
+            raise Exception("Error: number of cards entered less than 0")
+        return [card.identity.data for card in self._sample(k)]
 
     def push(self, suit: str, name: str):
         """
@@ -249,36 +1547,61 @@ class Deck:
         :param name: strung of the name
         :return: no return, modifies the deck (linked list)
         """
-        new_card = Card(suit, str(name))
+        # create the card object and append it to the list
+        self._append(Card(suit, str(name)))
+
+    def _append(self, new_card):
+        """
+        Links a card object that is not in any deck onto the bottom of this deck
+        :param new_card: Card object
+        :return: no return, modifies the deck (linked list)
+        """
+        new_card.next = None
+        if self._hash is not None:
+            self._hash = hash_after_push(self._hash, self.size, new_card.identity.zobrist)
         if self.bottom is None:
+            new_card.prev = None
             self.top = new_card
             self.bottom = new_card
         else:
             new_card.prev = self.bottom
             self.bottom.next = new_card
             self.bottom = new_card
+        self._add(new_card)
         self.size += 1
-        # create the card object
-        # appends the new card to the list
+        if self._journal is not None:
+            self._journal.record('append', [new_card.identity.id])
 
 
 class Card:
+    """
+    Linked list node for a Deck. Suit and name come from a shared CardIdentity, so a
+    node only holds its identity, the deck holding it and its links.
+    """
+
+    __slots__ = ('identity', 'deck', 'prev', 'next')
+
     def __init__(self, suit=None, name=None):
-        # reject suit input if not string or None
-        if (suit is not None) and (type(suit) is not str):
-            raise TypeError("Suit input must be string or None")
-        self.suit = str(suit)
-        self.name = str(name)
+        # reject suit input if not string or None (checked in get_identity)
+        self.identity = get_identity(suit, name)
+        # deck the card is in, whose indexes are keyed by the identity, None while loose
+        self.deck = None
         # linked list elements - default to no links (next, prev = None)
         self.next, self.prev = None, None
 
+    @property
+    def suit(self):
+        """Suit of the card as a string"""
+        return self.identity.suit
+
+    @property
+    def name(self):
+        """Name of the card as a string"""
+        return self.identity.name
+
     def __str__(self):
         """Returns first letter of suit and value"""
-
-        # if either suit or name is None, return None string
-        if self.suit is None or self.name is None:
-            return str(None)
-        return str(self.suit[0]) + str(self.name)
+        return self.identity.code
 
     def __eq__(self, other):
         """
@@ -286,9 +1609,7 @@ class Card:
         Comparison is case-independent
         """
 
-        if self.name.lower() == other.name.lower() and self.suit.lower() == other.suit.lower():
-            return True
-        return False
+        return self.identity is other.identity or self.identity.key == other.identity.key
 
     def __len__(self):
         """A single instance of a card with always be of length one"""
@@ -314,14 +1635,169 @@ class Card:
         """Getter method for next card object in linked list"""
         return self.next
 
+    def _check_loose(self):
+        """Raises if the card is in a deck, whose index, counts and hash depend on its identity"""
+        if self.deck is not None:
+            raise ValueError("Error: cannot change a card that is in a deck, pull it and push the new card")
+
     def set_suit(self, suit):
-        """Method for setting card suit - converts input to string"""
-        self.suit = str(suit)
+        """Method for setting card suit - converts input to string. Raises if the card is in a deck"""
+        self._check_loose()
+        self.identity = get_identity(str(suit), self.identity.name)
 
     def set_name(self, name):
-        """Method for setting card name - converts input to string"""
-        self.name = str(name)
+        """Method for setting card name - converts input to string. Raises if the card is in a deck"""
+        self._check_loose()
+        self.identity = get_identity(self.identity.suit, name)
 
     def get_data(self):
         """Returns card data as a tuple"""
-        return self.name, self.suit
+        return self.identity.data
+
+    @classmethod
+    def from_identity(cls, identity):
+        """Creates an unlinked card from an existing CardIdentity, skipping input checks"""
+        card = cls.__new__(cls)
+        card.identity = identity
+        card.deck = None
+        card.next, card.prev = None, None
+        return card
+
+
+@lru_cache(maxsize=65536)
+def hypergeometric_term(total: int, matches: int, draws: int, k: int):
+    """Probability of exactly k matching cards in draws cards, from total cards holding matches"""
+    return math.comb(matches, k) * math.comb(total - matches, draws - k) / math.comb(total, draws)
+
+
+@lru_cache(maxsize=4096)
+def hypergeometric_at_least(total: int, matches: int, draws: int, k: int):
+    """Probability of at least k matching cards in draws cards, from total cards holding matches"""
+    if k <= 0:
+        return 1.0
+    return min(1.0, sum(hypergeometric_term(total, matches, draws, i)
+                        for i in range(k, min(matches, draws) + 1)))
+
+
+class Shoe(Deck):
+    """
+    Several decks shuffled together, as dealt at a casino table. A cut card placed at the
+    penetration point marks when the shoe should be reshuffled, and cards taken from the
+    shoe wait in a discard pile so reshuffling reuses the same Card objects.
+    """
+
+    def __init__(self, n_decks=6, jokers=False, penetration=0.75, rng=None, spec=None):
+        # how far into the shoe the cut card sits
+        self.penetration = penetration
+        # cards taken since the last reshuffle, kept linked top to bottom
+        self.discard_top = None
+        self.discard_bottom = None
+        self.dealt = 0
+        super().__init__(jokers, rng, n_decks, spec=spec)
+        self.cut_position = int(self.size * penetration)
+
+    @property
+    def needs_reshuffle(self):
+        """True once the cut card has been reached"""
+        return self.dealt >= self.cut_position
+
+    def __getstate__(self):
+        """Deck state plus the identities of the discard pile, top first"""
+        state = super().__getstate__()
+        state['discard'] = self._identities(self.discard_top)
+        return state
+
+    def __setstate__(self, state):
+        """Rebuilds the shoe and relinks a new discard pile of loose cards"""
+        state = dict(state)
+        discard = state.pop('discard')
+        super().__setstate__(state)
+        self.discard_top = None
+        self.discard_bottom = None
+        for identity in discard:
+            card = Card.from_identity(identity)
+            if self.discard_bottom is None:
+                self.discard_top = card
+            else:
+                self.discard_bottom.next = card
+                card.prev = self.discard_bottom
+            self.discard_bottom = card
+
+    def snapshot(self):
+        """
+        Copies the shoe into a CompactShoe, with the discard pile, dealt count, cut card and
+        penetration, see Deck.snapshot for what else is kept and dropped
+        :return: CompactShoe holding the same cards in the same order
+        """
+
+        # imported here, compact_deck itself imports this module
+        from compact_deck import CompactShoe
+        self._settle()
+        snapshot = CompactShoe.__new__(CompactShoe)
+        snapshot.jokers = self.jokers
+        snapshot.rng = self.rng
+        snapshot._set_order(self._ids())
+        snapshot._hash = self._hash
+        discard = array('H', [identity.id for identity in self._identities(self.discard_top)])
+        snapshot._discard = (discard, None) if discard else None
+        snapshot.dealt = self.dealt
+        snapshot.cut_position = self.cut_position
+        snapshot.penetration = self.penetration
+        return snapshot
+
+    def _take(self, k, random=False):
+        """Takes cards off the top of the shoe, moving them onto the discard pile"""
+        taken = super()._take(k, random)
+        if taken:
+            if self.discard_bottom is None:
+                self.discard_top = taken[0]
+            else:
+                self.discard_bottom.next = taken[0]
+                taken[0].prev = self.discard_bottom
+            self.discard_bottom = taken[-1]
+            self.dealt += k
+        return taken
+
+    def reshuffle(self, method="uniform", times=1, lazy=False):
+        """
+        Collects the discard pile back under the shoe and shuffles everything
+        :param method: shuffle strategy, as for Deck.shuffle
+        :param times: number of times to apply the strategy
+        :param lazy: randomize only the cards dealt from now on, as for Deck.shuffle
+        :return: None
+        """
+
+        # the discard pile goes into the journal as one entry
+        journal, self._journal = self._journal, None
+        returned = []
+        card = self.discard_top
+        while card is not None:
+            next_card = card.next
+            self._append(card)
+            if journal is not None:
+                returned.append(card.identity.id)
+            card = next_card
+        if _profiler is not None:
+            _profiler.hops(self.dealt)
+        self._journal = journal
+        if journal is not None and returned:
+            journal.record('append', returned)
+        self.discard_top = None
+        self.discard_bottom = None
+        self.dealt = 0
+        self.shuffle(method, times, lazy)
+
+
+# common kinds of deck
+STANDARD = DeckSpec.grid(["hearts", "clubs", "diamonds", "spades"],
+                         [str(i) for i in range(2, 11)] + ["jack", "queen", "king", "ace"], name='standard')
+PINOCHLE = DeckSpec.grid(STANDARD.suits, ["9", "10", "jack", "queen", "king", "ace"], copies=2, name='pinochle')
+EUCHRE = DeckSpec.grid(STANDARD.suits, ["9", "10", "jack", "queen", "king", "ace"], name='euchre')
+TAROT = DeckSpec.grid(["wands", "cups", "swords", "pentacles"],
+                      ["ace"] + [str(i) for i in range(2, 11)] + ["page", "knight", "queen", "king"],
+                      extras=[("trumps", str(i)) for i in range(22)], name='tarot')
+# 0 once and 1-9, skip, reverse and draw two twice in each colour, then 4 wilds and 4 wild draw fours
+UNO = DeckSpec([(colour, rank) for colour in ["red", "yellow", "green", "blue"]
+                for rank in ["0"] + [r for r in [str(i) for i in range(1, 10)] + ["skip", "reverse", "draw two"]
+                                     for _ in range(2)]]
+               + [("wild", "wild")] * 4 + [("wild", "draw four")] * 4, name='uno')
@@ -0,0 +1,289 @@
+"""
+Append-only binary journal of every change to a deck, and replay of any past state
+
+A DeckJournal attached to a Deck (or Shoe) records each change as one small entry instead
+of the whole deck: cards taken from the top, cards removed by position, cards appended,
+the cut point, or the permutation of a shuffle. Every `checkpoint_every` operations it
+also writes the full order, so JournalReplay rebuilds the state after any operation from
+the nearest checkpoint instead of from the start.
+
+    with DeckJournal('table7.journal') as journal:
+        journal.attach(deck)
+        deck.shuffle()
+        deck.deal(4, 2)
+    replay = JournalReplay('table7.journal')
+    replay.deck(1)  # the deck right after the shuffle
+
+The file is a header followed by entries of a one byte kind, a four byte payload length
+and the payload. Counts are little-endian unsigned ints, lists of card ids or positions
+are packed as by ids_to_bytes. Card ids from deck_builder.FIXED_IDS up differ between
+processes, so the first time one is written it is defined by an entry holding its suit
+and name, which JournalReplay registers before decoding any card. Writes are buffered,
+so a crash can lose the last entries but never leaves an unreadable file: a cut-off entry
+at the end is ignored on replay.
+"""
+from bisect import bisect_right
+import struct
+
+from deck_builder import FIXED_IDS, IDENTITIES, Deck, bytes_to_ids, ids_to_bytes, pack_identity, unpack_identity
+
+# magic, version
+_HEADER = struct.Struct('<4sB')
+_MAGIC = b'CSDJ'
+_VERSION = 2
+# version 1 journals have no define entries
+_READABLE = (1, 2)
+# kind, payload length
+_ENTRY = struct.Struct('<BI')
+_COUNT = struct.Struct('<I')
+
+# entry kinds: operations first, then the checkpoint of a full order
+_KINDS = {'take': 1, 'remove': 2, 'append': 3, 'cut': 4, 'shuffle': 5}
+_NAMES = {kind: name for name, kind in _KINDS.items()}
+_CHECKPOINT = 0
+# card id as written, then its suit and name packed by pack_identity
+_DEFINE = 6
+# operations whose payload is a count rather than a list
+_COUNTED = {'take', 'cut'}
+
+
+class DeckJournal:
+    """
+    Writer of a deck journal, records every change made to the attached deck
+    Operations are numbered from 1, state 0 being the deck when it was attached
+    """
+
+    def __init__(self, path, checkpoint_every=1000, buffer_size=1 << 16):
+        """
+        Creates a new journal file, replacing any file at path
+        :param path: file path
+        :param checkpoint_every: operations between two checkpoints of the full order
+        :param buffer_size: bytes buffered before they are written to disk
+        """
+
+        if checkpoint_every < 1:
+            raise ValueError("Error: checkpoint_every must be at least 1")
+        self.path = path
+        self.checkpoint_every = checkpoint_every
+        self.operations = 0
+        self.deck = None
+        # ids from FIXED_IDS up already defined in the file
+        self._defined = set()
+        self._file = open(path, 'wb', buffering=buffer_size)
+        self._file.write(_HEADER.pack(_MAGIC, _VERSION))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def attach(self, deck):
+        """
+        Starts recording a deck, writing its current order as state 0
+        :param deck: Deck or Shoe, a journal records one deck
+        :return: None
+        """
+
+        if self.deck is not None:
+            raise ValueError("Error: journal already records a deck")
+        if deck._journal is not None:
+            raise ValueError("Error: deck already has a journal")
+        self.deck = deck
+        deck._journal = self
+        self._checkpoint()
+
+    def detach(self):
+        """Stops recording, the entries written so far stay in the file"""
+        if self.deck is not None:
+            self.deck._journal = None
+            self.deck = None
+
+    def close(self):
+        """Detaches the deck and writes buffered entries to the file"""
+        self.detach()
+        self._file.close()
+
+    def flush(self):
+        """Writes buffered entries to the file"""
+        self._file.flush()
+
+    def record(self, operation, value):
+        """
+        Called by the deck for every change
+        :param operation: 'take' or 'cut' with a count, or 'remove', 'append' or 'shuffle'
+            with a list of positions or card ids
+        :param value: int or list of ints
+        :return: None
+        """
+
+        if operation == 'append':
+            self._define(value)
+        payload = _COUNT.pack(value) if operation in _COUNTED else ids_to_bytes(value)
+        self._file.write(_ENTRY.pack(_KINDS[operation], len(payload)))
+        self._file.write(payload)
+        self.operations += 1
+        if self.operations % self.checkpoint_every == 0:
+            self._checkpoint()
+
+    def _checkpoint(self):
+        """Writes the full order of the deck, labelled with the operation it follows"""
+        ids = self.deck._ids()
+        self._define(ids)
+        payload = _COUNT.pack(self.operations) + ids_to_bytes(ids)
+        self._file.write(_ENTRY.pack(_CHECKPOINT, len(payload)))
+        self._file.write(payload)
+
+    def _define(self, ids):
+        """Writes a define entry for each card id from FIXED_IDS up seen for the first time"""
+        if not len(ids) or max(ids) < FIXED_IDS:
+            return
+        for each in ids:
+            if each >= FIXED_IDS and each not in self._defined:
+                self._defined.add(each)
+                payload = _COUNT.pack(each) + pack_identity(IDENTITIES[each])
+                self._file.write(_ENTRY.pack(_DEFINE, len(payload)))
+                self._file.write(payload)
+
+
+def _apply(order, operation, value):
+    """
+    Replays one operation on a list of card ids
+    :return: the new list, order itself may have been changed
+    """
+
+    if operation == 'take':
+        del order[:value]
+    elif operation == 'remove':
+        gone = set(value)
+        order = [each for i, each in enumerate(order) if i not in gone]
+    elif operation == 'append':
+        order.extend(value)
+    elif operation == 'cut':
+        order = order[value:] + order[:value]
+    else:
+        order = [order[i] for i in value]
+    return order
+
+
+class JournalReplay:
+    """
+    Reader of a deck journal, rebuilds the deck after any operation
+    Reading indexes the entries in one pass, each state is then rebuilt from the nearest
+    checkpoint (or from the last state rebuilt, when that is closer)
+    """
+
+    def __init__(self, path):
+        """
+        :param path: file written by DeckJournal, it can still be open for writing
+        """
+
+        with open(path, 'rb') as f:
+            self._data = f.read()
+        data = self._data
+        if len(data) < _HEADER.size or _HEADER.unpack_from(data)[0] != _MAGIC:
+            raise ValueError("Error: file is not a deck journal")
+        if _HEADER.unpack_from(data)[1] not in _READABLE:
+            raise ValueError("Error: unsupported deck journal version")
+        # (kind, payload start, payload end) of each operation, operation n at n - 1
+        self._operations = []
+        # operation numbers with a checkpoint, and the payload bounds of each
+        self._checkpoint_at = []
+        self._checkpoints = []
+        # card id as written -> card id in this process, for the defined cards
+        self._cards = {}
+        offset = _HEADER.size
+        while offset + _ENTRY.size <= len(data):
+            kind, length = _ENTRY.unpack_from(data, offset)
+            start = offset + _ENTRY.size
+            if start + length > len(data):
+                # cut off while writing, everything before it is still good
+                break
+            if kind == _CHECKPOINT:
+                self._checkpoint_at.append(_COUNT.unpack_from(data, start)[0])
+                self._checkpoints.append((start + _COUNT.size, start + length))
+            elif kind == _DEFINE:
+                self._cards[_COUNT.unpack_from(data, start)[0]] = unpack_identity(
+                    memoryview(data)[:start + length], start + _COUNT.size)[0]
+            else:
+                self._operations.append((kind, start, start + length))
+            offset = start + length
+        if not self._checkpoints:
+            raise ValueError("Error: deck journal has no starting state")
+        # last state rebuilt, as (operation number, list of card ids)
+        self._last = None
+
+    def _card_ids(self, start, end):
+        """Card ids packed at data[start:end], as ids of this process"""
+        ids = bytes_to_ids(self._data[start:end]).tolist()
+        if self._cards:
+            cards = self._cards
+            ids = [cards.get(each, each) for each in ids]
+        return ids
+
+    def __len__(self):
+        """Return number of operations in the journal"""
+        return len(self._operations)
+
+    def operation(self, n):
+        """
+        Decodes one operation
+        :param n: operation number, from 1 to len(self)
+        :return: (name, value) with a count for 'take' and 'cut', else a list of ints
+        """
+
+        if not 1 <= n <= len(self._operations):
+            raise IndexError("Error: operation number out of range")
+        kind, start, end = self._operations[n - 1]
+        name = _NAMES[kind]
+        if name in _COUNTED:
+            return name, _COUNT.unpack_from(self._data, start)[0]
+        if name == 'append':
+            return name, self._card_ids(start, end)
+        return name, bytes_to_ids(self._data[start:end]).tolist()
+
+    def ids(self, n):
+        """
+        Card ids of the deck after an operation
+        :param n: operation number, 0 for the deck as attached, negative counts from the end
+        :return: list of card ids, top first
+        """
+
+        if n < 0:
+            n += len(self._operations) + 1
+        if not 0 <= n <= len(self._operations):
+            raise IndexError("Error: operation number out of range")
+        i = bisect_right(self._checkpoint_at, n) - 1
+        at = self._checkpoint_at[i]
+        if self._last is not None and at <= self._last[0] <= n:
+            # keep going from the last state rebuilt
+            at, order = self._last[0], list(self._last[1])
+        else:
+            start, end = self._checkpoints[i]
+            order = self._card_ids(start, end)
+        for each in range(at + 1, n + 1):
+            order = _apply(order, *self.operation(each))
+        self._last = (n, order)
+        return list(order)
+
+    def deck(self, n, rng=None):
+        """
+        Rebuilds the deck after an operation
+        :param n: operation number, 0 for the deck as attached, negative counts from the end
+        :param rng: random number generator or seed of the new deck
+        :return: Deck holding the same cards in the same order
+        """
+        return Deck.from_ids(self.ids(n), rng=rng)
+
+    def states(self):
+        """
+        Every state in order, each built from the one before, for audits of a whole journal
+        :return: generator of (operation number, list of card ids)
+        """
+
+        start, end = self._checkpoints[0]
+        order = self._card_ids(start, end)
+        yield 0, list(order)
+        for n in range(1, len(self._operations) + 1):
+            order = _apply(order, *self.operation(n))
+            yield n, list(order)
@@ -0,0 +1,164 @@
+import deck_builder as db
+import deck_journal as dj
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import unittest
+
+
+class test_DeckJournal(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def _play(self, deck, journal, steps, seed):
+        """Random operations on a journaled deck, returns the expected ids after each one"""
+        rng = random.Random(seed)
+        expected = {0: deck.to_ids().tolist()}
+        for _ in range(steps):
+            op = rng.randrange(12)
+            if op == 0:
+                deck.shuffle(rng.choice(['uniform', 'riffle', 'overhand']))
+            elif op == 1 and len(deck) >= 2:
+                deck.cut()
+            elif op == 2 and len(deck) >= 4:
+                deck.deal(2, 2)
+            elif op == 3 and len(deck):
+                deck.draw()
+            elif op == 4:
+                deck.pull(rng.choice(['h2', 'sace', 'd10', 'cking']))
+            elif op == 5:
+                deck.pull_list(['h3', 'c7', 'x9'])
+            elif op == 6:
+                deck.pull_where(name=rng.choice(['4', 'queen']))
+            elif op == 7:
+                deck.push(rng.choice(['hearts', 'spades']), rng.choice(['4', 'queen', '3']))
+            elif op == 8:
+                deck.extend([rng.randrange(52) for _ in range(3)])
+            elif op == 9 and len(deck) >= 2:
+                deck.draw_random(2)
+            elif op == 10:
+                list(deck.iter_deal(2, min(2, len(deck) // 2)))
+            elif op == 11:
+                deck.shuffle(lazy=True)
+                if len(deck):
+                    deck.draw_many(1)
+            expected[journal.operations] = deck.to_ids().tolist()
+        return expected
+
+    def test_replay(self):
+        """Every state is rebuilt exactly, from checkpoints and in any order"""
+        deck = db.Deck(jokers=True, rng=1)
+        with dj.DeckJournal(self.path, checkpoint_every=7) as journal:
+            journal.attach(deck)
+            expected = self._play(deck, journal, 400, seed=2)
+            self.assertIs(deck._journal, journal)
+        self.assertIsNone(deck._journal)
+
+        replay = dj.JournalReplay(self.path)
+        self.assertEqual(len(replay), max(expected))
+        states = list(expected)
+        random.Random(3).shuffle(states)
+        for n in states:
+            self.assertEqual(replay.ids(n), expected[n], n)
+        self.assertEqual(replay.ids(-1), expected[max(expected)])
+        self.assertEqual(replay.deck(-1), db.Deck.from_ids(expected[max(expected)]))
+        for n, ids in replay.states():
+            if n in expected:
+                self.assertEqual(ids, expected[n])
+        with self.assertRaises(IndexError):
+            replay.ids(len(replay) + 1)
+
+    def test_entries(self):
+        """Operations are recorded as small entries, not as whole decks"""
+        deck = db.Deck(rng=4)
+        with dj.DeckJournal(self.path) as journal:
+            journal.attach(deck)
+            deck.draw_many(3)
+            deck.cut()
+            deck.pull('sace')
+            deck.push('hearts', 'ace')
+            deck.shuffle()
+            with self.assertRaises(ValueError):
+                journal.attach(db.Deck())
+        replay = dj.JournalReplay(self.path)
+        self.assertEqual(len(replay), 5)
+        self.assertEqual(replay.operation(1), ('take', 3))
+        self.assertEqual(replay.operation(2), ('cut', 24))
+        self.assertEqual(replay.operation(3), ('remove', [48 - 24]))
+        self.assertEqual(replay.operation(4), ('append', [db.card_id('hearts', 'ace')]))
+        self.assertEqual(replay.operation(5)[0], 'shuffle')
+        self.assertEqual(sorted(replay.operation(5)[1]), list(range(49)))
+        # header, starting checkpoint and five operations, the shuffle being the largest
+        self.assertLess(os.path.getsize(self.path), 5 + 2 * (5 + 4 + 1 + 52) + 4 * (5 + 4) + 5 + 1 + 49)
+
+    def test_shoe(self):
+        """Reshuffling a shoe journals the returned discard pile as one entry"""
+        shoe = db.Shoe(2, rng=5)
+        with dj.DeckJournal(self.path, checkpoint_every=3) as journal:
+            journal.attach(shoe)
+            shoe.deal(3, 5)
+            shoe.reshuffle()
+            shoe.reshuffle(lazy=True)
+            shoe.deal(2, 2)
+            # exporting a lazily shuffled shoe shuffles it for real, which is journaled too
+            final = shoe.to_ids().tolist()
+        replay = dj.JournalReplay(self.path)
+        self.assertEqual([replay.operation(n)[0] for n in range(1, len(replay) + 1)],
+                         ['take', 'append', 'shuffle', 'remove', 'shuffle'])
+        self.assertEqual(replay.ids(-1), final)
+        self.assertEqual(len(replay.ids(2)), 104)
+
+    def test_other_process(self):
+        """A journal written by a process that numbers cards differently replays the same cards"""
+        writer = (f"import deck_builder as db, deck_journal as dj\n"
+                  f"for i in range(40): db.card_id('moons', str(i))\n"
+                  f"deck = db.Deck(spec=db.TAROT, rng=7)\n"
+                  f"with dj.DeckJournal({self.path!r}, checkpoint_every=2) as journal:\n"
+                  f"    journal.attach(deck)\n"
+                  f"    deck.shuffle()\n"
+                  f"    deck.draw_many(3)\n"
+                  f"    deck.push('comets', 'halley')\n"
+                  f"    deck.push('comets', 'halley')\n"
+                  f"    deck.cut()\n"
+                  f"print(deck.to_tuples())\n")
+        output = subprocess.run([sys.executable, '-c', writer], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+        replay = dj.JournalReplay(self.path)
+        self.assertEqual(str(replay.deck(-1).to_tuples()), output)
+        self.assertEqual(replay.operation(3), ('append', [db.card_id('comets', 'halley')]))
+        self.assertEqual(len(replay.ids(0)), 78)
+        self.assertEqual([n for n, _ in replay.states()], list(range(6)))
+
+    def test_truncated(self):
+        """A cut-off last entry is ignored, other files are refused"""
+        deck = db.Deck(rng=6)
+        with dj.DeckJournal(self.path) as journal:
+            journal.attach(deck)
+            deck.draw()
+            deck.shuffle()
+            deck.draw()
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        with open(self.path, 'wb') as f:
+            f.write(data[:-2])
+        replay = dj.JournalReplay(self.path)
+        self.assertEqual(len(replay), 2)
+        self.assertEqual(len(replay.ids(-1)), 51)
+
+        with open(self.path, 'wb') as f:
+            f.write(b'not a journal')
+        with self.assertRaises(ValueError):
+            dj.JournalReplay(self.path)
+        with self.assertRaises(ValueError):
+            dj.DeckJournal(self.path, checkpoint_every=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+"""
+Opt-in instrumentation of Deck operations
+
+While a profile is active, the methods of Deck, Shoe and Card (plus the shuffle
+strategies) are replaced by wrappers that count calls, time them into log2 latency
+histograms and attribute linked-list hops to the calls that made them. When no profile
+is active nothing is wrapped, and the only cost left in the deck code is one
+`_profiler is not None` check per walk over the list.
+
+    with deck_profiler() as profile:
+        deck.pull_where(suit='hearts')
+    print(profile.report())
+
+Hops are the cards a walk visits. Walks that can stop early (__iter__, __eq__) are
+counted in full when they start. A call's hops include those of the calls it makes, so
+Shoe.reshuffle reports every hop of its shuffle, and the shuffle reports its own.
+Profiling is meant for one thread at a time.
+"""
+from contextlib import contextmanager
+import functools
+import inspect
+import time
+
+import deck_builder
+import shuffles
+from deck_builder import Card, Deck, Shoe
+
+# Card methods worth timing, the rest are one-line getters and setters
+_CARD_METHODS = ('__init__', '__str__', '__eq__')
+# Deck dunders worth timing, next to every public method
+_DUNDERS = ('__init__', '__str__', '__len__', '__iter__', '__contains__', '__eq__', '__hash__')
+
+
+def _targets():
+    """(owner, attribute, qualified name) of everything a profile wraps"""
+    targets = []
+    for cls in (Deck, Shoe):
+        for attr, value in vars(cls).items():
+            if inspect.isfunction(value) and (not attr.startswith('_') or attr in _DUNDERS):
+                targets.append((cls, attr, f"{cls.__name__}.{attr}"))
+    for attr in _CARD_METHODS:
+        targets.append((Card, attr, f"Card.{attr}"))
+    return targets
+
+
+class Profile:
+    """Call counts, latency histograms and hops collected while profiling"""
+
+    def __init__(self):
+        # qualified name -> [calls, total ns, hops, {bucket upper bound in ns: count}]
+        self._stats = {}
+        # names of the calls in progress, outermost first
+        self._stack = []
+        self._originals = []
+
+    def hops(self, n):
+        """Called by deck_builder when a walk visits n cards, credits every call in progress"""
+        stats = self._stats
+        for name in set(self._stack):
+            stats[name][2] += n
+
+    def _wrap(self, name, func):
+        """Timing wrapper for one function"""
+        stats = self._stats.setdefault(name, [0, 0, 0, {}])
+        stack = self._stack
+        clock = time.perf_counter_ns
+
+        def record(elapsed):
+            stats[0] += 1
+            stats[1] += elapsed
+            # bucket b holds calls that took less than 2**b ns
+            bucket = 1 << elapsed.bit_length()
+            stats[3][bucket] = stats[3].get(bucket, 0) + 1
+
+        if inspect.isgeneratorfunction(func):
+            # generators are timed from the first item to the last, or until closed, and
+            # are only on the stack while they run, not while the caller holds them
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                generator = func(*args, **kwargs)
+                start = clock()
+                try:
+                    while True:
+                        stack.append(name)
+                        try:
+                            item = next(generator)
+                        except StopIteration:
+                            return
+                        finally:
+                            stack.pop()
+                        yield item
+                finally:
+                    generator.close()
+                    record(clock() - start)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                stack.append(name)
+                start = clock()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    record(clock() - start)
+                    stack.pop()
+        return wrapper
+
+    def start(self):
+        """Wraps every target and installs this profile, see deck_profiler"""
+        if deck_builder._profiler is not None:
+            raise RuntimeError("Error: a deck profile is already active")
+        for owner, attr, name in _targets():
+            original = vars(owner)[attr]
+            self._originals.append((owner, attr, original))
+            setattr(owner, attr, self._wrap(name, original))
+        for key, strategy in list(shuffles.STRATEGIES.items()):
+            self._originals.append((shuffles.STRATEGIES, key, strategy))
+            shuffles.STRATEGIES[key] = self._wrap(f"shuffles.{key}", strategy)
+        deck_builder._profiler = self
+
+    def stop(self):
+        """Restores the original methods, the collected statistics stay readable"""
+        deck_builder._profiler = None
+        for owner, attr, original in reversed(self._originals):
+            if owner is shuffles.STRATEGIES:
+                owner[attr] = original
+            else:
+                setattr(owner, attr, original)
+        self._originals = []
+
+    def snapshot(self):
+        """
+        Statistics of every method called at least once
+        :return: dict of qualified name (ex. 'Deck.pull') -> dict with calls, total_us,
+            mean_us, hops and histogram (upper bound in ns -> calls)
+        """
+
+        result = {}
+        for name, (calls, total, hops, histogram) in self._stats.items():
+            if calls:
+                result[name] = {
+                    'calls': calls,
+                    'total_us': total / 1000,
+                    'mean_us': total / calls / 1000,
+                    'hops': hops,
+                    'histogram': dict(sorted(histogram.items())),
+                }
+        return result
+
+    def report(self):
+        """Statistics as a text table, slowest total first"""
+        lines = [f"{'method':<24} {'calls':>9} {'total us':>12} {'mean us':>10} {'hops':>10}"]
+        rows = sorted(self.snapshot().items(), key=lambda item: item[1]['total_us'], reverse=True)
+        for name, each in rows:
+            lines.append(f"{name:<24} {each['calls']:>9} {each['total_us']:>12.1f} "
+                         f"{each['mean_us']:>10.2f} {each['hops']:>10}")
+        return "\n".join(lines)
+
+
+@contextmanager
+def deck_profiler():
+    """
+    Profiles every deck operation inside the with block
+    :return: Profile, readable during and after the block
+    """
+
+    profile = Profile()
+    profile.start()
+    try:
+        yield profile
+    finally:
+        profile.stop()
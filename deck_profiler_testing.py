@@ -0,0 +1,69 @@
+import unittest
+import deck_builder as db
+import shuffles
+from deck_profiler import deck_profiler
+
+
+class test_Profiler(unittest.TestCase):
+
+    def test_counts(self):
+        """Calls, hops and histograms are recorded for each method used in the block"""
+        deck = db.Deck(rng=1)
+        with deck_profiler() as profile:
+            deck.shuffle()
+            deck.find('sace')
+            deck.pull_list(['h2', 'h3'])
+            deck.cut()
+            list(deck)
+        stats = profile.snapshot()
+        self.assertEqual(stats['Deck.pull_list']['calls'], 1)
+        # pull_list walks the deck itself, once, stopping at the last card it asked for
+        self.assertNotIn('Deck.pull', stats)
+        self.assertTrue(2 <= stats['Deck.pull_list']['hops'] <= 52)
+        self.assertEqual(stats['shuffles.uniform']['calls'], 1)
+        # shuffle walks the deck to collect it and again to relink it
+        self.assertEqual(stats['Deck.shuffle']['hops'], 104)
+        # the first find builds the code index and the positional index, one walk each
+        self.assertEqual(stats['Deck.find']['hops'], 104)
+        self.assertEqual(stats['Deck.cut']['hops'], 25)
+        self.assertEqual(stats['Deck.__iter__']['hops'], 50)
+        self.assertEqual(sum(stats['Deck.pull_list']['histogram'].values()), 1)
+        self.assertNotIn('Deck.draw', stats)
+        self.assertIn('Deck.pull_list', profile.report())
+
+    def test_nested_hops(self):
+        """Hops of an inner call count for the outer call too, generators only while they run"""
+        deck = db.Deck()
+        with deck_profiler() as profile:
+            for _ in deck:
+                deck.draw()
+                break
+            deck.iter_deal(2, 2)
+        stats = profile.snapshot()
+        self.assertEqual(stats['Deck.draw']['hops'], 1)
+        self.assertEqual(stats['Deck.__iter__']['hops'], 52)
+
+        with deck_profiler() as profile:
+            str(deck)
+        stats = profile.snapshot()
+        self.assertEqual(stats['Deck.__str__']['hops'], 51)
+        self.assertEqual(stats['Deck.__str__']['calls'], 1)
+
+    def test_disabled(self):
+        """Leaving the block restores every method and removes the hook"""
+        pull = db.Deck.pull
+        uniform = shuffles.STRATEGIES['uniform']
+        with deck_profiler():
+            self.assertIsNot(db.Deck.pull, pull)
+            self.assertIsNotNone(db._profiler)
+            with self.assertRaises(RuntimeError):
+                with deck_profiler():
+                    pass
+        self.assertIs(db.Deck.pull, pull)
+        self.assertIs(shuffles.STRATEGIES['uniform'], uniform)
+        self.assertIsNone(db._profiler)
+        self.assertNotIn('__hash__', vars(db.Shoe))
+
+
+if __name__ == '__main__':
+    unittest.main()
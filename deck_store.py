@@ -0,0 +1,200 @@
+"""
+Fixed-width storage of many deck states in one memory-mapped file
+
+The file starts with a header, followed by records of the same size. A record is a
+two byte card count and room for `width` card ids of `card_bytes` bytes each, so record
+i is found by arithmetic and read straight out of the mapped file without copying.
+
+Ids below deck_builder.FIXED_IDS (the standard cards and jokers) are stored as they are.
+Other cards get store ids from FIXED_IDS up in order of first appearance, and their suits
+and names are appended to a card table next to the store (path + '.cards', packed with
+pack_identity) before any record uses them, so the file reads back in any process.
+"""
+from array import array
+import mmap
+import os
+import struct
+
+from deck_builder import FIXED_IDS, IDENTITIES, Deck, card_id, check_ids, pack_identity, unpack_identity_text
+
+# magic, version, byte order ('<' or '>'), card bytes, width
+_HEADER = struct.Struct('<4sBcBH')
+_MAGIC = b'CSDS'
+_VERSION = 1
+_NATIVE = b'<' if array('H', [1]).tobytes()[0] == 1 else b'>'
+
+
+class DeckStore:
+    """
+    Append-only store of deck orders, read back by record number
+    Records are written in native byte order, so ids(i) can be a view of the mapped file
+    """
+
+    def __init__(self, path, width=54, card_bytes=1):
+        """
+        Opens a store, creating it if the file does not exist
+        :param path: file path
+        :param width: most cards a record can hold, ignored for an existing store
+        :param card_bytes: 1 for store ids below 256 (up to 202 cards besides the standard
+            ones and jokers), 2 for more, ignored for an existing store
+        """
+
+        self.path = path
+        self.table_path = path + '.cards'
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb') as f:
+                header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                raise ValueError("Error: file is not a deck store")
+            magic, version, order, card_bytes, width = _HEADER.unpack(header)
+            if magic != _MAGIC or version != _VERSION:
+                raise ValueError("Error: file is not a deck store")
+            if order != _NATIVE:
+                raise ValueError("Error: deck store was written with a different byte order")
+        else:
+            if card_bytes not in (1, 2):
+                raise ValueError("Error: card_bytes must be 1 or 2")
+            with open(path, 'wb') as f:
+                f.write(_HEADER.pack(_MAGIC, _VERSION, _NATIVE, card_bytes, width))
+        self.width = width
+        self.card_bytes = card_bytes
+        self.record_size = 2 + width * card_bytes
+        self._typecode = 'B' if card_bytes == 1 else 'H'
+        # process id of each card in the card table, in store id order from FIXED_IDS
+        self.card_ids = []
+        self._store_ids = {}
+        self._read_table()
+        self._table = open(self.table_path, 'ab')
+        self._file = open(path, 'ab')
+        self._map = None
+        self._mapped = 0
+        self._count, partial = divmod(os.path.getsize(path) - _HEADER.size, self.record_size)
+        if partial:
+            # a record cut off by a crash, drop it so later appends stay aligned
+            self._file.truncate(_HEADER.size + self._count * self.record_size)
+
+    def _read_table(self):
+        """
+        Registers the cards of an existing card table, dropping an entry cut off by a crash
+        Any other problem with an entry, such as a card whose code is already another card's
+        code in this process, raises and leaves the table as it is
+        """
+
+        if not os.path.exists(self.table_path):
+            return
+        with open(self.table_path, 'rb') as f:
+            data = f.read()
+        offset = 0
+        while offset < len(data):
+            unpacked = unpack_identity_text(data, offset)
+            if unpacked is None:
+                with open(self.table_path, 'r+b') as f:
+                    f.truncate(offset)
+                break
+            suit, name, offset = unpacked
+            card = card_id(suit, name)
+            self._store_ids[card] = FIXED_IDS + len(self.card_ids)
+            self.card_ids.append(card)
+
+    def _store_id(self, card):
+        """Store id of a card id, adding the card to the card table the first time"""
+        if card < FIXED_IDS:
+            return card
+        store_id = self._store_ids.get(card)
+        if store_id is None:
+            store_id = FIXED_IDS + len(self.card_ids)
+            if store_id >= 1 << (8 * self.card_bytes):
+                raise ValueError("Error: card table is full for this store's card_bytes")
+            self._store_ids[card] = store_id
+            self.card_ids.append(card)
+            # on disk before any record that uses it
+            self._table.write(pack_identity(IDENTITIES[card]))
+            self._table.flush()
+        return store_id
+
+    def __len__(self):
+        """Return number of records in the store"""
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Flushes pending records and closes the file, views already returned stay valid"""
+        self._file.close()
+        self._table.close()
+        self._map = None
+
+    def append(self, deck):
+        """
+        Appends one deck state, writes are buffered until flush, close or the next read
+        :param deck: Deck, CompactDeck, or sequence of card ids
+        :return: record number of the new record
+        """
+
+        ids = deck.to_ids() if hasattr(deck, 'to_ids') else check_ids(deck)
+        if len(ids) > self.width:
+            raise ValueError("Error: deck is larger than the record width")
+        if len(ids) and max(ids) >= FIXED_IDS:
+            ids = [self._store_id(each) for each in ids]
+        try:
+            record = array(self._typecode, ids)
+        except OverflowError:
+            raise ValueError("Error: card id too large for this store's card_bytes") from None
+        record.extend([0] * (self.width - len(ids)))
+        self._file.write(struct.pack('=H', len(ids)))
+        self._file.write(record.tobytes())
+        self._count += 1
+        return self._count - 1
+
+    def extend(self, decks):
+        """Appends many deck states, see append"""
+        for deck in decks:
+            self.append(deck)
+
+    def flush(self):
+        """Writes buffered records to the file"""
+        self._file.flush()
+
+    def _view(self, i):
+        """Memoryview of record i inside the mapped file, remapping if the file has grown"""
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("Error: record number out of range")
+        end = _HEADER.size + (i + 1) * self.record_size
+        if end > self._mapped:
+            self._file.flush()
+            with open(self.path, 'rb') as f:
+                # views handed out earlier keep the old map alive
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mapped = len(self._map)
+        return memoryview(self._map)[end - self.record_size:end]
+
+    def ids(self, i):
+        """
+        Store ids of record i, a view of the mapped file (no copy). Ids below FIXED_IDS are
+        card ids, the card id of a larger one is card_ids[store id - FIXED_IDS]
+        :param i: record number, negative numbers count from the end
+        :return: memoryview of store ids
+        """
+
+        record = self._view(i)
+        count = record[:2].cast('H')[0]
+        return record[2:2 + count * self.card_bytes].cast(self._typecode)
+
+    def load(self, i):
+        """
+        Rebuilds the deck stored in record i
+        :param i: record number, negative numbers count from the end
+        :return: Deck
+        """
+
+        ids = self.ids(i)
+        if self.card_ids:
+            table = self.card_ids
+            ids = [table[each - FIXED_IDS] if each >= FIXED_IDS else each for each in ids]
+        return Deck.from_ids(ids)
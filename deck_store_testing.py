@@ -0,0 +1,163 @@
+import compact_deck as cd
+import deck_builder as db
+import deck_store as ds
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+
+def read_in_new_process(code):
+    """Runs code in a fresh interpreter that registered other cards first, returns its output"""
+    setup = "import deck_builder as db, deck_store as ds\nfor i in range(40): db.card_id('moons', str(i))\n"
+    return subprocess.run([sys.executable, '-c', setup + code], capture_output=True, text=True, check=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+
+
+class test_Serialization(unittest.TestCase):
+
+    def test_round_trip(self):
+        """Decks pack to one byte per card and unpack to the same order"""
+        deck = db.Deck(jokers=True, rng=1)
+        deck.shuffle()
+        deck.draw()
+        data = deck.to_bytes()
+        self.assertEqual(len(data), 1 + 53)
+        self.assertEqual(db.Deck.from_bytes(data), deck)
+        self.assertEqual(list(cd.CompactDeck.from_bytes(data)), list(deck))
+
+        compact = cd.CompactDeck(rng=2)
+        compact.shuffle()
+        compact.draw_many(3)
+        self.assertEqual(compact.to_bytes(), db.Deck.from_bytes(compact.to_bytes()).to_bytes())
+
+        # cards beyond the standard ones carry their suit and name, renumbered from 54 in
+        # order of appearance, so more than 202 of them need two bytes per card
+        deck = db.Deck()
+        for i in range(300):
+            deck.push('tarot', f"major{i}")
+        deck.push('tarot', 'major0')
+        data = deck.to_bytes()
+        self.assertEqual(data[0], 0x82)
+        table = sum(4 + len('tarot') + len(f"major{i}") for i in range(300))
+        self.assertEqual(len(data), 1 + 2 + table + 2 * 353)
+        self.assertEqual(db.Deck.from_bytes(data), deck)
+        self.assertEqual(cd.CompactDeck.from_bytes(data).to_ids(), deck.to_ids())
+        small = db.Deck.from_ids(deck.to_ids()[-3:]).to_bytes()
+        self.assertEqual(small[0], 0x81)
+
+        # another process numbers the cards differently and still reads the same deck
+        output = read_in_new_process(f"print(db.Deck.from_bytes({small!r}).to_tuples())")
+        self.assertEqual(output, str([('major298', 'tarot'), ('major299', 'tarot'), ('major0', 'tarot')]))
+
+        with self.assertRaises(ValueError):
+            db.Deck.from_bytes(b'\x07abc')
+
+
+class test_DeckStore(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.close(handle)
+        os.remove(self.path)
+
+    def tearDown(self):
+        os.remove(self.path)
+        if os.path.exists(self.path + '.cards'):
+            os.remove(self.path + '.cards')
+
+    def test_append_and_read(self):
+        """Records read back by number, including after reopening the file"""
+        decks = []
+        with ds.DeckStore(self.path, width=54) as store:
+            for seed in range(50):
+                deck = db.Deck(rng=seed)
+                deck.shuffle()
+                deck.draw_many(seed % 5)
+                decks.append(deck)
+                self.assertEqual(store.append(deck), seed)
+            # reading flushes and maps, later appends remap
+            self.assertEqual(store.load(3), decks[3])
+            store.append(cd.CompactDeck(jokers=True))
+            self.assertEqual(list(store.load(-1)), list(db.Deck(jokers=True)))
+
+        with ds.DeckStore(self.path) as store:
+            self.assertEqual(len(store), 51)
+            self.assertEqual(store.width, 54)
+            for i, deck in enumerate(decks):
+                self.assertEqual(store.load(i), deck)
+            view = store.ids(7)
+            self.assertIsInstance(view, memoryview)
+            self.assertEqual(bytes(view), decks[7].to_bytes()[1:])
+            with self.assertRaises(IndexError):
+                store.ids(51)
+
+            # cards beyond the standard ones go in the card table, for any process to read
+            deck = db.Deck.from_ids([0, 53])
+            deck.push('stars', 'north')
+            deck.push('hearts', 'ace')
+            deck.push('stars', 'north')
+            store.append(deck)
+            self.assertEqual(list(store.ids(-1)), [0, 53, 54, 12, 54])
+            self.assertEqual(store.load(-1), deck)
+        output = read_in_new_process(f"print(ds.DeckStore({self.path!r}).load(-1).to_tuples())")
+        self.assertEqual(output, str(deck.to_tuples()))
+
+    def test_limits(self):
+        """Records are fixed width, and one byte stores can't hold large ids"""
+        with ds.DeckStore(self.path, width=10) as store:
+            with self.assertRaises(ValueError):
+                store.append(db.Deck())
+            with self.assertRaises(ValueError):
+                store.append([len(db.IDENTITIES)])
+            store.append([1, 2, 3])
+            self.assertEqual(list(store.ids(0)), [1, 2, 3])
+            # a one byte store has room for 202 cards beyond the standard ones
+            extra = [db.card_id('runes', str(i)) for i in range(203)]
+            for i in range(0, 200, 10):
+                store.append(extra[i:i + 10])
+            store.append(extra[200:202])
+            with self.assertRaises(ValueError):
+                store.append(extra[202:])
+            self.assertEqual(len(store.card_ids), 202)
+
+    def test_partial_record(self):
+        """A record cut off at the end of the file is dropped when the store is opened"""
+        with ds.DeckStore(self.path, width=5) as store:
+            for i in range(3):
+                store.append([i, i + 1])
+        with open(self.path, 'ab') as f:
+            f.write(b'\x02\x00\x07')
+        with ds.DeckStore(self.path) as store:
+            self.assertEqual(len(store), 3)
+            store.append([9, 8, 7])
+            self.assertEqual(list(store.ids(2)), [2, 3])
+            self.assertEqual(list(store.ids(3)), [9, 8, 7])
+        self.assertEqual(os.path.getsize(self.path), ds._HEADER.size + 4 * store.record_size)
+
+        with open(self.path, 'wb') as f:
+            f.write(b'CSD')
+        with self.assertRaises(ValueError):
+            ds.DeckStore(self.path)
+
+    def test_card_table_errors(self):
+        """Only a card cut off at the end of the card table is dropped, other errors raise"""
+        comet = db.card_id('comets', 'table')
+        with ds.DeckStore(self.path, width=2) as store:
+            store.append([comet, 0])
+        table_path = self.path + '.cards'
+        with open(table_path, 'ab') as f:
+            f.write(b'\x06\x00com')
+        with ds.DeckStore(self.path) as store:
+            self.assertEqual(store.card_ids, [comet])
+            self.assertEqual(list(store.load(0).to_ids()), [comet, 0])
+        size = os.path.getsize(table_path)
+        self.assertEqual(size, len(db.pack_identity(db.IDENTITIES[comet])))
+
+        # suit 'h' and name '2' would take the code of the two of hearts
+        with open(table_path, 'ab') as f:
+            f.write(b'\x01\x00h\x01\x002')
+        with self.assertRaises(ValueError):
+            ds.DeckStore(self.path)
+        self.assertEqual(os.path.getsize(table_path), size + 6)
@@ -1,4 +1,9 @@
+from array import array
+from collections import Counter
+import copy
 import deck_builder as db
+import pickle
+import random
 import unittest
 
 
@@ -58,6 +63,54 @@ class test_Card(unittest.TestCase):
         self.assertEqual(card, card2)
 
 
+    def test_identity(self):
+        """Cards share one interned, immutable identity per suit and name"""
+        card = db.Card('hearts', 8)
+        card2 = db.Card('hearts', '8')
+        self.assertIs(card.identity, card2.identity)
+        self.assertIs(card.get_data(), card2.get_data())
+        self.assertIs(db.Deck().top.identity, db.Deck().top.identity)
+        self.assertEqual(str(card), 'h8')
+        # identities can't be changed in place, setting a field swaps the identity
+        with self.assertRaises(AttributeError):
+            card.identity.name = '9'
+        card.set_name(9)
+        self.assertEqual(card.get_data(), ('9', 'hearts'))
+        self.assertEqual(card2.get_data(), ('8', 'hearts'))
+        # nodes only hold an identity, their deck and links
+        self.assertFalse(hasattr(card, '__dict__'))
+        with self.assertRaises(AttributeError):
+            card.color = 'red'
+
+    def test_copy_identity(self):
+        """Copying or unpickling a card hands back the interned identity"""
+        identity = db.get_identity('stars', 'copy')
+        self.assertIs(copy.deepcopy(identity), identity)
+        self.assertIs(copy.copy(identity), identity)
+        self.assertIs(pickle.loads(pickle.dumps(identity)), identity)
+        card = db.Card('stars', 'copy')
+        for clone in (copy.deepcopy(card), pickle.loads(pickle.dumps(card))):
+            self.assertIsNot(clone, card)
+            self.assertIs(clone.identity, identity)
+            self.assertEqual(clone, card)
+
+    def test_card_in_deck(self):
+        """A card can't be changed while a deck indexes it, only once it has left"""
+        deck = db.Deck()
+        card = deck.top
+        self.assertIs(card.deck, deck)
+        with self.assertRaises(ValueError):
+            card.set_name('99')
+        with self.assertRaises(ValueError):
+            deck.bottom.set_suit('stars')
+        self.assertEqual(deck.draw(), ('2', 'hearts'))
+        self.assertIsNone(card.deck)
+        card.set_name('99')
+        deck._append(card)
+        self.assertEqual(deck.count('h99'), 1)
+        self.assertEqual(deck.pull('h99'), ('99', 'hearts'))
+
+
 class test_Deck(unittest.TestCase):
 
     def test_build_deck(self):
@@ -74,6 +127,32 @@ class test_Deck(unittest.TestCase):
         deck.find('bjoker')
         deck.find('rjoker')
 
+    def test_build_factory(self):
+        """Decks of several packs, or of custom suits and ranks, come from cached prototypes"""
+        deck = db.Deck(n_decks=2, jokers=True)
+        self.assertEqual(len(deck), 108)
+        self.assertEqual(list(deck), list(db.Deck(jokers=True)) * 2)
+        self.assertEqual(deck.count(name='joker'), 4)
+        self.assertEqual(deck.find('bjoker'), 53)
+        self.assertEqual(deck.bottom.get_prev().get_next(), deck.bottom)
+
+        # pinochle: two packs of 9 through ace
+        deck = db.Deck(n_decks=2, ranks=['9', '10', 'jack', 'queen', 'king', 'ace'])
+        self.assertEqual(len(deck), 48)
+        self.assertEqual(deck.count(name='ace'), 8)
+        self.assertEqual(deck.find('c9'), 6)
+        deck.shuffle()
+        self.assertEqual(deck.pull('hace'), ('ace', 'hearts'))
+        self.assertEqual(deck.count(code='hace'), 1)
+
+        # custom suits, and the prototype is built once per kind of deck
+        deck = db.Deck(suits=['red', 'blue'], ranks=range(1, 4))
+        self.assertEqual(list(deck)[:4], [('1', 'red'), ('2', 'red'), ('3', 'red'), ('1', 'blue')])
+        self.assertIs(db.prototype(1, False, ('red', 'blue'), ('1', '2', '3')),
+                      db.prototype(1, False, ('red', 'blue'), ('1', '2', '3')))
+        # decks built from one prototype don't share card objects
+        self.assertIsNot(db.Deck().top, db.Deck().top)
+
     def test_dunder(self):
         """
         Test that equality, iter, and length dunder methods operate successfully
@@ -126,6 +205,47 @@ class test_Deck(unittest.TestCase):
         deck2.shuffle()
         self.assertNotEqual(deck1, deck2)
 
+    def test_shuffle_seeded(self):
+        """Decks given the same seed shuffle into the same order, a shared Random can be injected"""
+        deck1 = db.Deck(rng=42)
+        deck2 = db.Deck(rng=42)
+        deck1.shuffle()
+        deck2.shuffle()
+        self.assertEqual(deck1, deck2)
+        self.assertNotEqual(deck1, db.Deck())
+
+        # injecting a Random instance works the same as a seed
+        deck3 = db.Deck(rng=random.Random(42))
+        deck3.shuffle()
+        self.assertEqual(deck1, deck3)
+
+    def test_shuffle_strategies(self):
+        """Every strategy keeps the same cards and leaves the deck correctly linked"""
+        for method in ['uniform', 'riffle', 'overhand']:
+            deck = db.Deck(jokers=True, rng=7)
+            deck.shuffle(method, times=3)
+            self.assertEqual(len(deck), 54)
+            self.assertEqual(sorted(deck), sorted(db.Deck(jokers=True)))
+            # walk the links both ways
+            self.assertEqual(deck.top.get_prev(), None)
+            self.assertEqual(deck.bottom.get_next(), None)
+            backwards = []
+            card = deck.bottom
+            while card is not None:
+                backwards.append(card.get_data())
+                card = card.get_prev()
+            self.assertEqual(backwards[::-1], list(deck))
+
+        # a custom strategy is any callable taking (cards, rng)
+        deck = db.Deck()
+        deck.shuffle(lambda cards, rng: cards[::-1])
+        self.assertEqual(deck.top.get_data(), ('ace', 'spades'))
+        self.assertEqual(deck.bottom.get_data(), ('2', 'hearts'))
+
+        # unknown strategy names are rejected
+        with self.assertRaises(ValueError):
+            deck.shuffle('pile')
+
     def test_find(self):
         """Test find method. Find method is mostly intended for internal use in pull method."""
         # create deck
@@ -183,6 +303,121 @@ class test_Deck(unittest.TestCase):
         with self.assertRaises(TypeError):
             deck.pull()
 
+    def test_index(self):
+        """The code index and positional index stay in step with the linked list"""
+        deck = db.Deck(rng=3)
+        self.assertIn('hace', deck)
+        self.assertNotIn('h22', deck)
+        self.assertNotIn(['h2'], deck)
+
+        def scan(target):
+            # reference answer by walking the deck
+            for i, each in enumerate(deck):
+                if db.Card(each[1], each[0]).__str__() == target:
+                    return i
+            return "Target card is not in this deck"
+
+        # mix every mutating operation with lookups
+        deck.push('clubs', 'ace')
+        deck.find('h2')
+        deck.draw()
+        deck.push('hearts', 5)
+        deck.shuffle()
+        deck.find('h5')
+        deck.cut()
+        deck.deal(2, 3)
+        deck.pull('d7')
+        deck.push('diamonds', 7)
+        for target in ['h2', 'h5', 'cace', 'd7', 'sking', 'h22']:
+            self.assertEqual(deck.find(target), scan(target))
+
+        # duplicates are pulled nearest the top first, and fully removed from the index
+        first = deck.find('cace')
+        while 'cace' in deck:
+            self.assertEqual(deck.find('cace'), scan('cace'))
+            deck.pull('cace')
+        self.assertNotEqual(first, scan('cace'))
+        self.assertEqual(deck.pull('cace'), "Target card is not in this deck")
+
+        # a card held once is indexed directly, duplicates share a dict until one is left
+        deck = db.Deck.from_ids([db.card_id('hearts', 'ace')] * 3)
+        self.assertEqual(deck.count(code='hace'), 3)
+        deck.draw_many(2)
+        self.assertIs(deck._index[db.card_id('hearts', 'ace')], deck.top)
+        self.assertEqual(deck.count(code='hace'), 1)
+        deck.push('hearts', 'ace')
+        self.assertEqual(deck.count(code='hace'), 2)
+        self.assertEqual(deck.pull('hace'), ('ace', 'hearts'))
+        self.assertEqual(deck.pull('hace'), ('ace', 'hearts'))
+        self.assertEqual(deck.count(code='hace'), 0)
+        self.assertNotIn('hace', deck)
+
+        # pulling down to an empty deck keeps top and bottom consistent
+        deck = db.Deck()
+        for each in list(deck):
+            deck.pull(db.Card(each[1], each[0]).__str__())
+        self.assertEqual(len(deck), 0)
+        self.assertEqual(deck.top, None)
+        self.assertEqual(deck.bottom, None)
+
+    def test_composition(self):
+        """Counts follow every change to the deck, and match a count over the cards"""
+        deck = db.Deck(jokers=True, rng=6)
+        self.assertEqual(deck.count(suit='hearts'), 13)
+        self.assertEqual(deck.count(name='ACE'), 4)
+        self.assertEqual(deck.count(code='bjoker'), 1)
+        self.assertEqual(deck.count(suit='Spades', name='king'), 1)
+        self.assertEqual(deck.count(), 54)
+
+        deck.shuffle()
+        deck.deal(3, 5)
+        deck.draw()
+        deck.draw_many(4)
+        deck.pull('hace')
+        deck.push('HEARTS', 'ace')
+        deck.pull_list(['c2', 'c3'])
+        cards = list(deck)
+        for suit in ['hearts', 'clubs', 'diamonds', 'spades', 'red']:
+            self.assertEqual(deck.count(suit=suit), sum(1 for each in cards if each[1].lower() == suit))
+        for name in ['2', '10', 'ace', 'joker']:
+            self.assertEqual(deck.count(name=name), sum(1 for each in cards if each[0] == name))
+
+        # a new deck counts and indexes its cards on the first query, after any changes
+        deck = db.Deck(rng=7)
+        self.assertIsNone(deck._index)
+        self.assertIsNone(deck._card_counts)
+        deck.shuffle()
+        deck.draw_many(5)
+        deck.push('stars', 'lazy')
+        deck.extend([db.card_id('hearts', 'ace')])
+        cards = list(deck)
+        self.assertEqual(deck.count(suit='hearts'), sum(1 for each in cards if each[1] == 'hearts'))
+        self.assertIsNone(deck._index)
+        self.assertEqual(deck.count(code='hace'), cards.count(('ace', 'hearts')))
+        self.assertEqual(deck.find('starslazy'), len(cards) - 2)
+        # once built, both follow later changes
+        deck.extend([db.card_id('stars', 'lazy')])
+        deck.pull('starslazy')
+        self.assertEqual(deck.count(suit='stars'), 1)
+        self.assertEqual(deck.find('starslazy'), len(cards) - 1)
+
+    def test_probability(self):
+        """Exact next-card and at-least-k probabilities"""
+        deck = db.Deck()
+        self.assertAlmostEqual(deck.probability(suit='hearts'), 0.25)
+        self.assertAlmostEqual(deck.probability(code='sace'), 1 / 52)
+        # at least one ace in two cards: 1 - (48/52)(47/51)
+        self.assertAlmostEqual(deck.probability_at_least(1, 2, name='ace'), 1 - (48 / 52) * (47 / 51))
+        self.assertAlmostEqual(deck.probability_at_least(0, 5, name='ace'), 1.0)
+        self.assertAlmostEqual(deck.probability_at_least(5, 5, name='ace'), 0.0)
+        self.assertAlmostEqual(deck.probability_at_least(13, 52, suit='clubs'), 1.0)
+        deck.pull_list(['hace', 'cace', 'dace', 'sace'])
+        self.assertEqual(deck.probability(name='ace'), 0.0)
+        with self.assertRaises(Exception):
+            deck.probability_at_least(1, 49, name='king')
+        deck.draw_many(48)
+        self.assertEqual(deck.probability(name='ace'), 0.0)
+
     def test_pull_list(self):
         """Testing pulling a list from the deck. Most common use case is pulling out a certain suit."""
         # create deck
@@ -211,6 +446,78 @@ class test_Deck(unittest.TestCase):
         # check that top card changed
         self.assertNotEqual(deck.top, old_top)
 
+    def test_pull_list_report(self):
+        """pull_list returns the pulled cards in deck order and the codes it did not find"""
+        deck = db.Deck(n_decks=2, rng=6)
+        deck.shuffle()
+        order = list(deck)
+        pulled, missing = deck.pull_list(['SACE', 'h2', 'x9', 'sace', 'sace', 'h2'])
+        self.assertEqual(pulled, [card for card in order if card in (('ace', 'spades'), ('2', 'hearts'))])
+        self.assertEqual(missing, ['x9', 'sace'])
+        self.assertEqual(len(deck), 100)
+        self.assertNotIn('sace', deck)
+        self.assertEqual(deck.count(code='h2'), 0)
+        self.assertEqual(list(deck), [card for card in order if card not in pulled])
+        # the order-sensitive hash and the positional index follow the removals
+        kept = hash(deck)
+        deck._hash = None
+        self.assertEqual(hash(deck), kept)
+        self.assertEqual(deck.find(str(deck.bottom)), list(deck).index(deck.bottom.get_data()))
+        self.assertEqual(deck.pull_list([]), ([], []))
+
+    def test_export(self):
+        """Bulk exports agree with iterating, and from_ids / extend read them back"""
+        deck = db.Deck(jokers=True, rng=9)
+        deck.shuffle()
+        deck.draw_many(4)
+        ids = deck.to_ids()
+        self.assertEqual(ids.typecode, 'H')
+        self.assertEqual([db.CARD_TABLE[each] for each in ids], list(deck))
+        self.assertEqual(deck.to_tuples(), list(deck))
+        self.assertEqual(db.Deck.from_ids(ids), deck)
+        # preallocated buffers are filled from the start and returned
+        out = [-1] * 52
+        self.assertIs(deck.to_ids(out), out)
+        self.assertEqual(out[:50], ids.tolist())
+        self.assertEqual(out[50:], [-1, -1])
+        self.assertEqual(deck.to_ids(array('i', [0] * 50)).tolist(), ids.tolist())
+        self.assertEqual(list(deck.to_ids(memoryview(bytearray(50)))), ids.tolist())
+        with self.assertRaises(ValueError):
+            deck.to_ids([0] * 49)
+
+        other = db.Deck.from_ids([])
+        other.extend(ids[:10])
+        other.extend(ids[10:])
+        self.assertEqual(other, deck)
+        self.assertEqual(other.count(code='h2'), deck.count(code='h2'))
+        self.assertEqual(other.find(str(deck.bottom)), deck.find(str(deck.bottom)))
+        with self.assertRaises(ValueError):
+            other.extend([len(db.IDENTITIES)])
+        with self.assertRaises(ValueError):
+            other.extend([-1])
+
+        if db.np is not None:
+            self.assertEqual(deck.to_numpy().tolist(), ids.tolist())
+            self.assertEqual(db.Deck.from_ids(deck.to_numpy()), deck)
+            row = db.np.zeros(54, dtype=db.np.uint16)
+            deck.to_numpy(row)
+            self.assertEqual(row[:50].tolist(), ids.tolist())
+
+    def test_pull_where(self):
+        """pull_where removes every card matching a suit, name or predicate in one pass"""
+        deck = db.Deck(jokers=True)
+        self.assertEqual(deck.pull_where(suit='hearts'), [(str(i), 'hearts') for i in range(2, 11)]
+                         + [('jack', 'hearts'), ('queen', 'hearts'), ('king', 'hearts'), ('ace', 'hearts')])
+        self.assertEqual(deck.pull_where(name='joker'), [('joker', 'red'), ('joker', 'black')])
+        self.assertEqual(deck.pull_where(lambda card: card[0] in ('2', '3'), suit='spades'),
+                         [('2', 'spades'), ('3', 'spades')])
+        self.assertEqual(deck.pull_where(name=10), [('10', 'clubs'), ('10', 'diamonds'), ('10', 'spades')])
+        self.assertEqual(len(deck), 34)
+        self.assertEqual(deck.pull_where(suit='hearts'), [])
+        self.assertEqual(deck.probability(suit='hearts'), 0.0)
+        self.assertEqual(deck.top.get_data(), ('2', 'clubs'))
+        self.assertIsNone(deck.top.get_prev())
+
     def test_cut(self):
         """Test using the cut function on the deck. Decks should be cut consistently, and attributes updated"""
 
@@ -300,6 +607,161 @@ class test_Deck(unittest.TestCase):
         # make sure drawn card is not Card class
         self.assertNotEqual(type(drawn_card), db.Card)
 
+    def test_draw_many(self):
+        """Drawing several cards, and drawing the deck down to empty"""
+        deck = db.Deck()
+        expected = list(deck)
+        self.assertEqual(deck.draw_many(5), expected[:5])
+        self.assertEqual(deck.draw_many(0), [])
+        self.assertEqual(len(deck), 47)
+        self.assertEqual(deck.top.get_prev(), None)
+        with self.assertRaises(Exception):
+            deck.draw_many(48)
+        with self.assertRaises(Exception):
+            deck.draw_many(-1)
+        # draw the rest one at a time, including the last card
+        for each in expected[5:]:
+            self.assertEqual(deck.draw(), each)
+        self.assertEqual(len(deck), 0)
+        self.assertEqual(deck.top, None)
+        self.assertEqual(deck.bottom, None)
+        with self.assertRaises(Exception):
+            deck.draw()
+        # an emptied deck can be refilled
+        deck.push('hearts', 2)
+        self.assertEqual(list(deck), [('2', 'hearts')])
+
+    def test_draw_random(self):
+        """Random draws remove uniformly picked cards and leave the rest in order"""
+        deck = db.Deck(rng=3)
+        before = list(deck)
+        drawn = deck.draw_random(5)
+        self.assertEqual(len(set(drawn)), 5)
+        self.assertEqual(list(deck), [card for card in before if card not in drawn])
+        self.assertEqual(len(deck), 47)
+        for name, suit in drawn:
+            self.assertEqual(deck.count(suit=suit, name=name), 0)
+        # the hash and positional index follow the moved cards
+        kept = hash(deck)
+        deck._hash = None
+        self.assertEqual(hash(deck), kept)
+        self.assertEqual(deck.find(str(deck.bottom)), 46)
+        # peeking leaves the deck alone
+        peeked = deck.peek_random(47)
+        self.assertEqual(sorted(peeked), sorted(deck))
+        self.assertEqual(len(deck), 47)
+        self.assertEqual(db.Deck(rng=3).draw_random(5), drawn)
+        self.assertEqual(deck.draw_random(0), [])
+        with self.assertRaises(Exception):
+            deck.draw_random(48)
+        with self.assertRaises(Exception):
+            deck.peek_random(-1)
+
+        # every card is about as likely to be drawn, pushing it back rebuilds the pool
+        counts = Counter()
+        deck = db.Deck(rng=4)
+        for _ in range(5200):
+            name, suit = deck.draw_random()[0]
+            counts[(name, suit)] += 1
+            deck.push(suit, name)
+        self.assertEqual(len(counts), 52)
+        self.assertTrue(60 < min(counts.values()) and max(counts.values()) < 140)
+
+    def test_lazy_shuffle(self):
+        """A lazily shuffled deck draws random cards from the top without relinking the rest"""
+        deck = db.Deck(rng=5)
+        deck.shuffle(lazy=True)
+        self.assertEqual(list(deck), list(db.Deck()))
+        hands = deck.deal(4, 3)
+        drawn = [card for hand in hands for card in hand] + [deck.draw()] + deck.draw_many(3)
+        drawn += [card for _, card in deck.iter_deal(2, 2)] + deck.draw_random(2)
+        self.assertEqual(len(set(drawn)), 22)
+        self.assertEqual(list(deck), [card for card in db.Deck() if card not in drawn])
+        self.assertNotEqual(drawn[:12], list(db.Deck())[:12])
+        # a normal shuffle ends the lazy mode
+        deck.shuffle('riffle')
+        self.assertFalse(deck._lazy)
+        with self.assertRaises(ValueError):
+            deck.shuffle('riffle', lazy=True)
+
+        # exports and forks shuffle for real first, never handing out the factory order
+        factory = db.Deck().to_ids()
+        for export in [lambda deck: deck.fork().to_ids(), lambda deck: deck.snapshot().to_ids(),
+                       lambda deck: deck.to_ids(), lambda deck: db.unpack_cards(deck.to_bytes()),
+                       lambda deck: [db.card_id(suit, name) for name, suit in deck.to_tuples()]]:
+            deck = db.Deck(rng=8)
+            deck.shuffle(lazy=True)
+            ids = list(export(deck))
+            self.assertNotEqual(ids[:3], list(factory[:3]))
+            self.assertEqual(sorted(ids), sorted(factory))
+            self.assertFalse(deck._lazy)
+            self.assertEqual(ids, list(deck.to_ids()))
+        deck = db.Deck(rng=8)
+        deck.shuffle(lazy=True)
+        self.assertNotEqual(deck.fork().draw_many(3), list(db.Deck())[:3])
+
+        # the first card drawn is uniform over the deck
+        counts = Counter()
+        for seed in range(2600):
+            deck = db.Deck(rng=seed)
+            deck.shuffle(lazy=True)
+            counts[deck.draw()] += 1
+        self.assertEqual(len(counts), 52)
+        self.assertTrue(20 < min(counts.values()) and max(counts.values()) < 80)
+
+        # a lazily reshuffled shoe still moves dealt cards onto the discard pile
+        shoe = db.Shoe(2, rng=6)
+        shoe.reshuffle(lazy=True)
+        shoe.deal(3, 5)
+        shoe.draw_random(3)
+        self.assertEqual((shoe.dealt, len(shoe)), (18, 86))
+        shoe.reshuffle(lazy=True)
+        self.assertEqual(len(shoe), 104)
+        self.assertEqual(sorted(shoe), sorted(db.Shoe(2)))
+
+    def test_deal_links(self):
+        """Dealing leaves the rest of the deck correctly linked, and can deal it all out"""
+        deck = db.Deck()
+        expected = list(deck)
+        hands = deck.deal(4, 3)
+        self.assertEqual(hands[1], [expected[1], expected[5], expected[9]])
+        self.assertEqual(deck.top.get_prev(), None)
+        self.assertEqual(deck.top.get_data(), expected[12])
+        self.assertEqual(list(deck), expected[12:])
+        # more cards than the deck holds in total
+        with self.assertRaises(Exception):
+            deck.deal(4, 11)
+        hands = deck.deal(4, 10)
+        self.assertEqual(len(deck), 0)
+        self.assertEqual(deck.bottom, None)
+        self.assertEqual(hands[3][-1], expected[-1])
+
+    def test_iter_deal(self):
+        """The dealing generator gives the same hands as deal, one card at a time"""
+        deck1 = db.Deck(rng=4)
+        deck2 = db.Deck(rng=4)
+        deck1.shuffle()
+        deck2.shuffle()
+        hands = deck1.deal(3, 4)
+        dealing = deck2.iter_deal(3, 4)
+        # nothing is taken until the generator is advanced
+        self.assertEqual(len(deck2), 52)
+        streamed = [[], [], []]
+        for player, card in dealing:
+            streamed[player].append(card)
+        self.assertEqual(streamed, hands)
+        self.assertEqual(deck1, deck2)
+
+        # without a card count the whole deck is dealt, the last round may be short
+        dealt = list(deck2.iter_deal(3))
+        self.assertEqual(len(dealt), 40)
+        self.assertEqual(dealt[-1][0], 0)
+        self.assertEqual(len(deck2), 0)
+
+        # bad input fails on the call
+        with self.assertRaises(Exception):
+            deck1.iter_deal(3, 20)
+
     def test_push_card(self):
         """Push function pushes a card into the deck. Push takes card name and suit, but not a card object"""
 
@@ -348,3 +810,229 @@ class test_Deck(unittest.TestCase):
             deck1.push(each[1], each[0])
         # check that the length of two decks match
         self.assertEqual(len(deck1), 104)
+
+    def test_hash(self):
+        """The incremental hash always equals a full recompute and follows the order"""
+        def recomputed(deck):
+            deck._hash = None
+            return hash(deck)
+
+        deck = db.Deck(rng=5)
+        self.assertEqual(hash(deck), hash(db.Deck()))
+        deck.shuffle()
+        self.assertNotEqual(hash(deck), hash(db.Deck()))
+        expected = hash(deck)
+        # each change keeps the hash equal to the hash of the new order
+        for change in [lambda: deck.draw(), lambda: deck.deal(3, 4), lambda: deck.pull(str(deck.top.next.next)),
+                       lambda: deck.pull(str(deck.bottom)), lambda: deck.pull(str(deck.top)),
+                       lambda: deck.push('hearts', '2'),
+                       lambda: deck.cut(), lambda: deck.draw_many(5), lambda: deck.pull_list(['h3', 'c4'])]:
+            change()
+            current = hash(deck)
+            self.assertNotEqual(current, expected)
+            self.assertEqual(current, recomputed(deck))
+            expected = current
+        # swapping two cards changes the hash, equal orders hash the same
+        a, b = db.Deck(), db.Deck()
+        a.pull('h2')
+        a.push('hearts', '2')
+        b.pull('h3')
+        b.push('hearts', '3')
+        self.assertNotEqual(hash(a), hash(b))
+        self.assertNotEqual(a, b)
+        b.pull('h2')
+        b.push('hearts', '2')
+        b.pull('h3')
+        b.push('hearts', '3')
+        c = db.Deck()
+        c.pull('h2')
+        c.pull('h3')
+        c.push('hearts', '2')
+        c.push('hearts', '3')
+        self.assertEqual(hash(b), hash(c))
+        self.assertEqual(b, c)
+        # every card counts at its position, so swapping cards between copies of a
+        # duplicate changes the hash too
+        ace, two, three = db.card_id('hearts', 'ace'), db.card_id('hearts', '2'), db.card_id('hearts', '3')
+        a = db.Deck.from_ids([ace, two, ace, three, ace])
+        b = db.Deck.from_ids([ace, three, ace, two, ace])
+        self.assertNotEqual(hash(a), hash(b))
+        a.cut()
+        b.draw()
+        self.assertEqual(hash(a), recomputed(a))
+        self.assertEqual(hash(b), recomputed(b))
+        # empty decks and shoes
+        self.assertEqual(hash(db.Deck.from_bytes(b'\x01')), hash(db.Deck.from_bytes(b'\x01')))
+        shoe = db.Shoe(2, rng=1)
+        shoe.draw_many(30)
+        self.assertEqual(hash(shoe), recomputed(shoe))
+
+    def test_copy(self):
+        """Copied and unpickled decks hold their own cards, indexed and counted like the original"""
+        deck = db.Deck(jokers=True, rng=6)
+        deck.shuffle()
+        deck.push('stars', 'copy')
+        deck.draw_many(3)
+        for clone in (copy.deepcopy(deck), pickle.loads(pickle.dumps(deck))):
+            self.assertEqual(clone, deck)
+            self.assertEqual(hash(clone), hash(deck))
+            self.assertIsNot(clone.top, deck.top)
+            self.assertIs(clone.top.identity, deck.top.identity)
+            self.assertIs(clone.top.deck, clone)
+            self.assertEqual(clone.count(suit='hearts'), deck.count(suit='hearts'))
+            self.assertEqual(clone.find('starscopy'), deck.find('starscopy'))
+            # the clone draws, pulls and shuffles on its own
+            self.assertEqual(clone.pull('starscopy'), ('copy', 'stars'))
+            self.assertEqual(clone.draw(), deck.top.get_data())
+            self.assertEqual(len(deck), 52)
+            self.assertIn('starscopy', deck)
+            clone.shuffle()
+        # a shallow copy is a copy of the deck too, not a second handle on its cards
+        clone = copy.copy(deck)
+        clone.draw()
+        self.assertEqual(len(deck), 52)
+
+
+class test_DeckSpec(unittest.TestCase):
+
+    def test_codes(self):
+        """Every card code is unique, suits other than the standard ones are spelled out"""
+        self.assertEqual(db.get_identity('spades', '1').code, 's1')
+        self.assertEqual(db.get_identity('stones', '1').code, 'stones1')
+        self.assertEqual(db.get_identity('stars', '1').code, 'stars1')
+        # only the jokers get one-letter colour codes, UNO colours are all spelled out
+        self.assertEqual(db.get_identity('red', 'joker').code, 'rjoker')
+        self.assertEqual(db.get_identity('black', 'joker').code, 'bjoker')
+        self.assertEqual([db.UNO.code(db.UNO.id((name, suit))) for name, suit in
+                          [('7', 'red'), ('7', 'yellow'), ('skip', 'blue'), ('wild', 'wild')]],
+                         ['red7', 'yellow7', 'blueskip', 'wildwild'])
+        # a code that would spell another card's code is refused, not renamed
+        with self.assertRaises(ValueError):
+            db.get_identity('star', 's1')
+        with self.assertRaises(ValueError):
+            db.Card('h', '2')
+        self.assertNotIn(('star', 's1'), db.CARD_IDS)
+        self.assertEqual(len(db.CODE_IDS), len(db.IDENTITIES))
+        for identity in db.IDENTITIES:
+            self.assertIs(db.IDENTITIES[db.code_id(identity.code)], identity)
+        self.assertIsNone(db.code_id('not a code'))
+        self.assertIsNone(db.code_id(5))
+
+    def test_specs(self):
+        """Predefined specs build decks of the right size, ids round trip through every table"""
+        for spec, size, distinct in ((db.STANDARD, 52, 52), (db.PINOCHLE, 48, 24), (db.EUCHRE, 24, 24),
+                                     (db.TAROT, 78, 78), (db.UNO, 108, 54)):
+            self.assertEqual((len(spec), len(spec.codes)), (size, distinct), spec.name)
+            for i, code in enumerate(spec.codes):
+                self.assertEqual(spec.id(code), i)
+                self.assertEqual(spec.id(spec.data(i)), i)
+                self.assertEqual(spec.table_ids[spec.card_ids[i]], i)
+                self.assertEqual(db.IDENTITIES[spec.card_ids[i]].code, spec.code(i))
+            self.assertIs(spec.prototype(2), spec.prototype(2))
+        self.assertEqual(db.STANDARD.codes, tuple(card.code for card in db.prototype(1, False, tuple(db.STANDARD.suits), tuple(db.STANDARD.ranks)).identities))
+        with self.assertRaises(ValueError):
+            db.EUCHRE.id('h2')
+        with self.assertRaises(ValueError):
+            db.UNO.id(['red0'])
+
+    def test_spec_decks(self):
+        """Decks and shoes built from a spec find, count and pull cards by code"""
+        deck = db.Deck(spec=db.UNO, rng=4)
+        self.assertEqual(len(deck), 108)
+        self.assertEqual(deck.count(code='red0'), 1)
+        self.assertEqual(deck.count(code=db.UNO.code(db.UNO.id(('draw four', 'wild')))), 4)
+        deck.shuffle()
+        self.assertEqual(deck.pull('red0'), ('0', 'red'))
+        self.assertNotIn('red0', deck)
+        self.assertEqual(deck.spec, db.UNO)
+        # build_deck adds another deck of the spec's cards
+        deck.build_deck()
+        self.assertEqual(deck.count(code='red0'), 1)
+        self.assertEqual(len(deck), 215)
+
+        tarot = db.Deck(spec=db.TAROT, jokers=True)
+        self.assertEqual(len(tarot), 80)
+        self.assertEqual(tarot.find('trumps21'), 77)
+        self.assertEqual(tarot.find('swordsking'), 41)
+        self.assertEqual(len(db.Shoe(2, spec=db.PINOCHLE)), 96)
+
+
+class test_Shoe(unittest.TestCase):
+
+    def test_build_shoe(self):
+        """A shoe holds every card of each deck, in deck order"""
+        shoe = db.Shoe(8)
+        self.assertEqual(len(shoe), 416)
+        self.assertEqual(list(shoe), list(db.Deck()) * 8)
+        self.assertEqual(len(db.Shoe(2, jokers=True)), 108)
+        self.assertEqual(shoe.find('h2'), 0)
+        self.assertEqual(shoe.cut_position, 312)
+        self.assertEqual(shoe, db.Shoe(8))
+        self.assertNotEqual(shoe, db.Shoe(6))
+
+    def test_cut_card_and_reshuffle(self):
+        """Dealing reaches the cut card, and reshuffling reuses every card object"""
+        shoe = db.Shoe(6, penetration=0.5, rng=12)
+        shoe.shuffle()
+        cards = set()
+        card = shoe.top
+        while card is not None:
+            cards.add(id(card))
+            card = card.get_next()
+
+        hands = 0
+        while not shoe.needs_reshuffle:
+            shoe.deal(7, 2)
+            shoe.draw()
+            hands += 1
+        self.assertEqual(hands, 11)
+        self.assertEqual(shoe.dealt, 165)
+        self.assertEqual(len(shoe), 312 - 165)
+
+        shoe.reshuffle()
+        self.assertFalse(shoe.needs_reshuffle)
+        self.assertEqual(len(shoe), 312)
+        self.assertEqual(sorted(shoe), sorted(db.Shoe(6)))
+        card = shoe.top
+        while card is not None:
+            self.assertIn(id(card), cards)
+            card = card.get_next()
+        self.assertEqual(shoe.find('sace'), list(shoe).index(('ace', 'spades')))
+
+    def test_pull_duplicates(self):
+        """Pulling from a shoe always takes the top-most copy, without rebuilding positions"""
+        shoe = db.Shoe(4, rng=13)
+        shoe.shuffle()
+        model = list(shoe)
+        rng = random.Random(14)
+        shoe.find('h2')
+        positions = shoe._positions
+        for i in range(150):
+            each = rng.choice(model)
+            code = db.Card(each[1], each[0]).__str__()
+            self.assertEqual(shoe.pull(code), each)
+            model.remove(each)
+            if i % 10 == 0:
+                shoe.push('hearts', 'ace')
+                model.append(('ace', 'hearts'))
+            if i % 25 == 0:
+                model.pop(0)
+                shoe.draw()
+        # every pull above found its copy from labels left with gaps
+        self.assertIs(shoe._positions, positions)
+        self.assertEqual(list(shoe), model)
+        self.assertEqual(shoe.find('hace'), model.index(('ace', 'hearts')))
+
+    def test_copy(self):
+        """A copied shoe keeps its discard pile and cut card"""
+        shoe = db.Shoe(2, rng=15)
+        shoe.shuffle()
+        dealt = shoe.draw_many(80)
+        for clone in (copy.deepcopy(shoe), pickle.loads(pickle.dumps(shoe))):
+            self.assertEqual(clone, shoe)
+            self.assertEqual((clone.dealt, clone.cut_position, clone.penetration), (80, 78, 0.75))
+            self.assertTrue(clone.needs_reshuffle)
+            clone.reshuffle()
+            self.assertEqual(len(clone), 104)
+            self.assertEqual(sorted(clone), sorted(list(shoe) + dealt))
+        self.assertEqual(len(shoe), 24)
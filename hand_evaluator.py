@@ -0,0 +1,218 @@
+"""
+Poker hand ranking with precomputed lookup tables
+
+Cards are the standard deck ids of the shared card table (0-51, id // 13 is the suit and
+id % 13 the rank from 2 up to ace), so the output of CompactDeck, Deck.to_bytes and
+DeckBatch.deal can be ranked without converting back to tuples.
+
+Every rank gets a prime, so the product of a hand's primes identifies its rank multiset
+exactly; one table maps those products to hand values. Flushes are looked up separately
+by the 13-bit mask of ranks held in a suit. Both tables cover 5, 6 and 7 card hands, so a
+7-card hand is ranked with one product and four mask lookups instead of 21 five-card
+evaluations. A larger value is a better hand.
+"""
+from functools import lru_cache
+from itertools import combinations, combinations_with_replacement
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, only evaluate_batch uses it
+    np = None
+
+from deck_builder import IDENTITIES
+
+# hand categories, weakest first, the category of a value is value >> 20
+CATEGORIES = ["high card", "pair", "two pair", "three of a kind", "straight", "flush",
+              "full house", "four of a kind", "straight flush"]
+
+PRIMES = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41]
+
+# per card id lookups for the standard deck
+_RANKS = [i % 13 for i in range(52)]
+_SUITS = [i // 13 for i in range(52)]
+_CARD_PRIMES = [PRIMES[rank] for rank in _RANKS]
+_CARD_BITS = [1 << rank for rank in _RANKS]
+# lowercase (name, suit) -> id, so tuples from any deck map to the standard ids
+_KEY_IDS = {IDENTITIES[i].key: i for i in range(52)}
+
+
+def _value(category, ranks):
+    """Packs a category and up to five tiebreak ranks, most important first, into one int"""
+    value = category
+    for i in range(5):
+        value = (value << 4) | (ranks[i] + 1 if i < len(ranks) else 0)
+    return value
+
+
+def _straight(mask):
+    """Rank of the highest card of the best straight in a rank mask, or -1"""
+    for high in range(12, 3, -1):
+        run = 0b11111 << (high - 4)
+        if mask & run == run:
+            return high
+    # the wheel, ace to five
+    if mask & 0b1000000001111 == 0b1000000001111:
+        return 3
+    return -1
+
+
+def _score(ranks):
+    """
+    Value of the best five-card hand from a rank multiset, ignoring flushes
+    :param ranks: ranks of 5 to 7 cards
+    :return: hand value
+    """
+
+    counts = {}
+    for rank in ranks:
+        counts[rank] = counts.get(rank, 0) + 1
+    # ranks by how often they appear, then highest first
+    groups = sorted(counts, key=lambda r: (counts[r], r), reverse=True)
+    present = sorted(counts, reverse=True)
+    first = counts[groups[0]]
+    second = counts[groups[1]]
+    if first == 4:
+        quad = groups[0]
+        return _value(7, [quad, next(r for r in present if r != quad)])
+    if first == 3 and second >= 2:
+        # with two sets of trips the lower one makes the pair
+        return _value(6, groups[:2])
+    high = _straight(sum(1 << r for r in present))
+    if high >= 0:
+        return _value(4, [high])
+    if first == 3:
+        return _value(3, [groups[0]] + [r for r in present if r != groups[0]][:2])
+    if second == 2:
+        pairs = groups[:2]
+        return _value(2, pairs + [r for r in present if r not in pairs][:1])
+    if first == 2:
+        return _value(1, [groups[0]] + [r for r in present if r != groups[0]][:3])
+    return _value(0, present[:5])
+
+
+def _flush_score(mask):
+    """Value of the best flush or straight flush among the ranks of one suit"""
+    high = _straight(mask)
+    if high >= 0:
+        return _value(8, [high])
+    return _value(5, [r for r in range(12, -1, -1) if mask >> r & 1][:5])
+
+
+@lru_cache(maxsize=1)
+def tables():
+    """
+    Builds the lookup tables on first use
+    :return: (dict of prime product -> value, list of rank mask -> flush value or 0)
+    """
+
+    products = {}
+    for n in (5, 6, 7):
+        for ranks in combinations_with_replacement(range(13), n):
+            # no rank appears more than four times
+            if any(ranks[i] == ranks[i + 4] for i in range(n - 4)):
+                continue
+            product = 1
+            for rank in ranks:
+                product *= PRIMES[rank]
+            products[product] = _score(ranks)
+    flushes = [0] * 8192
+    for n in (5, 6, 7):
+        for ranks in combinations(range(13), n):
+            mask = sum(1 << r for r in ranks)
+            flushes[mask] = _flush_score(mask)
+    return products, flushes
+
+
+def card_ids(hand):
+    """
+    Maps card data tuples to standard deck ids
+    :param hand: iterable of (name, suit) tuples, as returned by Deck.deal and Deck.draw
+    :return: list of card ids
+    """
+
+    try:
+        return [_KEY_IDS[(name.lower(), suit.lower())] for name, suit in hand]
+    except KeyError as error:
+        raise ValueError(f"Error: {error.args[0]} is not a standard playing card") from None
+
+
+def evaluate_ids(ids):
+    """
+    Ranks a hand of 5 to 7 card ids
+    :param ids: sequence of standard deck ids, no card repeated
+    :return: hand value, larger is better
+    """
+
+    if not 5 <= len(ids) <= 7:
+        raise ValueError("Error: hands must hold 5 to 7 cards")
+    if min(ids) < 0 or max(ids) > 51:
+        raise ValueError("Error: card ids must be standard deck ids 0-51")
+    if len(set(ids)) != len(ids):
+        raise ValueError("Error: a card is repeated in the hand")
+    products, flushes = tables()
+    product = 1
+    masks = [0, 0, 0, 0]
+    for each in ids:
+        product *= _CARD_PRIMES[each]
+        masks[_SUITS[each]] |= _CARD_BITS[each]
+    value = products[product]
+    for mask in masks:
+        # masks of fewer than five cards are 0 in the flush table
+        if flushes[mask] > value:
+            value = flushes[mask]
+    return value
+
+
+def evaluate(hand):
+    """
+    Ranks a hand of 5 to 7 cards
+    :param hand: iterable of (name, suit) tuples
+    :return: hand value, larger is better
+    """
+    return evaluate_ids(card_ids(hand))
+
+
+def category(value):
+    """Name of the category of a hand value (ex. 'full house')"""
+    return CATEGORIES[value >> 20]
+
+
+@lru_cache(maxsize=1)
+def _array_tables():
+    """Lookup tables as numpy arrays, products sorted for searchsorted"""
+    products, flushes = tables()
+    keys = np.array(sorted(products), dtype=np.int64)
+    values = np.array([products[key] for key in keys.tolist()], dtype=np.int32)
+    # card id i is bit i of a 52-bit mask, so each suit's ranks are 13 consecutive bits
+    return (keys, values, np.array(flushes, dtype=np.int32),
+            np.array(_CARD_PRIMES, dtype=np.int64), np.left_shift(1, np.arange(52, dtype=np.int64)))
+
+
+def evaluate_batch(ids):
+    """
+    Ranks many hands at once with numpy
+    :param ids: integer array of card ids whose last axis holds 5 to 7 cards from one deck,
+        for example the (decks, players, cards) output of DeckBatch.deal
+    :return: int32 array of hand values with the last axis removed
+    """
+
+    if np is None:
+        raise ImportError("Error: evaluate_batch requires numpy")
+    ids = np.asarray(ids)
+    if ids.dtype.kind not in 'iu':
+        raise TypeError("Card ids must be integers")
+    if not 5 <= ids.shape[-1] <= 7:
+        raise ValueError("Error: hands must hold 5 to 7 cards")
+    if ids.size and (ids.min() < 0 or ids.max() > 51):
+        raise ValueError("Error: card ids must be standard deck ids 0-51")
+    if ids.size and (np.diff(np.sort(ids, axis=-1), axis=-1) == 0).any():
+        raise ValueError("Error: a card is repeated in the hand")
+    keys, values, flushes, primes, bits = _array_tables()
+    # product of 7 primes is at most 41**4 * 37**3, well inside int64
+    values = values[np.searchsorted(keys, primes[ids].prod(axis=-1))]
+    # the cards of a hand are distinct, so summing their bits gives the hand's mask
+    hand_bits = bits[ids].sum(axis=-1)
+    for suit in range(4):
+        mask = (hand_bits >> (13 * suit)) & 0x1FFF
+        np.maximum(values, flushes[mask], out=values)
+    return values
@@ -0,0 +1,106 @@
+from collections import Counter
+from itertools import combinations
+import random
+import unittest
+import hand_evaluator as he
+from deck_batch import DeckBatch, np
+from deck_builder import Deck
+
+
+def hand(*codes):
+    """Builds a hand from short names like 'ah' (ace of hearts) or '10s'"""
+    names = {'a': 'ace', 'k': 'king', 'q': 'queen', 'j': 'jack'}
+    suits = {'h': 'hearts', 'c': 'clubs', 'd': 'diamonds', 's': 'spades'}
+    return [(names.get(code[:-1], code[:-1]), suits[code[-1]]) for code in codes]
+
+
+class test_Evaluator(unittest.TestCase):
+
+    def test_categories(self):
+        """Each kind of hand gets its category"""
+        cases = {
+            'straight flush': hand('9h', '10h', 'jh', 'qh', 'kh'),
+            'four of a kind': hand('9h', '9c', '9d', '9s', 'kh'),
+            'full house': hand('9h', '9c', '9d', 'ks', 'kh'),
+            'flush': hand('2h', '10h', 'jh', 'qh', 'kh'),
+            'straight': hand('ah', '2c', '3d', '4s', '5h'),
+            'three of a kind': hand('9h', '9c', '9d', '2s', 'kh'),
+            'two pair': hand('9h', '9c', '2d', '2s', 'kh'),
+            'pair': hand('9h', '9c', '3d', '2s', 'kh'),
+            'high card': hand('9h', '7c', '3d', '2s', 'kh'),
+        }
+        for name, cards in cases.items():
+            self.assertEqual(he.category(he.evaluate(cards)), name)
+
+    def test_ordering(self):
+        """Hands compare by category, then by ranks, and the wheel is the lowest straight"""
+        wheel = he.evaluate(hand('ah', '2c', '3d', '4s', '5h'))
+        six_high = he.evaluate(hand('6h', '2c', '3d', '4s', '5h'))
+        self.assertLess(wheel, six_high)
+        self.assertLess(he.evaluate(hand('9h', '9c', '3d', '2s', 'kh')),
+                        he.evaluate(hand('9h', '9c', '3d', '2s', 'ah')))
+        self.assertEqual(he.evaluate(hand('9h', '9c', '3d', '2s', 'kh')),
+                         he.evaluate(hand('9d', '9s', '3h', '2c', 'kc')))
+        self.assertLess(he.evaluate(hand('ah', 'kh', 'qh', 'jh', '9h')),
+                        he.evaluate(hand('2h', '2c', '2d', '3s', '3h')))
+
+    def test_five_card_classes(self):
+        """Five-card hands fall into at most 7462 classes, one suit holds 10 straight flushes and 1277 flushes"""
+        values = set()
+        for cards in combinations(range(0, 52, 2), 5):
+            values.add(he.evaluate_ids(cards))
+        self.assertLessEqual(len(values), 7462)
+        flushes = Counter(he.category(he.evaluate_ids(cards))
+                          for cards in combinations(range(13), 5))
+        self.assertEqual(flushes['straight flush'], 10)
+        self.assertEqual(flushes['flush'], 1277)
+
+    def test_seven_cards(self):
+        """A 7-card hand is worth its best five cards"""
+        rng = random.Random(1)
+        for _ in range(300):
+            cards = rng.sample(range(52), 7)
+            best = max(he.evaluate_ids(five) for five in combinations(cards, 5))
+            self.assertEqual(he.evaluate_ids(cards), best)
+            self.assertEqual(he.evaluate_ids(cards[:6]),
+                             max(he.evaluate_ids(five) for five in combinations(cards[:6], 5)))
+
+    def test_deal_output(self):
+        """Hands from Deck.deal can be ranked directly, other cards are rejected"""
+        deck = Deck(rng=4)
+        deck.shuffle()
+        for cards in deck.deal(4, 7):
+            self.assertEqual(he.evaluate(cards), he.evaluate_ids(he.card_ids(cards)))
+        with self.assertRaises(ValueError):
+            he.evaluate(hand('9h', '9c', '3d', '2s') + [('joker', 'red')])
+        with self.assertRaises(ValueError):
+            he.evaluate(hand('9h', '9c', '3d', '2s'))
+        # a repeated card is rejected rather than ranked as a different hand
+        with self.assertRaises(ValueError):
+            he.evaluate(hand('2h', '5h', '9h', 'kh', '2h'))
+        with self.assertRaises(ValueError):
+            he.evaluate_ids([0, 1, 2, 3, 3, 4])
+        with self.assertRaises(ValueError):
+            he.evaluate_ids([0, 1, 2, 3, 52])
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_batch(self):
+        """Batched values match one hand at a time, for DeckBatch deal output"""
+        batch = DeckBatch(500, rng=2)
+        batch.shuffle()
+        hands = batch.deal(3, 7)
+        values = he.evaluate_batch(hands)
+        self.assertEqual(values.shape, (500, 3))
+        for i in range(0, 500, 7):
+            for j in range(3):
+                self.assertEqual(values[i, j], he.evaluate_ids(hands[i, j].tolist()))
+        with self.assertRaises(ValueError):
+            he.evaluate_batch(np.array([[52, 1, 2, 3, 4]]))
+        with self.assertRaises(ValueError):
+            he.evaluate_batch(np.array([[0, 1, 2, 3, 4], [5, 6, 7, 5, 8]]))
+        with self.assertRaises(TypeError):
+            he.evaluate_batch(np.zeros((2, 5)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,441 @@
+import random
+
+import shuffles
+from deck_builder import card_filter, code_id, get_identity, IDENTITIES, make_rng, requested_ids, unmatched_codes
+
+# priorities only keep the tree balanced, so they come from their own generator and
+# never disturb a deck's seeded shuffles
+_priorities = random.Random()
+
+
+class _Node:
+    """Tree node holding one card, ordered by position (implicit treap)"""
+
+    __slots__ = ('identity', 'priority', 'size', 'left', 'right', 'parent')
+
+    def __init__(self, identity):
+        self.identity = identity
+        self.priority = _priorities.random()
+        self.size = 1
+        self.left = self.right = self.parent = None
+
+
+def _update(node):
+    """Recomputes a node's subtree size and points its children back at it"""
+    size = 1
+    if node.left is not None:
+        size += node.left.size
+        node.left.parent = node
+    if node.right is not None:
+        size += node.right.size
+        node.right.parent = node
+    node.size = size
+
+
+def _split(node, k):
+    """
+    Splits a tree into its first k cards and the rest
+    :return: (left tree, right tree)
+    """
+
+    if node is None:
+        return None, None
+    left_size = node.left.size if node.left is not None else 0
+    if k <= left_size:
+        left, node.left = _split(node.left, k)
+        _update(node)
+        return left, node
+    node.right, right = _split(node.right, k - left_size - 1)
+    _update(node)
+    return node, right
+
+
+def _merge(left, right):
+    """
+    Joins two trees, every card of left coming before every card of right
+    :return: merged tree
+    """
+
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+
+def _build(nodes):
+    """
+    Builds a tree holding nodes in the given order in one pass (Cartesian tree)
+    :return: root of the tree
+    """
+
+    stack = []
+    for node in nodes:
+        node.parent = None
+        node.right = None
+        last = None
+        while stack and stack[-1].priority < node.priority:
+            last = stack.pop()
+        node.left = last
+        if stack:
+            stack[-1].right = node
+        stack.append(node)
+    if not stack:
+        return None
+    # subtree sizes bottom up: list the tree breadth first, then update it in reverse so
+    # every child is sized before its parent, in O(n)
+    root = stack[0]
+    order = [root]
+    for node in order:
+        if node.left is not None:
+            order.append(node.left)
+        if node.right is not None:
+            order.append(node.right)
+    for node in reversed(order):
+        _update(node)
+    return root
+
+
+def _in_order(node):
+    """Yields the nodes of a tree from top of the deck to bottom"""
+    stack = []
+    while stack or node is not None:
+        while node is not None:
+            stack.append(node)
+            node = node.left
+        node = stack.pop()
+        yield node
+        node = node.right
+
+
+def _rank(node):
+    """Position of a node in its tree, found by walking up to the root"""
+    rank = node.left.size if node.left is not None else 0
+    while node.parent is not None:
+        if node is node.parent.right:
+            rank += 1 + (node.parent.left.size if node.parent.left is not None else 0)
+        node = node.parent
+    return rank
+
+
+class PositionalDeck:
+    """
+    Deck backed by a balanced tree ordered by position, so reading, inserting and removing
+    at any index, cutting at any point and locating a card all take O(log n). Offers the
+    same methods as deck_builder.Deck plus list-style positional access.
+    """
+
+    def __init__(self, jokers=False, rng=None):
+        # using jokers?
+        self.jokers = jokers
+        # random number generator, an int seeds a private one for reproducible runs
+        self.rng = make_rng(rng)
+        # index from card id to the nodes holding it, keyed by id()
+        self._index = {}
+        count = 54 if jokers is True else 52
+        nodes = [_Node(IDENTITIES[i]) for i in range(count)]
+        for node in nodes:
+            self._add(node)
+        self._root = _build(nodes)
+
+    def __str__(self):
+        """Returns list with string representation of each card in deck"""
+        return " -> ".join([str(x) for x in self])
+
+    def __len__(self):
+        """Return length of deck"""
+        return self._root.size if self._root is not None else 0
+
+    def __iter__(self):
+        """Returns n-tuples containing name and suit of each card in deck of length n"""
+        for node in _in_order(self._root):
+            yield node.identity.data
+
+    def __contains__(self, target):
+        """Checks if a card code (ex. 'h2') is in the deck"""
+        return code_id(target) in self._index
+
+    def __eq__(self, other):
+        """Two decks are equal if they contain the same exact cards in the same order"""
+        if type(other) is PositionalDeck and len(self) == len(other):
+            return all(a.identity is b.identity for a, b in zip(_in_order(self._root), _in_order(other._root)))
+        return False
+
+    def __getitem__(self, i: int):
+        """
+        Reads the card at a position without removing it
+        :param i: index from the top, negative indexes count from the bottom
+        :return: card data tuple (name, suit)
+        """
+
+        return self._node_at(self._check_index(i)).identity.data
+
+    def _check_index(self, i):
+        """Normalizes a negative index, raising IndexError if it is out of range"""
+        size = len(self)
+        if i < 0:
+            i += size
+        if not 0 <= i < size:
+            raise IndexError("Error: deck index out of range")
+        return i
+
+    def _node_at(self, i):
+        """Descends to the node at a valid position"""
+        node = self._root
+        while True:
+            left_size = node.left.size if node.left is not None else 0
+            if i < left_size:
+                node = node.left
+            elif i == left_size:
+                return node
+            else:
+                i -= left_size + 1
+                node = node.right
+
+    def _add(self, node):
+        """Adds a node to the code index"""
+        self._index.setdefault(node.identity.id, {})[id(node)] = node
+
+    def _remove(self, node):
+        """Removes a node leaving the deck from the code index"""
+        key = node.identity.id
+        nodes = self._index[key]
+        del nodes[id(node)]
+        if not nodes:
+            del self._index[key]
+
+    def _take(self, k):
+        """Splits the top k cards off the deck, returning their nodes top first"""
+        taken, self._root = _split(self._root, k)
+        if self._root is not None:
+            self._root.parent = None
+        nodes = list(_in_order(taken))
+        for node in nodes:
+            self._remove(node)
+        return nodes
+
+    def index(self, target):
+        """
+        Position of the first instance of a card
+        :param target: card code (ex. 'h2')
+        :return: index from the top
+        """
+
+        nodes = self._index.get(code_id(target))
+        if not nodes:
+            raise ValueError("Target card is not in this deck")
+        return min(_rank(node) for node in nodes.values())
+
+    def find(self, target):
+        """
+        Finds a specific card in the deck, returns location of first instance (index)
+        :param target: card code you are finding (ex. 'h2')
+        :return: location as an index of first instance of card in deck
+        """
+
+        try:
+            return self.index(target)
+        except ValueError as error:
+            return str(error)
+
+    def insert(self, i: int, suit: str, name: str):
+        """
+        Creates a card and places it at a position, cards from there down move down one
+        :param i: index the new card will have, len(deck) places it at the bottom
+        :param suit: string of the suit
+        :param name: string of the name
+        :return: no return, modifies the deck
+        """
+
+        size = len(self)
+        if i < 0:
+            i = max(0, i + size)
+        node = _Node(get_identity(suit, name))
+        self._add(node)
+        left, right = _split(self._root, min(i, size))
+        self._root = _merge(_merge(left, node), right)
+        self._root.parent = None
+
+    def pop(self, i=0):
+        """
+        Removes the card at a position
+        :param i: index from the top, negative indexes count from the bottom
+        :return: card data tuple (name, suit)
+        """
+
+        i = self._check_index(i)
+        left, right = _split(self._root, i)
+        node, right = _split(right, 1)
+        self._root = _merge(left, right)
+        if self._root is not None:
+            self._root.parent = None
+        self._remove(node)
+        node.parent = None
+        return node.identity.data
+
+    def shuffle(self, method="uniform", times=1):
+        """
+        Shuffles cards to create a random distribution for game use
+        :param method: name of a strategy in shuffles.STRATEGIES or a callable taking (cards, rng)
+        :param times: number of times to apply the strategy
+        :return: None, the tree is rebuilt in the new order
+        """
+
+        strategy = shuffles.get_strategy(method)
+        order = list(_in_order(self._root))
+        for _ in range(times):
+            order = strategy(order, self.rng)
+        self._root = _build(order)
+
+    def pull(self, target):
+        """
+        Removes the first instance of a card from the deck
+        :param target: card code (ex. 'h2') that is to be pulled out of the deck
+        :return: card data tuple (name, suit), or a message if the card is not in the deck
+        """
+
+        index = self.find(target)
+        if type(index) is not int:
+            return index
+        return self.pop(index)
+
+    def pull_list(self, cards: list):
+        """
+        Pulls / removes a list of cards from the deck in one pass, see Deck.pull_list
+        :parameter cards: a list of strings
+        :return: (list of pulled card data tuples in deck order, list of codes not found)
+        """
+
+        left = requested_ids(cards)
+
+        def match(identity):
+            count = left.get(identity.id)
+            if count:
+                left[identity.id] = count - 1
+                return True
+            return False
+        return self._pull_matching(match), unmatched_codes(cards, left)
+
+    def pull_where(self, fn=None, suit=None, name=None):
+        """
+        Pulls / removes every card matching a filter in one pass, see Deck.pull_where
+        :return: list of pulled card data tuples in deck order
+        """
+
+        return self._pull_matching(card_filter(fn, suit, name))
+
+    def _pull_matching(self, match):
+        """Walks the tree in order once and rebuilds it from the cards that do not match"""
+        kept = []
+        pulled = []
+        for node in _in_order(self._root):
+            if match(node.identity):
+                self._remove(node)
+                pulled.append(node.identity.data)
+            else:
+                kept.append(node)
+        self._root = _build(kept)
+        return pulled
+
+    def cut(self, at=None):
+        """
+        Cuts the deck, moving the cards above the cut point to the bottom
+        :param at: index of the new top card, defaults to half the deck
+        :return: updates the deck
+        """
+
+        if at is None:
+            at = len(self) // 2
+        left, right = _split(self._root, at)
+        self._root = _merge(right, left)
+        if self._root is not None:
+            self._root.parent = None
+
+    def deal(self, players: int, cards: int):
+        """
+        Deals cards round-robin from the top of the deck, same order as Deck.deal
+        :param players: number of players to deal to
+        :param cards: number of cards to deal to each player
+        :return: nested list containing all hands dealt
+        """
+
+        # check if card number input is valid
+        if cards > len(self) or players * cards > len(self):
+            raise Exception("Error: number of cards entered larger than deck")
+        # return empty hand if n_cards is 0, error if less than 0
+        elif cards == 0:
+            return []
+        elif cards < 0:
+            raise Exception("Error: number of cards entered less than 0")
+
+        taken = self._take(players * cards)
+        return [[node.identity.data for node in taken[j::players]] for j in range(players)]
+
+    def draw(self):
+        """
+        Draws the top card from the deck
+        :return: card data from the top card
+        """
+
+        # check if deck is empty
+        if len(self) == 0:
+            raise Exception("Deck is empty")
+        return self.pop(0)
+
+    def draw_many(self, k: int):
+        """
+        Draws the top k cards from the deck
+        :param k: number of cards to draw
+        :return: list of card data tuples, top card first
+        """
+
+        # check if card number input is valid
+        if k > len(self):
+            raise Exception("Error: number of cards entered larger than deck")
+        elif k < 0:
+            raise Exception("Error: number of cards entered less than 0")
+        return [node.identity.data for node in self._take(k)]
+
+    def draw_random(self, k=1):
+        """
+        Draws k cards picked uniformly at random, O(log n) each, see Deck.draw_random
+        :param k: number of cards to draw
+        :return: list of card data tuples, in the order drawn
+        """
+
+        # check if card number input is valid
+        if k > len(self):
+            raise Exception("Error: number of cards entered larger than deck")
+        elif k < 0:
+            raise Exception("Error: number of cards entered less than 0")
+        randrange = self.rng.randrange
+        return [self.pop(randrange(len(self))) for _ in range(k)]
+
+    def peek_random(self, k=1):
+        """
+        Looks at k cards picked uniformly at random, leaving the deck as it is
+        :param k: number of cards to look at
+        :return: list of card data tuples
+        """
+
+        # check if card number input is valid
+        if k > len(self):
+            raise Exception("Error: number of cards entered larger than deck")
+        elif k < 0:
+            raise Exception("Error: number of cards entered less than 0")
+        return [self[i] for i in self.rng.sample(range(len(self)), k)]
+
+    def push(self, suit: str, name: str):
+        """
+        Creates and appends a new card to the bottom of the deck
+        :param suit: string of the suit
+        :param name: string of the name
+        :return: no return, modifies the deck
+        """
+        self.insert(len(self), suit, name)
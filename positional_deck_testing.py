@@ -0,0 +1,92 @@
+import deck_builder as db
+import positional_deck as pd
+import random
+import unittest
+
+
+class test_PositionalDeck(unittest.TestCase):
+
+    def test_same_outputs_as_deck(self):
+        """Shared methods give the same results as Deck"""
+        deck = db.Deck(jokers=True, rng=2)
+        positional = pd.PositionalDeck(jokers=True, rng=2)
+        self.assertEqual(list(deck), list(positional))
+        for each in (deck, positional):
+            each.shuffle('riffle', times=3)
+            each.cut()
+        self.assertEqual(list(deck), list(positional))
+        self.assertEqual(deck.deal(3, 4), positional.deal(3, 4))
+        self.assertEqual(deck.draw(), positional.draw())
+        self.assertEqual(deck.draw_many(4), positional.draw_many(4))
+        self.assertEqual(deck.find('hace'), positional.find('hace'))
+        self.assertEqual(deck.pull('hace'), positional.pull('hace'))
+        self.assertEqual(deck.pull('hace'), positional.pull('hace'))
+        self.assertEqual(deck.pull_list(['S2', 'd3', 'x11', 'd3']), positional.pull_list(['S2', 'd3', 'x11', 'd3']))
+        self.assertEqual(deck.pull_where(name='king'), positional.pull_where(name='king'))
+        self.assertEqual(list(deck), list(positional))
+        drawn = positional.draw_random(4)
+        self.assertEqual(sorted(list(positional) + drawn), sorted(deck))
+        self.assertEqual(sorted(positional.peek_random(len(positional))), sorted(positional))
+        # put the drawn cards back at the bottom of both decks
+        for name, suit in drawn:
+            deck.pull(str(db.Card(suit, name)))
+            deck.push(suit, name)
+            positional.push(suit, name)
+        self.assertEqual(list(deck), list(positional))
+        deck.push('hearts', 55)
+        positional.push('hearts', 55)
+        self.assertEqual(deck.find('h55'), positional.find('h55'))
+        self.assertEqual(str(deck), str(positional))
+
+    def test_positional(self):
+        """Indexing, insert, pop, cut and index agree with a plain list"""
+        rng = random.Random(8)
+        positional = pd.PositionalDeck()
+        model = list(positional)
+        for _ in range(2000):
+            op = rng.randrange(5)
+            if op == 0:
+                i = rng.randrange(len(model) + 1)
+                suit, name = rng.choice([('hearts', '2'), ('stars', '7'), ('clubs', 'ace')])
+                positional.insert(i, suit, name)
+                model.insert(i, (name, suit))
+            elif op == 1 and model:
+                i = rng.randrange(-len(model), len(model))
+                self.assertEqual(positional.pop(i), model.pop(i))
+            elif op == 2 and model:
+                at = rng.randrange(len(model))
+                positional.cut(at=at)
+                model = model[at:] + model[:at]
+            elif op == 3 and model:
+                i = rng.randrange(len(model))
+                self.assertEqual(positional[i], model[i])
+                code = db.Card(model[i][1], model[i][0]).__str__()
+                self.assertEqual(positional.index(code), model.index(model[i]))
+            elif op == 4:
+                self.assertEqual(len(positional), len(model))
+        self.assertEqual(list(positional), model)
+
+    def test_build(self):
+        """A tree built in one pass holds the nodes in order, with every subtree sized"""
+        nodes = [pd._Node(db.get_identity('hearts', str(i))) for i in range(500)]
+        root = pd._build(nodes)
+        self.assertEqual(root.size, 500)
+        self.assertEqual(list(pd._in_order(root)), nodes)
+        for i, node in enumerate(nodes):
+            self.assertEqual(pd._rank(node), i)
+        self.assertIsNone(pd._build([]))
+
+    def test_errors(self):
+        """Out of range positions and missing cards are rejected"""
+        positional = pd.PositionalDeck()
+        with self.assertRaises(IndexError):
+            positional[52]
+        with self.assertRaises(IndexError):
+            positional.pop(-53)
+        with self.assertRaises(ValueError):
+            positional.index('h22')
+        self.assertEqual(positional.find('h22'), "Target card is not in this deck")
+        self.assertEqual(positional.pull('h22'), "Target card is not in this deck")
+        positional.draw_many(52)
+        with self.assertRaises(Exception):
+            positional.draw()
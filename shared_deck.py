@@ -0,0 +1,172 @@
+"""
+Thread-safe access to one deck from many worker threads
+
+Deck methods change top, bottom, size and the card index across several statements, so two
+threads drawing from the same deck can break its links. SharedDeck wraps any deck (Deck,
+Shoe, CompactDeck, PositionalDeck) and runs each operation under one lock. Workers that
+draw often should call reserve(k), which takes the next k cards in a single locked splice
+and leaves the worker to use them without touching the lock again.
+"""
+import threading
+
+
+class SharedDeck:
+    """Deck wrapper whose operations are safe to call from several threads at once"""
+
+    def __init__(self, deck):
+        """
+        :param deck: deck to share, it should only be used through this wrapper afterwards
+        """
+
+        self.deck = deck
+        # reentrant, so a subclass or a reshuffle can call other locked methods
+        self._lock = threading.RLock()
+
+    def __str__(self):
+        """Returns list with string representation of each card in deck"""
+        with self._lock:
+            return str(self.deck)
+
+    def __len__(self):
+        """Return length of deck"""
+        with self._lock:
+            return len(self.deck)
+
+    def __iter__(self):
+        """Iterates over a copy of the cards taken under the lock, so other threads can keep drawing"""
+        with self._lock:
+            cards = list(self.deck)
+        return iter(cards)
+
+    def __contains__(self, target):
+        """Checks if a card code (ex. 'h2') is in the deck"""
+        with self._lock:
+            return target in self.deck
+
+    def __enter__(self):
+        """Holds the lock for a sequence of operations that must not interleave with other threads"""
+        self._lock.acquire()
+        return self.deck
+
+    def __exit__(self, *exc):
+        self._lock.release()
+
+    def reserve(self, k: int):
+        """
+        Takes up to k cards off the top in one locked splice, fewer once the deck runs low
+        :param k: most cards to take
+        :return: list of card data tuples, top card first, empty when the deck is empty
+        """
+
+        if k < 0:
+            raise Exception("Error: number of cards entered less than 0")
+        with self._lock:
+            return self.deck.draw_many(min(k, len(self.deck)))
+
+    def draw(self):
+        """
+        Draws the top card from the deck
+        :return: card data from the top card
+        """
+
+        with self._lock:
+            return self.deck.draw()
+
+    def draw_many(self, k: int):
+        """
+        Draws the top k cards from the deck
+        :param k: number of cards to draw
+        :return: list of card data tuples, top card first
+        """
+
+        with self._lock:
+            return self.deck.draw_many(k)
+
+    def draw_random(self, k=1):
+        """Draws k cards picked uniformly at random, see Deck.draw_random"""
+        with self._lock:
+            return self.deck.draw_random(k)
+
+    def peek_random(self, k=1):
+        """Looks at k cards picked uniformly at random, see Deck.peek_random"""
+        with self._lock:
+            return self.deck.peek_random(k)
+
+    def deal(self, players: int, cards: int):
+        """
+        Deals cards round-robin from the top of the deck, see Deck.deal
+        :return: nested list containing all hands dealt
+        """
+
+        with self._lock:
+            return self.deck.deal(players, cards)
+
+    def iter_deal(self, players: int, cards=None):
+        """
+        Deals round-robin one card at a time, each card drawn under the lock
+        :param players: number of players to deal to
+        :param cards: number of cards to deal to each player, or None to deal out the deck
+        :return: generator of (player index, card data) pairs
+        """
+
+        with self._lock:
+            if cards is not None:
+                # check if card number input is valid, before anything is dealt
+                if cards > len(self.deck) or players * cards > len(self.deck):
+                    raise Exception("Error: number of cards entered larger than deck")
+                elif cards < 0:
+                    raise Exception("Error: number of cards entered less than 0")
+                total = players * cards
+            else:
+                total = len(self.deck)
+        return self._iter_deal(players, total)
+
+    def _iter_deal(self, players, total):
+        """Generator behind iter_deal, stops early if other threads empty the deck"""
+        for i in range(total):
+            cards = self.reserve(1)
+            if not cards:
+                return
+            yield i % players, cards[0]
+
+    def find(self, target):
+        """Finds the first instance of a card, see Deck.find"""
+        with self._lock:
+            return self.deck.find(target)
+
+    def pull(self, target):
+        """Removes the first instance of a card, see Deck.pull"""
+        with self._lock:
+            return self.deck.pull(target)
+
+    def pull_list(self, cards: list):
+        """Pulls a list of cards from the deck as one operation, see Deck.pull_list"""
+        with self._lock:
+            return self.deck.pull_list(cards)
+
+    def pull_where(self, fn=None, suit=None, name=None):
+        """Pulls every card matching a filter as one operation, see Deck.pull_where"""
+        with self._lock:
+            return self.deck.pull_where(fn, suit, name)
+
+    def push(self, suit: str, name: str):
+        """Appends a new card to the bottom of the deck, see Deck.push"""
+        with self._lock:
+            return self.deck.push(suit, name)
+
+    def cut(self, *args):
+        """Cuts the deck, see Deck.cut"""
+        with self._lock:
+            return self.deck.cut(*args)
+
+    def shuffle(self, method="uniform", times=1, lazy=False):
+        """Shuffles the deck, see Deck.shuffle, lazy needs a Deck or Shoe"""
+        with self._lock:
+            if lazy:
+                return self.deck.shuffle(method, times, lazy)
+            return self.deck.shuffle(method, times)
+
+    def reshuffle(self, method="uniform", times=1, lazy=False):
+        """Collects the discard pile of a shared Shoe and shuffles, see Shoe.reshuffle"""
+        with self._lock:
+            return self.deck.reshuffle(method, times, lazy)
@@ -0,0 +1,107 @@
+from collections import Counter
+import sys
+import threading
+import unittest
+from deck_builder import Deck, Shoe
+from shared_deck import SharedDeck
+
+
+def run_workers(shared, workers, take):
+    """Empties a shared deck from several threads, returning every card each thread got"""
+    results = [[] for _ in range(workers)]
+    start = threading.Barrier(workers)
+
+    def work(i):
+        start.wait()
+        while True:
+            cards = take()
+            if not cards:
+                return
+            results[i].extend(cards)
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class test_SharedDeck(unittest.TestCase):
+
+    def setUp(self):
+        # switch threads as often as possible to provoke interleaving
+        self.interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+
+    def tearDown(self):
+        sys.setswitchinterval(self.interval)
+
+    def test_concurrent_draws(self):
+        """Every card of a shared shoe is drawn exactly once across threads"""
+        shoe = Shoe(8, rng=1)
+        expected = Counter(shoe)
+        shared = SharedDeck(shoe)
+
+        def take():
+            try:
+                return [shared.draw()]
+            except Exception:
+                return []
+
+        results = run_workers(shared, 8, take)
+        self.assertEqual(Counter(card for cards in results for card in cards), expected)
+        self.assertEqual(len(shared), 0)
+        self.assertIsNone(shoe.top)
+        self.assertIsNone(shoe.bottom)
+        self.assertEqual(shoe.dealt, 416)
+
+    def test_reserve(self):
+        """Batched reservations split the deck without losing or repeating cards"""
+        shoe = Shoe(8, rng=2)
+        order = list(shoe)
+        shared = SharedDeck(shoe)
+        results = run_workers(shared, 4, lambda: shared.reserve(10))
+        self.assertEqual(sorted(card for cards in results for card in cards), sorted(order))
+        self.assertEqual(shared.reserve(5), [])
+        # every batch is a contiguous run of the shoe, in order
+        joined = '|'.join(map(str, order))
+        for cards in results:
+            for batch in range(0, len(cards), 10):
+                self.assertIn('|'.join(map(str, cards[batch:batch + 10])), joined)
+
+    def test_mixed(self):
+        """Pushes, pulls and draws from different threads keep the deck consistent"""
+        shared = SharedDeck(Deck())
+        # count once up front, so every change below updates the live counts
+        with shared as deck:
+            self.assertEqual(deck.count(suit='hearts'), 13)
+
+        def work():
+            for _ in range(200):
+                shared.push('hearts', '2')
+                shared.pull('h2')
+                shared.push('spades', 'ace')
+                shared.draw()
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with shared as deck:
+            self.assertEqual(deck.size, 52)
+            self.assertEqual(len(list(deck)), 52)
+            self.assertEqual(sum(deck._card_counts.values()), 52)
+
+    def test_iter_deal(self):
+        """iter_deal through the wrapper matches the plain deck"""
+        shared = SharedDeck(Deck())
+        self.assertEqual(list(shared.iter_deal(2, 2)), list(Deck().iter_deal(2, 2)))
+        self.assertEqual(len(shared), 48)
+        with self.assertRaises(Exception):
+            shared.iter_deal(5, 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
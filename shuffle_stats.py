@@ -0,0 +1,319 @@
+"""
+Statistical tests of shuffle quality over millions of shuffles
+
+Shuffles are sampled in tasks spread across processes. Each task folds its shuffles
+into a ShuffleStats of fixed size (counts per card and position, per pair of neighbouring
+cards, and histograms), so memory stays bounded however many shuffles run. Tasks are
+seeded from (seed, task number), which makes a run reproducible for any process count.
+
+Tests, each reported with a p-value (small p-values mean the shuffle is biased):
+- positions: chi-square of how often each card lands in each position
+- followers: chi-square of how often each card directly follows each other card
+- rising sequences: mean number of rising sequences, the signature of too few riffles
+- successions: mean number of cards still directly followed by their original neighbour
+
+    python shuffle_stats.py --method riffle --times 7 --samples 1000000
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import math
+import os
+import random
+import time
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, it only speeds up folding shuffles in
+    np = None
+
+import shuffles
+from deck_builder import Deck
+
+
+def _gamma_q(a, x):
+    """Regularized upper incomplete gamma function Q(a, x)"""
+    if x <= 0:
+        return 1.0
+    log_front = a * math.log(x) - x - math.lgamma(a)
+    if x < a + 1:
+        # series for the lower function P(a, x)
+        term = total = 1 / a
+        k = a
+        while abs(term) > abs(total) * 1e-15:
+            k += 1
+            term *= x / k
+            total += term
+        return max(0.0, 1 - total * math.exp(log_front))
+    # continued fraction for Q(a, x), modified Lentz
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 10000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        h *= d * c
+        if abs(d * c - 1) < 1e-15:
+            break
+    return min(1.0, h * math.exp(log_front))
+
+
+def chi_square_p(statistic, df):
+    """Probability of a chi-square statistic at least this large with df degrees of freedom"""
+    return _gamma_q(df / 2, statistic / 2)
+
+
+def _scaled_chi_square(statistic, mean, variance):
+    """
+    Tests a statistic whose null distribution is c * chi-square(df) with the given mean and
+    variance (Satterthwaite)
+    :return: dict with statistic, df, scale and p_value
+    """
+
+    scale = variance / (2 * mean)
+    df = 2 * mean * mean / variance
+    return {'statistic': statistic, 'df': df, 'scale': scale,
+            'p_value': chi_square_p(statistic / scale, df)}
+
+
+def normal_p(z):
+    """Two-sided probability of a standard normal value at least this far from 0"""
+    return math.erfc(abs(z) / math.sqrt(2))
+
+
+class ShuffleStats:
+    """Running counts over shuffled orders of n cards, merged across tasks"""
+
+    def __init__(self, n=52):
+        self.n = n
+        self.samples = 0
+        # card * n + position -> count
+        self.positions = [0] * (n * n)
+        # card * n + card directly under it -> count
+        self.followers = [0] * (n * n)
+        # number of rising sequences -> count of orders
+        self.rising = [0] * (n + 1)
+        # number of successions -> count of orders
+        self.successions = [0] * n
+
+    def update(self, order):
+        """
+        Folds in one shuffled order
+        :param order: card indexes 0 to n-1 from top to bottom, card i started in position i
+        :return: None
+        """
+
+        n = self.n
+        where = [0] * n
+        for position, card in enumerate(order):
+            self.positions[card * n + position] += 1
+            where[card] = position
+        for i in range(n - 1):
+            self.followers[order[i] * n + order[i + 1]] += 1
+        # a new rising sequence starts wherever card i + 1 sits above card i
+        self.rising[1 + sum(1 for i in range(n - 1) if where[i + 1] < where[i])] += 1
+        self.successions[sum(1 for i in range(n - 1) if where[i + 1] == where[i] + 1)] += 1
+        self.samples += 1
+
+    def update_batch(self, orders):
+        """
+        Folds in many shuffled orders at once with numpy
+        :param orders: integer array of shape (orders, n)
+        :return: None
+        """
+
+        n = self.n
+        orders = np.asarray(orders, dtype=np.int64)
+        count = orders.shape[0]
+        where = np.argsort(orders, axis=1)
+        cells = orders * n + np.arange(n)
+        self.positions = (np.asarray(self.positions)
+                          + np.bincount(cells.ravel(), minlength=n * n)).tolist()
+        pairs = orders[:, :-1] * n + orders[:, 1:]
+        self.followers = (np.asarray(self.followers)
+                          + np.bincount(pairs.ravel(), minlength=n * n)).tolist()
+        rising = 1 + (where[:, 1:] < where[:, :-1]).sum(axis=1)
+        self.rising = (np.asarray(self.rising) + np.bincount(rising, minlength=n + 1)).tolist()
+        successions = (where[:, 1:] == where[:, :-1] + 1).sum(axis=1)
+        self.successions = (np.asarray(self.successions)
+                            + np.bincount(successions, minlength=n)).tolist()
+        self.samples += count
+
+    def merge(self, other):
+        """Adds the counts of another ShuffleStats over the same number of cards"""
+        if other.n != self.n:
+            raise ValueError("Error: cannot merge statistics of different deck sizes")
+        for name in ('positions', 'followers', 'rising', 'successions'):
+            setattr(self, name, [a + b for a, b in zip(getattr(self, name), getattr(other, name))])
+        self.samples += other.samples
+        return self
+
+    def results(self):
+        """
+        Runs every test on the counts so far
+        :return: dict of test name -> dict with statistic, p_value and the test's details
+        """
+
+        n = self.n
+        samples = self.samples
+        if samples == 0 or n < 3:
+            raise ValueError("Error: need at least one sample of three or more cards")
+        expected = samples / n
+        positions = sum((count - expected) ** 2 for count in self.positions) / expected
+        # every card follows each other card with probability 1/n, never itself
+        followers = sum((self.followers[a * n + b] - expected) ** 2
+                        for a in range(n) for b in range(n) if a != b) / expected
+        # rising sequences are 1 + descents of the inverse order, mean (n + 1) / 2
+        # and variance (n + 1) / 12 for a uniform shuffle
+        rising_mean = sum(k * count for k, count in enumerate(self.rising)) / samples
+        rising_z = (rising_mean - (n + 1) / 2) / math.sqrt((n + 1) / 12 / samples)
+        # successions have mean (n - 1) / n and variance (n^2 - n - 1) / n^2
+        succession_mean = sum(k * count for k, count in enumerate(self.successions)) / samples
+        succession_z = ((succession_mean - (n - 1) / n)
+                        / math.sqrt((n * n - n - 1) / (n * n) / samples))
+        return {
+            # each shuffle fills every row and column of the table once, so the cells are
+            # not independent: under a uniform shuffle the statistic has mean n(n - 1)
+            # and variance 2n^2, which is (n / (n - 1)) * chi-square((n - 1)^2)
+            'positions': _scaled_chi_square(positions, n * (n - 1), 2 * n * n),
+            # mean (n - 1)^2 and variance 2(n^2 - n - 1), matched to a scaled chi-square
+            'followers': _scaled_chi_square(followers, (n - 1) ** 2, 2 * (n * n - n - 1)),
+            'rising_sequences': {'statistic': rising_z, 'mean': rising_mean,
+                                 'expected': (n + 1) / 2, 'p_value': normal_p(rising_z)},
+            'successions': {'statistic': succession_z, 'mean': succession_mean,
+                            'expected': (n - 1) / n, 'p_value': normal_p(succession_z)},
+        }
+
+
+def run_task(method, n: int, times: int, deck: bool, seed, task: int, samples: int, batch: int):
+    """
+    Shuffles and folds one task's worth of orders in the current process
+    :param method: shuffle strategy name or callable, or 'deck_batch' for DeckBatch
+    :param n: number of cards
+    :param times: times the strategy is applied per shuffle
+    :param deck: shuffle real Deck objects with Deck.shuffle instead of lists of indexes
+    :param seed: seed of the whole run
+    :param task: task number, selects the random stream of this task
+    :param samples: number of shuffles in the task
+    :param batch: orders gathered before folding them in with numpy
+    :return: ShuffleStats
+    """
+
+    rng = random.Random(f"{seed}:{task}")
+    stats = ShuffleStats(n)
+    if method == 'deck_batch':
+        from deck_batch import DeckBatch
+        batch_rng = np.random.default_rng(rng.getrandbits(64))
+        for start in range(0, samples, batch):
+            decks = DeckBatch(min(batch, samples - start), rng=batch_rng)
+            for _ in range(times):
+                decks.shuffle()
+            stats.update_batch(decks.cards[:, :n])
+        return stats
+
+    strategy = shuffles.get_strategy(method)
+    pending = []
+    for _ in range(samples):
+        if deck:
+            shuffled = Deck(rng=rng)
+            shuffled.shuffle(method, times)
+            order = shuffled.to_ids().tolist()
+        else:
+            order = list(range(n))
+            for _ in range(times):
+                order = strategy(order, rng)
+        if np is None:
+            stats.update(order)
+            continue
+        pending.append(order)
+        if len(pending) == batch:
+            stats.update_batch(pending)
+            pending = []
+    if pending:
+        stats.update_batch(pending)
+    return stats
+
+
+def run(method="uniform", samples=100_000, n=52, times=1, deck=False, seed=None,
+        processes=None, task_size=20_000, batch=4096):
+    """
+    Samples shuffles across processes and gathers their statistics
+    :param method: name of a strategy in shuffles.STRATEGIES, a picklable callable, or
+        'deck_batch' to test the numpy shuffle of DeckBatch
+    :param samples: number of shuffles
+    :param n: number of cards, 52 when deck is True or method is 'deck_batch'
+    :param times: times the strategy is applied per shuffle, e.g. 7 riffles
+    :param deck: shuffle Deck objects, testing Deck.shuffle end to end
+    :param seed: seed of the run, a random one is picked if None
+    :param processes: number of worker processes, defaults to the number of cores. With 1
+        the shuffles run in the calling process
+    :param task_size: shuffles per task
+    :param batch: orders folded in at a time when numpy is available
+    :return: (ShuffleStats, dict with seed, seconds and samples_per_second)
+    """
+
+    if (deck or method == 'deck_batch') and n != 52:
+        raise ValueError("Error: Deck and DeckBatch shuffles use 52 cards")
+    if method == 'deck_batch' and np is None:
+        raise ImportError("Error: deck_batch requires numpy")
+    if seed is None:
+        seed = random.SystemRandom().randrange(2 ** 32)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    sizes = [task_size] * (samples // task_size)
+    if samples % task_size:
+        sizes.append(samples % task_size)
+
+    start = time.perf_counter()
+    stats = ShuffleStats(n)
+    if processes == 1:
+        for task, size in enumerate(sizes):
+            stats.merge(run_task(method, n, times, deck, seed, task, size, batch))
+    else:
+        with ProcessPoolExecutor(processes) as pool:
+            pending = []
+            tasks = iter(enumerate(sizes))
+            # keep a couple of tasks queued per worker, so finished counts are merged and
+            # dropped instead of piling up
+            while True:
+                while len(pending) < 2 * processes:
+                    try:
+                        task, size = next(tasks)
+                    except StopIteration:
+                        break
+                    pending.append(pool.submit(run_task, method, n, times, deck, seed, task, size, batch))
+                if not pending:
+                    break
+                stats.merge(pending.pop(0).result())
+    seconds = time.perf_counter() - start
+    return stats, {'seed': seed, 'seconds': seconds, 'samples_per_second': samples / seconds}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test a shuffle strategy for bias")
+    parser.add_argument('--method', default='uniform',
+                        help="strategy in shuffles.STRATEGIES, or deck_batch")
+    parser.add_argument('--samples', type=int, default=100_000)
+    parser.add_argument('--cards', type=int, default=52)
+    parser.add_argument('--times', type=int, default=1, help="times to apply the strategy per shuffle")
+    parser.add_argument('--deck', action='store_true', help="shuffle Deck objects end to end")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--processes', type=int)
+    args = parser.parse_args(argv)
+
+    stats, run_info = run(args.method, args.samples, args.cards, args.times, args.deck,
+                          args.seed, args.processes)
+    print(f"{args.samples} shuffles in {run_info['seconds']:.1f} s "
+          f"({run_info['samples_per_second']:.0f}/s), seed {run_info['seed']}")
+    for name, result in stats.results().items():
+        print(f"{name:<18} statistic {result['statistic']:>14.2f}   p = {result['p_value']:.4g}")
+
+
+if __name__ == '__main__':
+    main()
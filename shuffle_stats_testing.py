@@ -0,0 +1,75 @@
+import random
+import unittest
+import shuffle_stats as ss
+
+
+class test_ShuffleStats(unittest.TestCase):
+
+    def test_p_values(self):
+        """Chi-square and normal p-values match table values"""
+        self.assertAlmostEqual(ss.chi_square_p(3.841, 1), 0.05, places=4)
+        self.assertAlmostEqual(ss.chi_square_p(18.307, 10), 0.05, places=4)
+        self.assertAlmostEqual(ss.chi_square_p(10, 20), 0.9682, places=4)
+        self.assertAlmostEqual(ss.chi_square_p(2601, 2601), 0.4963, places=3)
+        self.assertAlmostEqual(ss.normal_p(1.96), 0.05, places=3)
+        self.assertEqual(ss.chi_square_p(0, 5), 1.0)
+
+    def test_folding(self):
+        """Folding one order at a time, in batches, or in merged parts gives the same counts"""
+        rng = random.Random(3)
+        orders = [rng.sample(range(8), 8) for _ in range(300)]
+        one = ss.ShuffleStats(8)
+        for order in orders:
+            one.update(order)
+        self.assertEqual(one.samples, 300)
+        self.assertEqual(sum(one.rising), 300)
+        self.assertEqual(one.rising[1] + one.successions[7], 0)
+        # the unshuffled order is one rising sequence with every card still in succession
+        fresh = ss.ShuffleStats(8)
+        fresh.update(list(range(8)))
+        self.assertEqual((fresh.rising[1], fresh.successions[7]), (1, 1))
+        if ss.np is not None:
+            batched = ss.ShuffleStats(8)
+            batched.update_batch(orders[:100])
+            batched.update_batch(orders[100:])
+            self.assertEqual(vars(batched), vars(one))
+        merged = ss.ShuffleStats(8)
+        for part in (orders[:120], orders[120:]):
+            stats = ss.ShuffleStats(8)
+            for order in part:
+                stats.update(order)
+            merged.merge(stats)
+        self.assertEqual(vars(merged), vars(one))
+        with self.assertRaises(ValueError):
+            merged.merge(ss.ShuffleStats(9))
+
+    def test_uniform_passes(self):
+        """Fisher-Yates passes every test, a single riffle fails every test"""
+        fair, _ = ss.run('uniform', 20000, n=10, seed=1, processes=1, task_size=5000)
+        for name, result in fair.results().items():
+            self.assertGreater(result['p_value'], 0.001, name)
+        riffled, _ = ss.run('riffle', 5000, n=10, seed=1, processes=1)
+        for name, result in riffled.results().items():
+            self.assertLess(result['p_value'], 1e-6, name)
+
+    def test_reproducible(self):
+        """The same seed gives the same counts however many processes run it"""
+        one, _ = ss.run('overhand', 3000, n=12, seed=5, processes=1, task_size=500)
+        two, info = ss.run('overhand', 3000, n=12, seed=5, processes=2, task_size=500)
+        self.assertEqual(vars(one), vars(two))
+        self.assertEqual(info['seed'], 5)
+
+    def test_deck_paths(self):
+        """Deck.shuffle and DeckBatch can be tested end to end, on 52 cards only"""
+        stats, _ = ss.run('uniform', 200, deck=True, seed=2, processes=1)
+        self.assertEqual(stats.samples, 200)
+        if ss.np is not None:
+            stats, _ = ss.run('deck_batch', 3000, seed=2, processes=1, batch=1000)
+            self.assertEqual(stats.samples, 3000)
+            self.assertGreater(stats.results()['positions']['p_value'], 0.001)
+        with self.assertRaises(ValueError):
+            ss.run('uniform', 10, n=10, deck=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
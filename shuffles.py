@@ -0,0 +1,98 @@
+"""
+Shuffle strategies used by Deck.shuffle
+
+Each strategy takes a list of cards (any objects) and a random number generator
+with the random.Random interface, and returns a list holding the same cards in
+their new order. Strategies never touch the linked list themselves, Deck relinks
+the returned order in a single pass.
+"""
+
+
+def uniform(cards: list, rng):
+    """
+    Fisher-Yates shuffle, every ordering of the cards is equally likely
+    :param cards: list of cards, shuffled in place
+    :param rng: random number generator (random.Random interface)
+    :return: the shuffled list
+    """
+
+    # walk down from the last position, swapping each card with a random earlier one
+    for i in range(len(cards) - 1, 0, -1):
+        j = rng.randrange(i + 1)
+        cards[i], cards[j] = cards[j], cards[i]
+    return cards
+
+
+def riffle(cards: list, rng):
+    """
+    Riffle shuffle using the Gilbert-Shannon-Reeds model. The deck is cut binomially
+    and cards drop from each half with probability proportional to the half's size
+    :param cards: list of cards
+    :param rng: random number generator (random.Random interface)
+    :return: new list with the riffled order
+    """
+
+    n = len(cards)
+    # binomial cut: each card lands in the left half with probability 1/2
+    cut = sum(1 for _ in range(n) if rng.random() < 0.5)
+    left, right = 0, cut
+    riffled = []
+    while left < cut and right < n:
+        left_size = cut - left
+        right_size = n - right
+        if rng.random() * (left_size + right_size) < left_size:
+            riffled.append(cards[left])
+            left += 1
+        else:
+            riffled.append(cards[right])
+            right += 1
+    # one half is exhausted, the rest of the other falls in order
+    riffled.extend(cards[left:cut])
+    riffled.extend(cards[right:])
+    return riffled
+
+
+def overhand(cards: list, rng, p=0.2):
+    """
+    Overhand shuffle: the deck is broken into packets, which are moved from the top of
+    the deck onto a new pile one at a time, reversing the order of the packets
+    :param cards: list of cards
+    :param rng: random number generator (random.Random interface)
+    :param p: probability of a packet break between any two cards
+    :return: new list with the shuffled order
+    """
+
+    packets = []
+    start = 0
+    for i in range(1, len(cards)):
+        if rng.random() < p:
+            packets.append(cards[start:i])
+            start = i
+    packets.append(cards[start:])
+    shuffled = []
+    for packet in reversed(packets):
+        shuffled.extend(packet)
+    return shuffled
+
+
+# registry of strategies available to Deck.shuffle by name
+STRATEGIES = {
+    "uniform": uniform,
+    "riffle": riffle,
+    "overhand": overhand,
+}
+
+
+def get_strategy(method):
+    """
+    Looks up a shuffle strategy
+    :param method: name of a registered strategy, or a callable taking (cards, rng)
+    :return: strategy callable
+    """
+
+    if callable(method):
+        return method
+    try:
+        return STRATEGIES[method]
+    except KeyError:
+        raise ValueError(f"Error: unknown shuffle method '{method}'") from None
@@ -0,0 +1,151 @@
+"""
+Monte Carlo estimates of hand probabilities, sharded across processes
+
+A trial builds a Deck, shuffles it and deals it, then asks a predicate about the hands
+Deck.deal returned. Trials run in fixed-size batches, and batch i always draws from its
+own random stream seeded from (seed, i), so a run is reproducible no matter how many
+processes share the work.
+"""
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import math
+import os
+import random
+import statistics
+import time
+
+from deck_builder import Deck
+
+# running result of an estimate, yielded after every batch
+Estimate = namedtuple('Estimate', [
+    'successes', 'trials', 'probability', 'low', 'high', 'seed', 'elapsed', 'trials_per_second'
+])
+
+
+def run_batch(predicate, players: int, cards: int, jokers: bool, seed: int, batch: int, trials: int):
+    """
+    Runs one batch of trials in the current process
+    :param predicate: function taking the hands from Deck.deal and returning True or False
+    :param players: number of players to deal to
+    :param cards: number of cards to deal to each player
+    :param jokers: use a deck with jokers
+    :param seed: seed of the whole run
+    :param batch: batch number, selects the random stream of this batch
+    :param trials: number of trials in the batch
+    :return: number of trials where the predicate was True
+    """
+
+    rng = random.Random(f"{seed}:{batch}")
+    successes = 0
+    for _ in range(trials):
+        deck = Deck(jokers, rng=rng)
+        deck.shuffle()
+        if predicate(deck.deal(players, cards)):
+            successes += 1
+    return successes
+
+
+def wilson_interval(successes: int, trials: int, confidence=0.95):
+    """
+    Wilson score interval for a binomial proportion
+    :return: (low, high) bounds of the interval
+    """
+
+    if trials == 0:
+        return 0.0, 1.0
+    z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+    p = successes / trials
+    denominator = 1 + z * z / trials
+    centre = (p + z * z / (2 * trials)) / denominator
+    spread = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denominator
+    return max(0.0, centre - spread), min(1.0, centre + spread)
+
+
+def estimate_iter(predicate, trials: int, players: int, cards: int, jokers=False, seed=None,
+                  processes=None, batch_size=1000, confidence=0.95, target_width=None):
+    """
+    Estimates the probability that predicate holds for a random deal, yielding the running
+    estimate after every batch. Batches are folded in order, so results are reproducible
+    :param predicate: function taking the hands from Deck.deal, must be picklable (defined at
+        module level) when more than one process is used
+    :param trials: maximum number of trials to run
+    :param players: number of players to deal to
+    :param cards: number of cards to deal to each player
+    :param jokers: use a deck with jokers
+    :param seed: seed for the run, a random one is picked and reported if None
+    :param processes: number of worker processes, defaults to the number of cores. With 1
+        the trials run in the calling process
+    :param batch_size: number of trials per batch
+    :param confidence: confidence level of the reported interval
+    :param target_width: stop early once the interval's half width is at or below this
+    :return: generator of Estimate
+    """
+
+    if seed is None:
+        seed = random.SystemRandom().randrange(2 ** 32)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    sizes = [batch_size] * (trials // batch_size)
+    if trials % batch_size:
+        sizes.append(trials % batch_size)
+
+    start = time.perf_counter()
+    successes = 0
+    done = 0
+
+    def fold(batch_successes, batch_trials):
+        nonlocal successes, done
+        successes += batch_successes
+        done += batch_trials
+        low, high = wilson_interval(successes, done, confidence)
+        elapsed = time.perf_counter() - start
+        return Estimate(successes, done, successes / done, low, high, seed, elapsed,
+                        done / elapsed if elapsed > 0 else 0.0)
+
+    def finished(result):
+        return target_width is not None and (result.high - result.low) / 2 <= target_width
+
+    if processes == 1:
+        for batch, size in enumerate(sizes):
+            result = fold(run_batch(predicate, players, cards, jokers, seed, batch, size), size)
+            yield result
+            if finished(result):
+                return
+        return
+
+    with ProcessPoolExecutor(processes) as pool:
+        pending = []
+        batches = iter(enumerate(sizes))
+        try:
+            # keep a couple of batches queued per worker, consume them in submission order
+            while True:
+                while len(pending) < 2 * processes:
+                    try:
+                        batch, size = next(batches)
+                    except StopIteration:
+                        break
+                    pending.append((pool.submit(run_batch, predicate, players, cards, jokers,
+                                                seed, batch, size), size))
+                if not pending:
+                    return
+                future, size = pending.pop(0)
+                result = fold(future.result(), size)
+                yield result
+                if finished(result):
+                    return
+        finally:
+            for future, _ in pending:
+                future.cancel()
+
+
+def estimate(predicate, trials: int, players: int, cards: int, **kwargs):
+    """
+    Estimates the probability that predicate holds for a random deal
+    Takes the same arguments as estimate_iter
+    :return: final Estimate
+    """
+
+    result = None
+    for result in estimate_iter(predicate, trials, players, cards, **kwargs):
+        pass
+    return result
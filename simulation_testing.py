@@ -0,0 +1,41 @@
+import simulation as sim
+import unittest
+
+
+def first_card_heart(hands):
+    """Player 1's first card is a heart, probability 1/4"""
+    return hands[0][0][1] == 'hearts'
+
+
+def has_pair(hands):
+    """Player 1's hand holds at least two cards of the same name"""
+    names = [card[0] for card in hands[0]]
+    return len(set(names)) < len(names)
+
+
+class test_Simulation(unittest.TestCase):
+
+    def test_estimate(self):
+        """Estimates land near the exact probability, inside their interval"""
+        result = sim.estimate(first_card_heart, 4000, 2, 1, seed=1, processes=1)
+        self.assertEqual(result.trials, 4000)
+        self.assertLess(abs(result.probability - 0.25), 0.03)
+        self.assertLess(result.low, 0.25)
+        self.assertGreater(result.high, 0.25)
+        self.assertGreater(result.trials_per_second, 0)
+
+    def test_reproducible_across_processes(self):
+        """The same seed gives the same count however many processes run it"""
+        one = sim.estimate(has_pair, 1200, 6, 5, seed=9, processes=1, batch_size=100)
+        two = sim.estimate(has_pair, 1200, 6, 5, seed=9, processes=2, batch_size=100)
+        self.assertEqual(one.successes, two.successes)
+        self.assertEqual(one.seed, 9)
+
+    def test_streaming_and_early_stop(self):
+        """Partial results stream after each batch and stop at the target interval width"""
+        results = list(sim.estimate_iter(first_card_heart, 100000, 1, 1, seed=3, processes=1,
+                                         batch_size=500, target_width=0.02))
+        self.assertEqual([r.trials for r in results], [500 * (i + 1) for i in range(len(results))])
+        self.assertLess(results[-1].trials, 100000)
+        self.assertLessEqual((results[-1].high - results[-1].low) / 2, 0.02)
+        self.assertGreater((results[-2].high - results[-2].low) / 2, 0.02)
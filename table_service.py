@@ -0,0 +1,386 @@
+"""
+Asyncio dealing service for many card tables
+
+TableManager owns one Deck per table and exposes shuffle, deal and draw as coroutines.
+Each table has a lock, so its operations run one at a time in call order. Shuffles from
+every table that arrive in the same event loop pass are batched into one executor job,
+as are multi-table deals, so the loop never stalls on CPU-bound work.
+
+TableServer and TableClient speak a line-delimited JSON protocol over TCP, and
+run_load_test drives a server with many clients in one process:
+
+    python table_service.py --tables 200 --rounds 20
+"""
+import argparse
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import json
+import statistics
+import time
+
+from deck_builder import Deck
+
+
+async def _finish(future):
+    """
+    Waits for a future the executor is working on. A caller cancelled meanwhile keeps
+    waiting until the executor is done, so the table locks it holds stay held while the
+    executor uses the decks, then the cancel is passed on
+    :param future: asyncio future of the executor job
+    :return: result of the future
+    """
+
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        while not future.done():
+            try:
+                await asyncio.wait([future])
+            except asyncio.CancelledError:
+                pass
+        if not future.cancelled():
+            future.exception()  # a failed job is not reported to a cancelled caller
+        raise
+
+
+class TableManager:
+    """Runs deck operations for many tables without blocking the event loop"""
+
+    def __init__(self, executor=None, history=1000):
+        """
+        :param executor: concurrent.futures executor for CPU-bound batches, a single worker
+            thread by default
+        :param history: number of latencies kept per table and operation
+        """
+
+        self.executor = executor if executor is not None else ThreadPoolExecutor(1)
+        self.history = history
+        self.decks = {}
+        # table id -> Deck arguments, kept so reset can rebuild the deck
+        self._deck_kwargs = {}
+        self._locks = {}
+        self._latencies = {}
+        # shuffles waiting for the next batch, (deck, method, future)
+        self._pending_shuffles = []
+
+    def open_table(self, table_id, **deck_kwargs):
+        """
+        Creates a table with a new deck
+        :param table_id: any hashable name for the table
+        :param deck_kwargs: arguments for Deck (jokers, rng, n_decks, ...)
+        :return: the table's Deck
+        """
+
+        if table_id in self.decks:
+            raise ValueError(f"Error: table {table_id} is already open")
+        self.decks[table_id] = Deck(**deck_kwargs)
+        self._deck_kwargs[table_id] = deck_kwargs
+        self._locks[table_id] = asyncio.Lock()
+        self._latencies[table_id] = {}
+        return self.decks[table_id]
+
+    def close_table(self, table_id):
+        """Removes a table and its deck"""
+        del self.decks[table_id]
+        del self._deck_kwargs[table_id]
+        del self._locks[table_id]
+        del self._latencies[table_id]
+
+    def _record(self, table_id, operation, start):
+        """Stores the latency of one operation on a table"""
+        latencies = self._latencies[table_id].setdefault(operation, deque(maxlen=self.history))
+        latencies.append(time.perf_counter() - start)
+
+    def _lock(self, table_id):
+        """Lock of an open table"""
+        try:
+            return self._locks[table_id]
+        except KeyError:
+            raise KeyError(f"Error: table {table_id} is not open") from None
+
+    async def reset(self, table_id):
+        """
+        Replaces a table's deck with a full new one for the next hand, keeping its latencies
+        :param table_id: table to reset
+        :return: None
+        """
+
+        start = time.perf_counter()
+        async with self._lock(table_id):
+            kwargs = dict(self._deck_kwargs[table_id])
+            # keep drawing from the same random sequence instead of restarting a seeded one
+            kwargs['rng'] = self.decks[table_id].rng
+            self.decks[table_id] = Deck(**kwargs)
+        self._record(table_id, 'reset', start)
+
+    async def shuffle(self, table_id, method="uniform"):
+        """
+        Shuffles a table's deck on the executor, batched with other tables' shuffles
+        :param table_id: table to shuffle
+        :param method: shuffle strategy, as for Deck.shuffle
+        :return: None
+        """
+
+        start = time.perf_counter()
+        async with self._lock(table_id):
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            if not self._pending_shuffles:
+                loop.call_soon(self._flush_shuffles)
+            self._pending_shuffles.append((self.decks[table_id], method, future))
+            await _finish(future)
+        self._record(table_id, 'shuffle', start)
+
+    def _flush_shuffles(self):
+        """Sends every pending shuffle to the executor as one job"""
+        batch, self._pending_shuffles = self._pending_shuffles, []
+
+        def run():
+            errors = []
+            for deck, method, _ in batch:
+                try:
+                    deck.shuffle(method)
+                    errors.append(None)
+                except Exception as error:
+                    errors.append(error)
+            return errors
+
+        def done(job):
+            errors = job.result()
+            for (_, _, future), error in zip(batch, errors):
+                if future.cancelled():
+                    continue
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+
+        job = asyncio.get_running_loop().run_in_executor(self.executor, run)
+        job.add_done_callback(done)
+
+    async def deal(self, table_id, players: int, cards: int):
+        """
+        Deals from a table's deck, see Deck.deal
+        :return: nested list containing all hands dealt
+        """
+
+        start = time.perf_counter()
+        async with self._lock(table_id):
+            hands = self.decks[table_id].deal(players, cards)
+        self._record(table_id, 'deal', start)
+        return hands
+
+    async def draw(self, table_id):
+        """
+        Draws the top card of a table's deck, see Deck.draw
+        :return: card data tuple
+        """
+
+        start = time.perf_counter()
+        async with self._lock(table_id):
+            card = self.decks[table_id].draw()
+        self._record(table_id, 'draw', start)
+        return card
+
+    async def deal_all(self, requests: dict):
+        """
+        Deals at many tables in one executor job
+        :param requests: table id -> (players, cards)
+        :return: table id -> hands, or the exception raised for that table
+        """
+
+        start = time.perf_counter()
+        tables = list(requests)
+        # take every table's lock in a fixed order so concurrent batches can't deadlock
+        locks = [self._lock(table_id) for table_id in sorted(tables, key=repr)]
+        # locks taken so far, a cancel while waiting for the next one releases only these
+        held = []
+        try:
+            for lock in locks:
+                await lock.acquire()
+                held.append(lock)
+
+            def run():
+                results = {}
+                for table_id in tables:
+                    try:
+                        results[table_id] = self.decks[table_id].deal(*requests[table_id])
+                    except Exception as error:
+                        results[table_id] = error
+                return results
+
+            results = await _finish(asyncio.get_running_loop().run_in_executor(self.executor, run))
+        finally:
+            for lock in held:
+                lock.release()
+        for table_id in tables:
+            self._record(table_id, 'deal', start)
+        return results
+
+    def latency(self, table_id):
+        """
+        Latency statistics of a table, from the call to completion including queueing
+        :return: operation -> dict of count, mean, p50, p99 and max in seconds
+        """
+
+        stats = {}
+        for operation, latencies in self._latencies[table_id].items():
+            ordered = sorted(latencies)
+            stats[operation] = {
+                'count': len(ordered),
+                'mean': statistics.fmean(ordered),
+                'p50': ordered[len(ordered) // 2],
+                'p99': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+                'max': ordered[-1],
+            }
+        return stats
+
+
+class TableServer:
+    """
+    Serves a TableManager over TCP, one JSON object per line each way
+    Requests look like {"op": "deal", "table": "t1", "players": 2, "cards": 5}, with op one
+    of open, close, reset, shuffle, deal, draw and latency. Replies are {"ok": true, "result": ...}
+    or {"ok": false, "error": "..."}
+    """
+
+    def __init__(self, manager=None):
+        self.manager = manager if manager is not None else TableManager()
+        self._server = None
+
+    async def start(self, host='127.0.0.1', port=0):
+        """
+        Starts listening, port 0 picks a free port
+        :return: (host, port) the server is bound to
+        """
+
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def stop(self):
+        """Stops listening and waits for the server to close"""
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        """Answers requests from one client connection in order"""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    reply = {'ok': True, 'result': await self._dispatch(json.loads(line))}
+                except Exception as error:
+                    reply = {'ok': False, 'error': str(error)}
+                writer.write(json.dumps(reply).encode() + b'\n')
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def _dispatch(self, request):
+        """Runs one request against the manager"""
+        op = request['op']
+        table = request['table']
+        manager = self.manager
+        if op == 'open':
+            manager.open_table(table, **request.get('deck', {}))
+            return None
+        if op == 'close':
+            manager.close_table(table)
+            return None
+        if op == 'reset':
+            return await manager.reset(table)
+        if op == 'shuffle':
+            return await manager.shuffle(table, request.get('method', 'uniform'))
+        if op == 'deal':
+            return await manager.deal(table, request['players'], request['cards'])
+        if op == 'draw':
+            return await manager.draw(table)
+        if op == 'latency':
+            return manager.latency(table)
+        raise ValueError(f"Error: unknown operation '{op}'")
+
+
+class TableClient:
+    """Client for TableServer, one request in flight per connection"""
+
+    def __init__(self):
+        self._reader = None
+        self._writer = None
+
+    async def connect(self, host, port):
+        self._reader, self._writer = await asyncio.open_connection(host, port)
+
+    async def close(self):
+        self._writer.close()
+        await self._writer.wait_closed()
+
+    async def request(self, op, table, **kwargs):
+        """
+        Sends one request and waits for its reply
+        :return: result of the operation, JSON decoded (card tuples come back as lists)
+        """
+
+        self._writer.write(json.dumps(dict(kwargs, op=op, table=table)).encode() + b'\n')
+        await self._writer.drain()
+        reply = json.loads(await self._reader.readline())
+        if not reply['ok']:
+            raise RuntimeError(reply['error'])
+        return reply['result']
+
+
+async def run_load_test(tables=100, rounds=10, players=6, cards=2):
+    """
+    Starts a server and one client per table in this process, then plays rounds of
+    shuffle, deal, draw and reset at every table concurrently
+    :return: dict with requests, seconds, requests_per_second and the server's latency
+        statistics merged over all tables
+    """
+
+    server = TableServer()
+    host, port = await server.start()
+    # latencies of every table, gathered before each table closes
+    merged = {}
+
+    async def play(table):
+        client = TableClient()
+        await client.connect(host, port)
+        await client.request('open', table)
+        for _ in range(rounds):
+            await client.request('shuffle', table)
+            await client.request('deal', table, players=players, cards=cards)
+            await client.request('draw', table)
+            await client.request('reset', table)
+        for operation, latencies in server.manager._latencies[table].items():
+            merged.setdefault(operation, []).extend(latencies)
+        await client.request('close', table)
+        await client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(play(f"table-{i}") for i in range(tables)))
+    seconds = time.perf_counter() - start
+
+    await server.stop()
+    server.manager.executor.shutdown()
+    requests = tables * (2 + 4 * rounds)
+    return {
+        'requests': requests,
+        'seconds': seconds,
+        'requests_per_second': requests / seconds,
+        'latency': {operation: {'mean': statistics.fmean(values), 'max': max(values)}
+                    for operation, values in merged.items()},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the table service in one process")
+    parser.add_argument('--tables', type=int, default=100)
+    parser.add_argument('--rounds', type=int, default=10)
+    args = parser.parse_args(argv)
+    print(json.dumps(asyncio.run(run_load_test(args.tables, args.rounds)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
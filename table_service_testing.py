@@ -0,0 +1,161 @@
+import asyncio
+import table_service as ts
+import time
+import unittest
+from deck_builder import Deck
+
+
+class test_TableManager(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncTearDown(self):
+        if hasattr(self, 'manager'):
+            self.manager.executor.shutdown()
+
+    async def test_operations(self):
+        """Table operations match the same calls on a plain Deck with the same seed"""
+        self.manager = ts.TableManager()
+        self.manager.open_table('a', rng=3)
+        expected = Deck(rng=3)
+        await self.manager.shuffle('a')
+        expected.shuffle()
+        self.assertEqual(await self.manager.deal('a', 2, 3), expected.deal(2, 3))
+        self.assertEqual(await self.manager.draw('a'), expected.draw())
+        self.assertEqual(len(self.manager.decks['a']), 45)
+
+    async def test_batched_shuffles(self):
+        """Shuffles at many tables run together and each table gets its own result"""
+        self.manager = ts.TableManager()
+        for i in range(20):
+            self.manager.open_table(i, rng=i)
+        await asyncio.gather(*(self.manager.shuffle(i) for i in range(20)))
+        for i in range(20):
+            expected = Deck(rng=i)
+            expected.shuffle()
+            self.assertEqual(self.manager.decks[i], expected)
+
+    async def test_cancelled_shuffle(self):
+        """Cancelling a shuffle keeps the table locked until the executor is done with the deck"""
+        self.manager = ts.TableManager()
+        self.manager.open_table('a', rng=4)
+        deck = self.manager.decks['a']
+        started = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        original = deck.shuffle
+
+        def slow_shuffle(method):
+            loop.call_soon_threadsafe(started.set)
+            time.sleep(0.1)
+            original(method)
+        deck.shuffle = slow_shuffle
+        task = asyncio.ensure_future(self.manager.shuffle('a'))
+        await started.wait()
+        task.cancel()
+        # the draw waits for the shuffle instead of racing it on another thread
+        card = await self.manager.draw('a')
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        expected = Deck(rng=4)
+        expected.shuffle()
+        self.assertEqual(card, expected.draw())
+        self.assertEqual(deck, expected)
+
+    async def test_table_order(self):
+        """Operations on one table run in call order"""
+        self.manager = ts.TableManager()
+        self.manager.open_table('a')
+        results = await asyncio.gather(self.manager.draw('a'), self.manager.shuffle('a'),
+                                       self.manager.draw('a'))
+        self.assertEqual(results[0], ('2', 'hearts'))
+        self.assertEqual(len(self.manager.decks['a']), 50)
+
+    async def test_deal_all(self):
+        """Multi-table deals return hands per table and errors per table"""
+        self.manager = ts.TableManager()
+        self.manager.open_table('a')
+        self.manager.open_table('b')
+        results = await self.manager.deal_all({'a': (2, 2), 'b': (30, 2)})
+        self.assertEqual(results['a'], Deck().deal(2, 2))
+        self.assertIsInstance(results['b'], Exception)
+
+    async def test_cancelled_deal_all(self):
+        """Cancelling a multi-table deal keeps every table locked until the executor is done"""
+        self.manager = ts.TableManager()
+        self.manager.open_table('a')
+        self.manager.open_table('b')
+        deck = self.manager.decks['b']
+        started = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        original = deck.deal
+
+        def slow_deal(players, cards):
+            loop.call_soon_threadsafe(started.set)
+            time.sleep(0.1)
+            return original(players, cards)
+        deck.deal = slow_deal
+        task = asyncio.ensure_future(self.manager.deal_all({'a': (2, 2), 'b': (2, 2)}))
+        await started.wait()
+        task.cancel()
+        # the draws wait for the deal instead of racing it on another thread
+        self.assertEqual(await self.manager.draw('b'), Deck().to_tuples()[4])
+        self.assertEqual(await self.manager.draw('a'), Deck().to_tuples()[4])
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+        # a cancel while waiting for a lock releases the locks already taken
+        async with self.manager._lock('b'):
+            task = asyncio.ensure_future(self.manager.deal_all({'a': (1, 1), 'b': (1, 1)}))
+            await asyncio.sleep(0)
+            self.assertTrue(self.manager._lock('a').locked())
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.assertFalse(self.manager._lock('a').locked())
+        self.assertEqual(len(self.manager.decks['a']), 47)
+
+    async def test_latency(self):
+        """Every operation is counted in the table's latency statistics"""
+        self.manager = ts.TableManager()
+        self.manager.open_table('a')
+        for _ in range(3):
+            await self.manager.draw('a')
+        await self.manager.shuffle('a')
+        stats = self.manager.latency('a')
+        self.assertEqual(stats['draw']['count'], 3)
+        self.assertEqual(stats['shuffle']['count'], 1)
+        self.assertLessEqual(stats['draw']['p50'], stats['draw']['max'])
+        await self.manager.reset('a')
+        self.assertEqual(len(self.manager.decks['a']), 52)
+        self.assertEqual(self.manager.latency('a')['draw']['count'], 3)
+        with self.assertRaises(KeyError):
+            await self.manager.draw('missing')
+
+
+class test_TableServer(unittest.IsolatedAsyncioTestCase):
+
+    async def test_client(self):
+        """Requests round trip through the server, errors come back as exceptions"""
+        server = ts.TableServer()
+        host, port = await server.start()
+        client = ts.TableClient()
+        await client.connect(host, port)
+        await client.request('open', 't', deck={'rng': 1})
+        await client.request('shuffle', 't')
+        hands = await client.request('deal', 't', players=2, cards=2)
+        self.assertEqual(len(hands), 2)
+        self.assertEqual(len(await client.request('draw', 't')), 2)
+        with self.assertRaises(RuntimeError):
+            await client.request('deal', 't', players=30, cards=2)
+        await client.close()
+        await server.stop()
+        server.manager.executor.shutdown()
+
+    async def test_load(self):
+        """The load test plays every round at every table"""
+        result = await ts.run_load_test(tables=5, rounds=2)
+        self.assertEqual(result['requests'], 5 * 10)
+        self.assertGreater(result['requests_per_second'], 0)
+        self.assertIn('shuffle', result['latency'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+"""
+Memo of search results keyed by deck state
+
+Game-tree searches reach the same deck order by different move sequences. A
+TranspositionTable stores a result once per state, keyed by the deck's order-sensitive
+hash, so a repeated state is answered from the table instead of searched again.
+"""
+
+
+class TranspositionTable:
+    """
+    Bounded map from deck states to values, oldest entries evicted first
+    Works with any deck whose hash follows its order (Deck, Shoe, CompactDeck). Deck and
+    CompactDeck hash the same order alike, so a state stored from a deck is found from its forks
+    """
+
+    def __init__(self, max_entries=1_000_000, verify=False):
+        """
+        :param max_entries: most states kept, None for no limit
+        :param verify: also store each state's to_bytes() and compare it on lookup, so two
+            states with colliding 64-bit hashes are never confused, at O(n) per lookup
+        """
+
+        self.max_entries = max_entries
+        self.verify = verify
+        self._entries = {}
+        # lookup statistics, reset by clear
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        """Return number of stored states"""
+        return len(self._entries)
+
+    def __contains__(self, deck):
+        """Checks if a state is stored, without counting a hit or miss"""
+        return self._find(deck) is not None
+
+    def _key(self, deck):
+        return (hash(deck), deck.to_bytes()) if self.verify else hash(deck)
+
+    def _find(self, deck):
+        """Stored (value,) for a state, or None"""
+        return self._entries.get(self._key(deck))
+
+    def get(self, deck, default=None):
+        """
+        Looks up the value stored for a deck's current state
+        :param deck: deck in the state to look up
+        :param default: returned if the state is not stored
+        :return: stored value or default
+        """
+
+        entry = self._find(deck)
+        if entry is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return entry[0]
+
+    def store(self, deck, value):
+        """
+        Stores a value for a deck's current state, replacing any earlier value
+        :param deck: deck in the state to store, it can keep changing afterwards
+        :param value: any object
+        :return: None
+        """
+
+        key = self._key(deck)
+        if key not in self._entries and self.max_entries is not None and len(self._entries) >= self.max_entries:
+            # dicts keep insertion order, so the first key is the oldest entry
+            del self._entries[next(iter(self._entries))]
+        self._entries[key] = (value,)
+
+    def clear(self):
+        """Removes every entry and resets the statistics"""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
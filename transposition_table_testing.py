@@ -0,0 +1,58 @@
+import unittest
+from compact_deck import CompactDeck
+from deck_builder import Deck
+from transposition_table import TranspositionTable
+
+
+class test_TranspositionTable(unittest.TestCase):
+
+    def test_lookup(self):
+        """A state stored once is found again however the deck reached it"""
+        table = TranspositionTable()
+        deck = Deck()
+        deck.pull('h2')
+        deck.pull('h3')
+        table.store(deck, 'searched')
+        other = Deck()
+        other.pull('h3')
+        other.pull('h2')
+        self.assertEqual(table.get(other), 'searched')
+        self.assertIn(other, table)
+        other.draw()
+        self.assertIsNone(table.get(other))
+        self.assertEqual((table.hits, table.misses), (1, 1))
+
+        # decks holding the same duplicates in different places are different states
+        ace, two, three = 12, 0, 1
+        table.store(Deck.from_ids([ace, two, ace, three, ace]), 'first')
+        self.assertIsNone(table.get(Deck.from_ids([ace, three, ace, two, ace])))
+
+    def test_verify(self):
+        """With verify, entries also match on the packed order, for Deck and CompactDeck"""
+        for kind in (Deck, CompactDeck):
+            table = TranspositionTable(verify=True)
+            deck = kind(rng=1)
+            deck.shuffle()
+            table.store(deck, 3)
+            self.assertEqual(table.get(deck), 3)
+            deck.cut()
+            self.assertEqual(table.get(deck, 'missing'), 'missing')
+
+    def test_bounded(self):
+        """The oldest state is evicted once the table is full"""
+        table = TranspositionTable(max_entries=3)
+        deck = CompactDeck()
+        states = []
+        for i in range(4):
+            states.append(deck.fork())
+            table.store(deck, i)
+            deck.draw()
+        self.assertEqual(len(table), 3)
+        self.assertNotIn(states[0], table)
+        self.assertEqual(table.get(states[3]), 3)
+        table.clear()
+        self.assertEqual((len(table), table.hits), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()